@@ -0,0 +1,213 @@
+# alignment.py
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from data_cache import load_columns_cached
+
+TIME_COLUMN = 0
+CACHE_SIZE = 64
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class AccAlignment:
+    """
+    Accelerometer sample range of every EMG window: window i covers
+    acc[..., starts[i] : starts[i] + lengths[i]]. `source` says how it was built:
+    "time" (the files' Time columns) or "rate" (sample index / sampling rate).
+    """
+
+    def __init__(self, starts, lengths, source):
+        self.starts = np.asarray(starts, dtype=np.intp)
+        self.lengths = np.asarray(lengths, dtype=np.intp)
+        self.source = source
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def sample_times(n_samples, fs):
+    return np.arange(n_samples) / fs
+
+
+def usable_times(times, n_samples):
+    """A Time column can be used if it has one finite, strictly increasing value per sample."""
+    times = np.asarray(times)
+    return (
+        times.ndim == 1 and len(times) == n_samples and n_samples > 1
+        and bool(np.all(np.isfinite(times))) and bool(np.all(np.diff(times) > 0))
+    )
+
+
+def align_windows(emg_time, acc_time, window_size, step_size, num_windows, source="time"):
+    """
+    Map EMG window i (samples [i * step_size, i * step_size + window_size)) to the
+    accelerometer samples whose time falls in [t_start, t_end), t_end being the
+    time of the first EMG sample after the window (extrapolated past the end).
+    Only windows that fit in the EMG recording are mapped, as in the engine.
+    """
+    n_emg = len(emg_time)
+    n_fit = (n_emg - window_size) // step_size + 1 if n_emg >= window_size else 0
+    n_win = max(min(num_windows, n_fit), 0)
+    if n_win == 0:
+        return AccAlignment(np.empty(0), np.empty(0), source)
+    edges = _emg_edges(emg_time)
+    starts = np.arange(n_win) * step_size
+    acc_start = np.searchsorted(acc_time, edges[starts], side="left")
+    acc_stop = np.searchsorted(acc_time, edges[starts + window_size], side="left")
+    return AccAlignment(acc_start, acc_stop - acc_start, source)
+
+
+def _emg_edges(emg_time):
+    """EMG sample times plus the time of the sample after the last one (extrapolated)."""
+    if len(emg_time) > 1:
+        return np.append(emg_time, 2 * emg_time[-1] - emg_time[-2])
+    return np.append(emg_time, np.inf)
+
+
+def acc_emg_indices(emg_time, acc_time):
+    """
+    EMG sample index of every acc sample: the last EMG sample at or before it, so
+    an acc sample lands in exactly the windows align_windows gives it. -1 before
+    the first EMG sample, len(emg_time) after the last one.
+    """
+    return np.searchsorted(_emg_edges(np.asarray(emg_time)), acc_time, side="right") - 1
+
+
+def acc_on_emg_grid(acc, emg_time, acc_time, dtype=np.float64):
+    """
+    (len(emg_time), acc columns) array with every acc row at its acc_emg_indices
+    row and NaN ("no acc sample here") everywhere else, for streaming consumers
+    that pair acc_chunk[i] with emg_chunk[i]. Acc outside the EMG span is dropped.
+    """
+    n_emg = len(emg_time)
+    grid = np.full((n_emg, acc.shape[1]), np.nan, dtype=dtype)
+    n_acc = min(acc.shape[0], len(acc_time))
+    idx = acc_emg_indices(emg_time, acc_time[:n_acc])
+    inside = (idx >= 0) & (idx < n_emg)
+    grid[idx[inside]] = acc[:n_acc][inside]
+    return grid
+
+
+def align_by_rate(n_emg, n_acc, fs_emg, fs_acc, window_size, step_size, num_windows):
+    """align_windows on nominal timelines starting at 0 (files without a usable Time column)."""
+    return align_windows(
+        sample_times(n_emg, fs_emg), sample_times(n_acc, fs_acc), window_size, step_size, num_windows, "rate"
+    )
+
+
+def load_time_column(filename):
+    data = load_columns_cached(filename, [TIME_COLUMN])
+    return np.asarray(data[:, 0]) if data.size > 0 else np.array([])
+
+
+def _file_key(filename):
+    st = os.stat(filename)
+    return os.path.abspath(filename), st.st_mtime_ns, st.st_size
+
+
+def session_times(emg_file, acc_file, n_emg, n_acc, fs_emg, fs_acc):
+    """
+    (emg_time, acc_time, source) of a recording pair: the files' Time columns, or
+    nominal timelines from the sampling rates if either column is unusable.
+    """
+    emg_time = load_time_column(emg_file)
+    acc_time = load_time_column(acc_file)
+    if usable_times(emg_time, n_emg) and usable_times(acc_time, n_acc):
+        return emg_time, acc_time, "time"
+    return sample_times(n_emg, fs_emg), sample_times(n_acc, fs_acc), "rate"
+
+
+def session_acc_grid(emg_file, acc_file, n_emg, acc, fs_emg, fs_acc, dtype=np.float64):
+    """acc_on_emg_grid of a recording pair, on its session_times."""
+    emg_time, acc_time, _source = session_times(emg_file, acc_file, n_emg, acc.shape[0], fs_emg, fs_acc)
+    return acc_on_emg_grid(acc, emg_time, acc_time, dtype)
+
+
+def fallback_warning(source, emg_file, acc_file):
+    """What a CLI prints when a recording pair was aligned by sampling rate; None otherwise."""
+    if source == "rate":
+        return f"⚠️ No usable Time column in {emg_file} / {acc_file}, aligned by sampling rate."
+    return None
+
+
+def session_alignment(emg_file, acc_file, n_emg, n_acc, fs_emg, fs_acc, window_size, step_size, num_windows):
+    """
+    AccAlignment for one recording pair, from the Time columns of both files, or
+    from the sampling rates if either column is unusable (alignment.source is then
+    "rate"; see fallback_warning). Index maps are cached
+    in-process per (files, window parameters), so reprocessing a session (other
+    smoothing, float32, a report) does not search the timelines again.
+    """
+    key = (_file_key(emg_file), _file_key(acc_file), n_emg, n_acc, fs_emg, fs_acc,
+           window_size, step_size, num_windows)
+    with _cache_lock:
+        alignment = _cache.get(key)
+        if alignment is not None:
+            _cache.move_to_end(key)
+            return alignment
+
+    emg_time, acc_time, source = session_times(emg_file, acc_file, n_emg, n_acc, fs_emg, fs_acc)
+    alignment = align_windows(emg_time, acc_time, window_size, step_size, num_windows, source)
+
+    with _cache_lock:
+        _cache[key] = alignment
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return alignment
+
+
+class AccTimeline:
+    """
+    Places live accelerometer samples on the EMG sample grid of a session.
+
+    StreamingEmgProcessor pairs acc_chunk[i] with emg_chunk[i]. Acc is sampled
+    slower than EMG, so every acc sample is put at the last EMG index at or before
+    its time (relative to the session's first EMG sample), as acc_emg_indices does
+    for recordings, and all other rows are NaN. Samples that arrive before their
+    EMG frame wait here; samples whose EMG frame was already submitted are dropped.
+    """
+
+    def __init__(self, n_channels, fs_emg, fs_acc, max_pending=None):
+        self.n_channels = n_channels
+        self.fs_emg = fs_emg
+        self.fs_acc = fs_acc
+        self.max_pending = max_pending or 10 * fs_acc
+        self.t0 = None
+        self.late = 0
+        self._idx = np.empty(0, dtype=np.int64)
+        self._values = np.empty((0, n_channels))
+
+    def place(self, emg_start, n_emg, emg_timestamp, acc, acc_timestamp, dtype=np.float64):
+        """(n_emg, n_channels) acc chunk for EMG samples [emg_start, emg_start + n_emg)."""
+        if self.t0 is None:
+            self.t0 = emg_timestamp
+        if acc.shape[0]:
+            times = acc_timestamp + np.arange(acc.shape[0]) / self.fs_acc
+            # small tolerance: an acc sample exactly on an EMG sample must not round down past it
+            idx = np.floor((times - self.t0) * self.fs_emg + 1e-6).astype(np.int64)
+            values = np.zeros((acc.shape[0], self.n_channels))
+            n_cols = min(self.n_channels, acc.shape[1])
+            values[:, :n_cols] = acc[:, :n_cols]
+            self._idx = np.concatenate((self._idx, idx))
+            self._values = np.concatenate((self._values, values))
+
+        late = self._idx < emg_start
+        self.late += int(late.sum())
+        here = ~late & (self._idx < emg_start + n_emg)
+        chunk = np.full((n_emg, self.n_channels), np.nan, dtype=dtype)
+        chunk[self._idx[here] - emg_start] = self._values[here]
+
+        keep = self._idx >= emg_start + n_emg
+        self._idx, self._values = self._idx[keep][-self.max_pending:], self._values[keep][-self.max_pending:]
+        return chunk
+
+
+def clear_alignment_cache():
+    with _cache_lock:
+        _cache.clear()
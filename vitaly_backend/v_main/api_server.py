@@ -1,41 +1,508 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import hashlib
+import json
+import queue
 import sqlite3
+import threading
 
-app = FastAPI()
+import numpy as np
+
+import local_storage
+from downsampling import DOWNSAMPLERS
+from instrumentation import merge_textfiles, metrics
+from session_archive import load_session_archive
+
+@asynccontextmanager
+async def lifespan(_app):
+    task = asyncio.create_task(broadcaster.run())
+    try:
+        yield
+    finally:
+        task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+METRIC_COLUMNS = (
+    "muscle_fatigue", "muscle_activation", "force", "velocity", "power_output",
+    "firing_rate", "intensity", "work_ratio",
+)
+MAX_SERIES_POINTS = 10000
+MAX_PAGE_ROWS = 200000
+
+LATEST_COLUMNS = (
+    "session_id", "timestamp", "muscle_fatigue", "muscle_activation", "force",
+    "velocity", "power_output", "firing_rate", "intensity", "work_ratio", "channel",
+)
+
+
+class ReadConnectionPool:
+    """Small pool of read-only SQLite connections shared by the request handlers."""
+
+    def __init__(self, path, size=4):
+        self.path = path
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False, timeout=5)
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            except sqlite3.Error:
+                conn.close()
+                raise
+            else:
+                self._idle.put_nowait(conn)
+
+
+class LatestSnapshotCache:
+    """
+    Latest-metrics snapshot per session, kept in memory.
+
+    `PRAGMA data_version` on a dedicated connection changes whenever any other
+    connection (the processor, the sync worker) commits, so a poll only costs that
+    pragma while nothing is written; the snapshots are re-read lazily after a write.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._watch = None
+        self._version = None
+        self._snapshots = {}
+
+    def _data_version(self):
+        if self._watch is None:
+            self._watch = self.pool._connect()
+        return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def _sync_version(self):
+        """Current data_version (None if unreadable); drops the snapshots when it moved. Call under the lock."""
+        try:
+            version = self._data_version()
+        except sqlite3.Error:
+            self._watch = None
+            self._version = None
+            self._snapshots.clear()
+            return None
+        if version != self._version:
+            self._version = version
+            self._snapshots.clear()
+        return version
+
+    def is_fresh(self, session_id):
+        with self._lock:
+            return self._sync_version() is not None and session_id in self._snapshots
+
+    def get(self, session_id):
+        with self._lock:
+            return self._snapshots.get(session_id)
+
+    def refresh(self, session_id):
+        """
+        Re-read the latest row for `session_id` (None = any session). The snapshot is
+        only kept if no commit was seen while it was read, so a slow refresh cannot
+        overwrite the cache with a row older than the current data_version.
+        """
+        with self._lock:
+            read_at = self._sync_version()
+        try:
+            with self.pool.connection() as conn:
+                if session_id is None:
+                    row = conn.execute(f"""
+                        SELECT {", ".join(LATEST_COLUMNS)}
+                        FROM processed_results
+                        ORDER BY rowid DESC LIMIT 1
+                    """).fetchone()
+                else:
+                    row = conn.execute(f"""
+                        SELECT {", ".join(LATEST_COLUMNS)}
+                        FROM processed_results
+                        WHERE session_id = ?
+                        ORDER BY rowid DESC LIMIT 1
+                    """, (session_id,)).fetchone()
+        except sqlite3.Error:
+            row = None
+
+        if row:
+            payload = dict(zip(LATEST_COLUMNS, row))
+        else:
+            payload = {"error": "No data found"}
+        body = json.dumps(payload).encode("utf-8")
+        snapshot = (f'"{hashlib.sha1(body).hexdigest()[:20]}"', body)
+        with self._lock:
+            if read_at is not None and self._sync_version() == read_at:
+                self._snapshots[session_id] = snapshot
+        return snapshot
+
+
+class ResultBroadcaster:
+    """
+    Pushes every newly written result row to the subscribed stream clients.
+
+    One background task tails processed_results by rowid (checking PRAGMA data_version
+    first, so an idle database costs one pragma per tick) and fans the rows out to
+    per-client queues. Queues are bounded: a client that falls behind loses its
+    oldest pending windows instead of growing memory or slowing the others.
+    """
+
+    def __init__(self, pool, poll_interval=0.2, queue_size=100, page_size=500):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.page_size = page_size
+        self.subscribers = {}
+        self.dropped = 0
+        self._last_rowid = None
+        self._watch = None
+        self._version = None
+
+    def subscribe(self, session_id=None):
+        q = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[q] = session_id
+        return q
+
+    def unsubscribe(self, q):
+        self.subscribers.pop(q, None)
+
+    def publish(self, event):
+        for q, session_id in list(self.subscribers.items()):
+            if session_id is not None and event["session_id"] != session_id:
+                continue
+            if q.full():
+                q.get_nowait()
+                self.dropped += 1
+            q.put_nowait(event)
+
+    def fetch_after(self, rowid, session_id=None, limit=None):
+        """Rows written after `rowid` as (rowid, payload) pairs, oldest first."""
+        where = "rowid > ?"
+        params = [rowid]
+        if session_id is not None:
+            where += " AND session_id = ?"
+            params.append(session_id)
+        params.append(limit or self.page_size)
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT rowid, {", ".join(LATEST_COLUMNS)}
+                FROM processed_results
+                WHERE {where}
+                ORDER BY rowid
+                LIMIT ?
+            """, params).fetchall()
+        return [(row[0], dict(zip(LATEST_COLUMNS, row[1:]))) for row in rows]
+
+    def _poll(self):
+        if self._watch is None:
+            self._watch = self.pool._connect()
+        version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+        if self._last_rowid is None:
+            self._version = version
+            self._last_rowid = self._watch.execute(
+                "SELECT COALESCE(MAX(rowid), 0) FROM processed_results"
+            ).fetchone()[0]
+            return []
+        if version == self._version:
+            return []
+        self._version = version
+        max_rowid = self._watch.execute(
+            "SELECT COALESCE(MAX(rowid), 0) FROM processed_results"
+        ).fetchone()[0]
+        if max_rowid < self._last_rowid:
+            # the newest rows were archived away, so SQLite may hand out their rowids again
+            self._last_rowid = max_rowid
+        rows = self.fetch_after(self._last_rowid)
+        if len(rows) == self.page_size:
+            self._version = None  # more pending, read the next page on the next tick
+        if rows:
+            self._last_rowid = rows[-1][0]
+        return rows
+
+    async def run(self):
+        while True:
+            if self.subscribers:
+                try:
+                    rows = await run_in_threadpool(self._poll)
+                except sqlite3.Error:
+                    self._watch = None
+                    rows = []
+                for rowid, payload in rows:
+                    self.publish({"id": rowid, **payload})
+            else:
+                self._last_rowid = None
+            await asyncio.sleep(self.poll_interval)
+
+
+read_pool = ReadConnectionPool(local_storage.DB_PATH)
+latest_cache = LatestSnapshotCache(read_pool)
+broadcaster = ResultBroadcaster(read_pool)
+
+
+async def latest_response(request: Request, session_id=None):
+    with metrics.stage("api_latest"):
+        if await run_in_threadpool(latest_cache.is_fresh, session_id):
+            snapshot = latest_cache.get(session_id)
+        else:
+            snapshot = None
+        if snapshot is None:
+            snapshot = await run_in_threadpool(latest_cache.refresh, session_id)
+    etag, body = snapshot
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/latest")
-def get_latest_metrics():
-    conn = sqlite3.connect("local_data.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT session_id, timestamp, muscle_fatigue, muscle_activation, force,
-               velocity, power_output, firing_rate, intensity, work_ratio
-        FROM processed_results
-        ORDER BY rowid DESC LIMIT 1
-    """)
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return {
-            "session_id": row[0],
-            "timestamp": row[1],
-            "muscle_fatigue": row[2],
-            "muscle_activation": row[3],
-            "force": row[4],
-            "velocity": row[5],
-            "power_output": row[6],
-            "firing_rate": row[7],
-            "intensity": row[8],
-            "work_ratio": row[9],
-        }
-    else:
-        return {"error": "No data found"}
+async def get_latest_metrics(request: Request, session_id: str = None):
+    return await latest_response(request, session_id)
+
+
+@app.get("/api/sessions/{session_id}/latest")
+async def get_session_latest_metrics(request: Request, session_id: str):
+    return await latest_response(request, session_id)
+
+
+def sse_event(event):
+    body = json.dumps({k: v for k, v in event.items() if k != "id"})
+    return f"id: {event['id']}\nevent: window\ndata: {body}\n\n"
+
+
+@app.get("/api/stream")
+async def stream_metrics(request: Request, session_id: str = None):
+    """
+    Server-Sent Events stream of processed windows, optionally for one session.
+    A reconnecting EventSource sends Last-Event-ID and gets the windows it missed.
+    """
+    q = broadcaster.subscribe(session_id)
+    last_event_id = request.headers.get("last-event-id")
+
+    async def events():
+        sent = 0
+        try:
+            if last_event_id and last_event_id.isdigit():
+                missed = await run_in_threadpool(
+                    broadcaster.fetch_after, int(last_event_id), session_id, broadcaster.queue_size
+                )
+                for rowid, payload in missed:
+                    sent = rowid
+                    yield sse_event({"id": rowid, **payload})
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["id"] > sent:
+                    sent = event["id"]
+                    yield sse_event(event)
+        finally:
+            broadcaster.unsubscribe(q)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def query_sessions(limit, offset):
+    with read_pool.connection() as conn:
+        rows = conn.execute("""
+            SELECT session_id, COUNT(*), MIN(ts_epoch), MAX(ts_epoch)
+            FROM processed_results
+            GROUP BY session_id
+            ORDER BY session_id
+            LIMIT ? OFFSET ?
+        """, (limit, offset)).fetchall()
+    return [
+        {"session_id": r[0], "count": r[1], "first_ts": r[2], "last_ts": r[3]}
+        for r in rows
+    ]
+
+
+def parse_cursor(cursor):
+    """(ts_epoch, row) from a "<ts_epoch>:<row>" page cursor; ValueError if malformed."""
+    ts, _, row = cursor.rpartition(":")
+    return float(ts), int(row)
+
+
+def format_cursor(ts, row):
+    return f"{float(ts)!r}:{int(row)}"
+
+
+def query_series(session_id, metric, ts_from, ts_to, channel, limit, after=None):
+    """
+    Raw rows of one metric in [ts_from, ts_to), ordered by (ts_epoch, rowid) and
+    served from the (session_id[, channel], ts_epoch) indexes. `after` is the
+    (ts_epoch, rowid) of the last row of the previous page, so rows sharing a
+    timestamp are split across pages without repeats. Returns (ts, values,
+    channels, next_cursor); next_cursor is None on the last page.
+    """
+    where = ["session_id = ?"]
+    params = [session_id]
+    if channel is not None:
+        where.append("channel = ?")
+        params.append(channel)
+    if ts_from is not None:
+        where.append("ts_epoch >= ?")
+        params.append(ts_from)
+    if ts_to is not None:
+        where.append("ts_epoch < ?")
+        params.append(ts_to)
+    if after is not None:
+        where.append("(ts_epoch > ? OR (ts_epoch = ? AND rowid > ?))")
+        params.extend((after[0], after[0], after[1]))
+    params.append(limit + 1)
+    with read_pool.connection() as conn:
+        rows = conn.execute(f"""
+            SELECT ts_epoch, rowid, channel, {metric}
+            FROM processed_results
+            WHERE {" AND ".join(where)} AND ts_epoch IS NOT NULL
+            ORDER BY ts_epoch, rowid
+            LIMIT ?
+        """, params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = format_cursor(rows[-1][0], rows[-1][1])
+    if not rows:
+        return query_archived_series(session_id, metric, ts_from, ts_to, channel, limit, after)
+    ts = np.array([r[0] for r in rows], dtype=float)
+    values = np.array([r[3] for r in rows], dtype=float)
+    channels = np.array([r[2] for r in rows], dtype=object)
+    return ts, values, channels, next_cursor
+
+
+def query_archived_series(session_id, metric, ts_from, ts_to, channel, limit, after=None):
+    """
+    Same as query_series for a session that was compacted into the archive; the
+    archive keeps the (ts_epoch, rowid) order, so a row's position stands in for rowid.
+    """
+    data = load_session_archive(session_id, ("ts_epoch", metric, "channel"))
+    if data is None:
+        return np.array([]), np.array([]), np.array([], dtype=object), None
+    ts = data["ts_epoch"]
+    position = np.arange(len(ts))
+    mask = np.ones(len(ts), dtype=bool)
+    if channel is not None:
+        mask &= data["channel"] == channel
+    if ts_from is not None:
+        mask &= ts >= ts_from
+    if ts_to is not None:
+        mask &= ts < ts_to
+    if after is not None:
+        mask &= (ts > after[0]) | ((ts == after[0]) & (position > after[1]))
+    rows = position[mask]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = format_cursor(ts[rows[-1]], rows[-1])
+    return ts[rows], data[metric][rows].astype(np.float64), data["channel"][rows], next_cursor
+
+
+def channel_series(ts, values, channels):
+    """Split one page into [(channel, ts, values)], channels in order of first appearance."""
+    series = []
+    for name in dict.fromkeys(channels.tolist()):
+        mask = channels == name
+        series.append((name, ts[mask], values[mask]))
+    return series
+
+
+@app.get("/api/sessions")
+async def list_sessions(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    try:
+        sessions = await run_in_threadpool(query_sessions, limit, offset)
+    except sqlite3.Error:
+        sessions = []
+    return {"sessions": sessions, "limit": limit, "offset": offset}
+
+
+@app.get("/api/sessions/{session_id}/series")
+async def get_session_series(
+    session_id: str,
+    metric: str,
+    ts_from: float = Query(None, alias="from"),
+    ts_to: float = Query(None, alias="to"),
+    max_points: int = Query(1000, ge=3, le=MAX_SERIES_POINTS),
+    channel: str = None,
+    method: str = "lttb",
+    limit: int = Query(MAX_PAGE_ROWS, ge=1, le=MAX_PAGE_ROWS),
+    cursor: str = None,
+):
+    """
+    Downsampled history of one metric, one series per channel (only the requested
+    one if `channel` is given). `from`/`to` are UTC epoch seconds; `method` is
+    "lttb" or "minmax". At most `limit` raw rows are read per call; when more remain,
+    pass `next_cursor` back as `cursor` for the next page. Sessions that were moved
+    to the session archive are read from there.
+    """
+    if metric not in METRIC_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(METRIC_COLUMNS)}")
+    if method not in DOWNSAMPLERS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(DOWNSAMPLERS)}")
+    try:
+        after = parse_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor must be a next_cursor value from a previous page")
+
+    try:
+        ts, values, channels, next_cursor = await run_in_threadpool(
+            query_series, session_id, metric, ts_from, ts_to, channel, limit, after
+        )
+    except sqlite3.Error:
+        ts, values, channels, next_cursor = np.array([]), np.array([]), np.array([], dtype=object), None
+    series = []
+    for name, raw_ts, raw_values in channel_series(ts, values, channels):
+        xs, ys = DOWNSAMPLERS[method](raw_ts, raw_values, max_points)
+        series.append({
+            "channel": name,
+            "count": int(len(raw_ts)),
+            "points": [[float(x), None if np.isnan(y) else float(y)] for x, y in zip(xs, ys)],
+        })
+    return {
+        "session_id": session_id,
+        "metric": metric,
+        "channel": channel,
+        "method": method,
+        "from": ts_from,
+        "to": ts_to,
+        "count": int(len(ts)),
+        "series": series,
+        "next_cursor": next_cursor,
+    }
+
 
+@app.get("/metrics")
+def get_metrics():
+    """
+    Prometheus text format: this process's metrics plus the textfiles that the
+    processing processes write to instrumentation.METRICS_DIR.
+    """
+    metrics.set_gauge("vitaly_sse_subscribers", len(broadcaster.subscribers))
+    return PlainTextResponse(merge_textfiles(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,190 @@
+# batch_runner.py
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+from alignment import fallback_warning
+from my_signal_processing_module import EMG_CHANNELS
+from local_storage import init_db, insert_result_columns
+from instrumentation import enable_profiling, metrics, profile_session, textfile_path
+from recording_pipeline import process_recording_file, recording_key, session_row_ids, window_timestamps
+from result_cache import CACHE_DIR, DEFAULT_MAX_BYTES, ResultCache
+from session_docs import result_columns
+from smoothing import SMOOTHING_MODES
+
+
+def find_recordings(emg_dir: str, acc_dir: str):
+    """Pair every EMG T*.txt with the trajectory file of the same name."""
+    pairs = []
+    for emg_file in sorted(f for f in os.listdir(emg_dir) if f.endswith(".txt")):
+        base_name = os.path.splitext(emg_file)[0]
+        full_acc_path = os.path.join(acc_dir, base_name + ".txt")
+        if not os.path.exists(full_acc_path):
+            print(f"❌ Acc file not found for {emg_file}, skip.")
+            continue
+        pairs.append((f"session_{base_name}", os.path.join(emg_dir, emg_file), full_acc_path))
+    return pairs
+
+
+def process_recording(
+    session_id: str,
+    emg_file: str,
+    acc_file: str,
+    fs_emg=2000,
+    fs_acc=200,
+    overlap_ratio=0.2,
+    all_channels=False,
+    smoothing="causal",
+    dtype=np.float64,
+    result_cache=None
+):
+    """
+    Load and process one recording without any pacing or uploads. Runs inside a
+    worker process, so it returns plain arrays: results[key] is (channels, windows),
+    plus the load and compute times for the parent's metrics. With
+    `dtype=np.float32` the recording is loaded and processed in float32, which also
+    halves what has to be sent back to the parent.
+
+    `key` identifies the recording's contents and every parameter (recording_key);
+    with a ResultCache an unchanged recording is neither loaded nor processed again.
+    """
+    t0 = time.perf_counter()
+    key = recording_key(emg_file, acc_file, mode="batch", fs_emg=fs_emg, fs_acc=fs_acc, overlap_ratio=overlap_ratio,
+                        all_channels=all_channels, smoothing=smoothing, dtype=dtype)
+    if result_cache is not None:
+        cached = result_cache.get(key)
+        if cached is not None and "step_size" in cached:
+            step_size = int(cached.pop("step_size"))
+            n_channels = cached["activation"].shape[0]
+            return {"session_id": session_id, "channels": _channel_names(all_channels, n_channels),
+                    "results": cached, "step_size": step_size, "fs_emg": fs_emg, "key": key, "cached": True,
+                    "seconds": time.perf_counter() - t0, "load_sec": 0.0}
+    with profile_session(session_id):
+        output = process_recording_file(emg_file, acc_file, fs_emg, fs_acc, overlap_ratio,
+                                        n_channels=None if all_channels else 1, smoothing=smoothing, dtype=dtype,
+                                        session_id=session_id)
+    if output is None:
+        return {"session_id": session_id, "channels": [], "results": None, "key": key, "cached": False,
+                "seconds": time.perf_counter() - t0, "load_sec": 0.0}
+    results = output["results"]
+    if result_cache is not None:
+        result_cache.put(key, dict(results, step_size=np.array(output["step_size"])))
+    return {"session_id": session_id, "channels": _channel_names(all_channels, len(output["channels"])),
+            "results": results, "step_size": output["step_size"], "fs_emg": fs_emg, "key": key, "cached": False,
+            "alignment": output["alignment"], "seconds": output["seconds"], "load_sec": output["load_sec"]}
+
+
+def _channel_names(all_channels, n_channels):
+    return list(EMG_CHANNELS[:n_channels]) if all_channels else [None]
+
+
+def write_recording(output):
+    """
+    Store one processed recording, window by window and channel by channel. Row ids
+    follow from the session and the result key, so rows a previous run already stored
+    are skipped. Returns the number of new rows.
+    """
+    results = output["results"]
+    if results is None:
+        return 0
+    n_windows = results["activation"].shape[1]
+    window_ts = window_timestamps(datetime.utcnow(), n_windows, output["step_size"], output["fs_emg"])
+    n_channels = len(output["channels"])
+    channels = list(output["channels"]) * n_windows
+    timestamps = [ts for ts in window_ts for _ in range(n_channels)]
+    row_ids = session_row_ids(output["session_id"], output["key"], len(channels))
+    return len(insert_result_columns(output["session_id"], timestamps, result_columns(results), channels, row_ids))
+
+
+def run_batch(emg_dir: str, acc_dir: str, workers=None, all_channels=False, **params):
+    """
+    Process every recording in emg_dir/acc_dir on a process pool and write the results
+    in file order as soon as each prefix of the file list is complete.
+    """
+    recordings = find_recordings(emg_dir, acc_dir)
+    if not recordings:
+        print(f"❌ No .txt in {emg_dir}, skip.")
+        return []
+
+    init_db()
+    workers = workers or os.cpu_count() or 1
+    t_start = time.perf_counter()
+    report = []
+    done = {}
+    next_to_write = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_recording, session_id, emg_file, acc_file,
+                        all_channels=all_channels, **params): idx
+            for idx, (session_id, emg_file, acc_file) in enumerate(recordings)
+        }
+        for future in as_completed(futures):
+            done[futures[future]] = future.result()
+            while next_to_write in done:
+                output = done.pop(next_to_write)
+                warning = fallback_warning(output.get("alignment"), *recordings[next_to_write][1:])
+                if warning:
+                    print(warning)
+                # load / compute / cache lookups ran in a worker process; only their outcome comes back
+                session_id = output["session_id"]
+                if output.get("cached"):
+                    metrics.inc("vitaly_result_cache_total", result="hit")
+                else:
+                    if params.get("result_cache") is not None:
+                        metrics.inc("vitaly_result_cache_total", result="miss")
+                    metrics.observe("vitaly_stage_seconds", output["load_sec"], stage="load", session=session_id)
+                    metrics.observe("vitaly_stage_seconds", output["seconds"] - output["load_sec"],
+                                    stage="window_compute", session=session_id)
+                t0 = time.perf_counter()
+                n_rows = write_recording(output)
+                write_sec = time.perf_counter() - t0
+                report.append({
+                    "session_id": output["session_id"],
+                    "rows": n_rows,
+                    "cached": output.get("cached", False),
+                    "process_sec": output["seconds"],
+                    "write_sec": write_sec,
+                })
+                source = "cached" if output.get("cached") else f"process {output['seconds']:.2f}s"
+                print(f"[{next_to_write + 1}/{len(recordings)}] {output['session_id']}: "
+                      f"{n_rows} new rows, {source}, write {write_sec:.2f}s")
+                next_to_write += 1
+
+    total = time.perf_counter() - t_start
+    print(f"✅ Batch done: {len(recordings)} recordings with {workers} workers in {total:.2f}s")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process recordings in parallel, without pacing.")
+    parser.add_argument("--emg-dir", default="../data/V4/EMG")
+    parser.add_argument("--acc-dir", default="../data/V4/Trajectories")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--all-channels", action="store_true")
+    parser.add_argument("--smoothing", choices=SMOOTHING_MODES, default="causal")
+    parser.add_argument("--float32", action="store_true", help="load and process recordings in float32")
+    parser.add_argument("--result-cache", default=CACHE_DIR,
+                        help="directory of cached results for unchanged recordings ('' to disable)")
+    parser.add_argument("--result-cache-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20)
+    parser.add_argument("--profile-session", action="append", default=[],
+                        help="write a cProfile/tracemalloc capture for this session (repeatable)")
+    args = parser.parse_args()
+    for session_id in args.profile_session:
+        enable_profiling(session_id)
+    if args.profile_session:
+        os.environ["VITALY_PROFILE_SESSIONS"] = ",".join(args.profile_session)  # for spawned workers
+    result_cache = ResultCache(args.result_cache, int(args.result_cache_mb * 2**20)) if args.result_cache else None
+    run_batch(args.emg_dir, args.acc_dir, workers=args.workers, all_channels=args.all_channels,
+              smoothing=args.smoothing, dtype=np.float32 if args.float32 else np.float64,
+              result_cache=result_cache)
+    metrics.write_textfile(textfile_path("batch_runner"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+# benchmark_pipeline.py
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import scipy
+
+import local_storage
+from alignment import align_by_rate
+from data_cache import clear_cache
+from generate_synthetic_data import generate_recording
+from my_signal_processing_module import (
+    EMG_CHANNELS,
+    compute_window_params,
+    load_emg_data,
+    load_accelerometer_data,
+    process_emg_acc_signals,
+    process_emg_acc_signals_batch
+)
+from streaming_processor import StreamingEmgProcessor
+
+RESULTS_DIR = "benchmark_results"
+# entry points timed in a fresh interpreter; none may take longer to import than the budget,
+# or pull in a module that is only needed for plotting, parsing or uploads
+STARTUP_MODULES = ("my_signal_processing_module", "batch_runner", "realtime_processor",
+                   "ingest_scheduler", "sync_worker", "api_server", "session_report")
+IMPORT_BUDGET_SEC = 1.0
+LAZY_MODULES = ("matplotlib", "pandas", "scipy.signal", "firebase_admin", "firebase_connect")
+
+
+def latency_summary(seconds):
+    """Mean and percentiles of a list of per-item latencies, in milliseconds."""
+    ms = np.asarray(seconds, dtype=float) * 1000
+    if ms.size == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(ms.max()),
+    }
+
+
+def run_stage(fn, items, unit, repeat, setup=None):
+    """
+    Time `fn` `repeat` times (after `setup`, which is not timed), then run it once
+    more under tracemalloc for the peak of Python + NumPy allocations.
+    `fn` may return a list of per-item latencies, which is summarised as well.
+    """
+    times = []
+    latencies = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        latencies = fn()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = float(np.median(times))
+    stage = {
+        "seconds": seconds,
+        "best_seconds": float(min(times)),
+        "items": items,
+        "unit": unit,
+        "throughput": items / seconds if seconds > 0 else None,
+        "peak_bytes": int(peak),
+    }
+    if latencies is not None:
+        stage["latency"] = latency_summary(latencies)
+    return stage
+
+
+def git_revision():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def bench_load(emg_file, acc_file, repeat):
+    stages = {}
+    n_bytes = os.path.getsize(emg_file) + os.path.getsize(acc_file)
+
+    def load(use_cache, dtype=np.float64):
+        load_emg_data(emg_file, use_cache=use_cache, dtype=dtype)
+        load_accelerometer_data(acc_file, use_cache=use_cache, dtype=dtype)
+
+    def drop_cache():
+        clear_cache(os.path.dirname(emg_file))
+        clear_cache(os.path.dirname(acc_file))
+
+    stages["load_loadtxt"] = run_stage(lambda: load(False), n_bytes, "bytes/s", repeat)
+    stages["load_cache_cold"] = run_stage(lambda: load(True), n_bytes, "bytes/s", repeat, setup=drop_cache)
+    load(True)
+    stages["load_cache_warm"] = run_stage(lambda: load(True), n_bytes, "bytes/s", repeat)
+    load(True, np.float32)
+    stages["load_cache_warm_float32"] = run_stage(lambda: load(True, np.float32), n_bytes, "bytes/s", repeat)
+    return stages
+
+
+def bench_process(emg, acc, params, fs_emg, fs_acc, chunk_size, repeat, alignment=None):
+    """
+    emg / acc are (channels, samples) arrays; `alignment` (AccAlignment) maps the
+    windows onto acc for the reference and batch paths.
+    """
+    window_size, step_size, num_windows, nfft_emg = params
+    aligned = {} if alignment is None else {"acc_starts": alignment.starts, "acc_lengths": alignment.lengths}
+    n_channels, n_samples = emg.shape
+    total = n_channels * n_samples
+    stages = {}
+
+    def reference():
+        for ch in range(n_channels):
+            process_emg_acc_signals(
+                emg[ch], acc[ch], fs_emg, fs_acc, num_windows, window_size, step_size, nfft_emg, nfft_emg, 0,
+                **aligned
+            )
+
+    emg32, acc32 = emg.astype(np.float32), acc.astype(np.float32)
+
+    def batch(dtype=np.float64):
+        emg_in, acc_in = (emg32, acc32) if dtype == np.float32 else (emg, acc)
+        process_emg_acc_signals_batch(
+            emg_in, acc_in, fs_emg, fs_acc, num_windows, window_size, step_size, nfft_emg, nfft_emg, 0,
+            dtype=dtype, **aligned
+        )
+
+    def streaming(dtype=np.float64):
+        processor = StreamingEmgProcessor(n_channels, fs_emg, fs_acc, window_size, step_size, nfft_emg,
+                                          dtype=dtype)
+        emg_rows, acc_rows = (emg32.T, acc32.T) if dtype == np.float32 else (emg.T, acc.T)
+        latencies = []
+        for p in range(0, n_samples, chunk_size):
+            start = time.perf_counter()
+            emitted = processor.push(emg_rows[p:p + chunk_size], acc_rows[p:p + chunk_size])
+            elapsed = time.perf_counter() - start
+            if emitted:
+                latencies.extend([elapsed / len(emitted)] * len(emitted))
+        return latencies
+
+    stages["process_reference"] = run_stage(reference, total, "samples/s", repeat)
+    stages["process_batch"] = run_stage(batch, total, "samples/s", repeat)
+    stages["process_streaming"] = run_stage(streaming, total, "samples/s", repeat)
+    stages["process_batch_float32"] = run_stage(lambda: batch(np.float32), total, "samples/s", repeat)
+    stages["process_streaming_float32"] = run_stage(lambda: streaming(np.float32), total, "samples/s", repeat)
+    # the batch stages process every window in one call, so only the mean cost per window is known
+    n_win = max(num_windows, 0) * n_channels
+    for name in ("process_reference", "process_batch", "process_batch_float32"):
+        if n_win:
+            stages[name]["window_mean_ms"] = stages[name]["seconds"] / n_win * 1000
+    return stages
+
+
+def bench_imports(modules=STARTUP_MODULES, repeat=3):
+    """
+    Import each module in a new interpreter (best of `repeat`, so the OS file cache
+    is warm) and list which LAZY_MODULES it loaded.
+    """
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import {module}\n"
+        "print(time.perf_counter() - start)\n"
+        "print(','.join(m for m in {lazy!r} if m in sys.modules))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")])))
+    results = {}
+    for module in modules:
+        times = []
+        loaded = []
+        error = None
+        for _ in range(repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", script.format(module=module, lazy=LAZY_MODULES)],
+                capture_output=True, text=True, env=env, cwd=here
+            )
+            if out.returncode != 0:
+                error = out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}"
+                break
+            seconds, modules_line = (out.stdout.strip().splitlines() + [""])[:2]
+            times.append(float(seconds))
+            loaded = [m for m in modules_line.split(",") if m]
+        if error is not None:
+            results[module] = {"skipped": error}
+        else:
+            results[module] = {"seconds": min(times), "eager_imports": loaded}
+    return results
+
+
+def make_records(session_id, n_rows, n_channels):
+    channels = [EMG_CHANNELS[i % len(EMG_CHANNELS)] for i in range(n_channels)]
+    values = np.random.default_rng(0).random((n_rows, 8))
+    now = datetime.utcnow().isoformat()
+    return [
+        {
+            'session_id': session_id,
+            'timestamp': now,
+            'muscle_fatigue': float(v[0]),
+            'muscle_activation': float(v[1]),
+            'force': float(v[2]),
+            'velocity': float(v[3]),
+            'power_output': float(v[4]),
+            'firing_rate': float(v[5]),
+            'intensity': float(v[6]),
+            'work_ratio': float(v[7]),
+            'channel': channels[i % n_channels],
+        }
+        for i, v in enumerate(values)
+    ]
+
+
+def bench_storage(n_rows, n_channels, repeat):
+    records = make_records("bench_session", n_rows, n_channels)
+
+    def insert_each():
+        latencies = []
+        for rec in records:
+            start = time.perf_counter()
+            local_storage.insert_result(rec)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    def insert_many():
+        local_storage.insert_results_many(records)
+
+    return {
+        "insert_result": run_stage(insert_each, n_rows, "rows/s", repeat),
+        "insert_results_many": run_stage(insert_many, n_rows, "rows/s", repeat),
+    }
+
+
+def bench_api(n_requests, repeat):
+    try:
+        from fastapi.testclient import TestClient
+        import api_server
+    except ImportError as e:
+        return {"api_latest": {"skipped": f"missing dependency: {e}"}}
+
+    client = TestClient(api_server.app)
+    url = "/api/sessions/bench_session/latest"
+    record = make_records("bench_session", 1, 1)[0]
+
+    def requests(headers=None, write_first=False):
+        latencies = []
+        for _ in range(n_requests):
+            if write_first:
+                local_storage.insert_result(record)
+            start = time.perf_counter()
+            response = client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in (200, 304):
+                raise RuntimeError(f"{url} returned {response.status_code}")
+        return latencies
+
+    etag = client.get(url).headers["ETag"]
+    return {
+        "api_latest": run_stage(requests, n_requests, "requests/s", repeat),
+        "api_latest_304": run_stage(lambda: requests({"If-None-Match": etag}), n_requests, "requests/s", repeat),
+        # timed per request only; the insert in between invalidates the snapshot
+        "api_latest_after_write": run_stage(lambda: requests(write_first=True), n_requests, "requests/s", repeat),
+    }
+
+
+def run_benchmark(
+    duration_s=60.0,
+    n_channels=4,
+    fs_emg=2000,
+    fs_acc=200,
+    overlap_ratio=0.2,
+    seed=0,
+    repeat=3,
+    chunk_size=100,
+    db_rows=2000,
+    api_requests=500,
+    work_dir=None,
+    skip_api=False,
+    skip_imports=False
+):
+    """
+    Generate one seeded device-layout recording and time each pipeline stage on it.
+    Returns a JSON-serialisable dict of {meta, stages}.
+    """
+    with tempfile.TemporaryDirectory(prefix="vitaly-bench-") as tmp:
+        work_dir = work_dir or tmp
+        emg_file = os.path.join(work_dir, "EMG", "bench.txt")
+        acc_file = os.path.join(work_dir, "Trajectories", "bench.txt")
+        os.makedirs(os.path.dirname(emg_file), exist_ok=True)
+        os.makedirs(os.path.dirname(acc_file), exist_ok=True)
+
+        start = time.perf_counter()
+        generate_recording(emg_file, acc_file, duration_s, fs_emg, fs_acc, seed, device_layout=True)
+        generate_sec = time.perf_counter() - start
+
+        stages = bench_load(emg_file, acc_file, repeat)
+
+        emg_data = load_emg_data(emg_file)
+        acc_data = load_accelerometer_data(acc_file)
+        # more channels than the recording has are made by repeating its columns
+        emg = np.tile(emg_data.T, (-(-n_channels // emg_data.shape[1]), 1))[:n_channels]
+        acc = np.broadcast_to(acc_data[:, 0], (n_channels, acc_data.shape[0]))
+        params = compute_window_params(emg.shape[1], fs_emg, overlap_ratio)
+        alignment = align_by_rate(emg.shape[1], acc.shape[1], fs_emg, fs_acc, *params[:3])
+        stages.update(bench_process(emg, acc, params, fs_emg, fs_acc, chunk_size, repeat, alignment))
+
+        old_db_path = local_storage.DB_PATH
+        local_storage.DB_PATH = os.path.join(work_dir, "bench.db")
+        try:
+            local_storage.init_db()
+            stages.update(bench_storage(db_rows, n_channels, repeat))
+            if not skip_api:
+                stages.update(bench_api(api_requests, repeat))
+        finally:
+            local_storage.close_connection()
+            local_storage.DB_PATH = old_db_path
+
+    imports = {} if skip_imports else bench_imports(repeat=repeat)
+
+    window_size, step_size, num_windows, nfft_emg = params
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {
+                "duration_s": duration_s,
+                "channels": n_channels,
+                "fs_emg": fs_emg,
+                "fs_acc": fs_acc,
+                "overlap_ratio": overlap_ratio,
+                "seed": seed,
+                "repeat": repeat,
+                "chunk_size": chunk_size,
+                "db_rows": db_rows,
+                "api_requests": api_requests,
+                "window_size": window_size,
+                "step_size": step_size,
+                "num_windows": num_windows,
+                "nfft_emg": nfft_emg,
+            },
+            "generate_sec": generate_sec,
+        },
+        "stages": stages,
+        "imports": imports,
+    }
+
+
+def compare(report, baseline, tolerance=0.15):
+    """
+    Compare stage throughput against a previous report. Returns the names of stages
+    that got slower by more than `tolerance` (0.15 = 15 %).
+    """
+    regressions = []
+    for name, stage in report["stages"].items():
+        old = baseline.get("stages", {}).get(name, {})
+        if not stage.get("throughput") or not old.get("throughput"):
+            continue
+        ratio = stage["throughput"] / old["throughput"]
+        flag = "❌" if ratio < 1 - tolerance else "✅"
+        print(f"{flag} {name:<24} {ratio:6.2f}x  ({old['throughput']:.4g} -> {stage['throughput']:.4g} {stage['unit']})")
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def print_report(report):
+    for name, stage in report["stages"].items():
+        if "skipped" in stage:
+            print(f"⚠️ {name}: skipped ({stage['skipped']})")
+            continue
+        line = (f"{name:<24} {stage['seconds'] * 1000:10.2f} ms  {stage['throughput']:12.4g} {stage['unit']:<11}"
+                f"  peak {stage['peak_bytes'] / 2**20:8.2f} MiB")
+        latency = stage.get("latency")
+        if latency and latency.get("count"):
+            line += f"  p50 {latency['p50_ms']:.3f} / p99 {latency['p99_ms']:.3f} ms"
+        elif "window_mean_ms" in stage:
+            line += f"  mean {stage['window_mean_ms']:.3f} ms/window"
+        print(line)
+    for module, result in report.get("imports", {}).items():
+        if "skipped" in result:
+            print(f"⚠️ import {module}: skipped ({result['skipped']})")
+            continue
+        flag = "❌" if import_problems(result) else "✅"
+        eager = f"  eager: {', '.join(result['eager_imports'])}" if result["eager_imports"] else ""
+        print(f"{flag} import {module:<28} {result['seconds'] * 1000:8.1f} ms{eager}")
+
+
+def import_problems(result):
+    if "skipped" in result:
+        return False
+    return result["seconds"] > IMPORT_BUDGET_SEC or bool(result["eager_imports"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark load / process / store / API stages on synthetic data.")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of synthetic recording")
+    parser.add_argument("--channels", type=int, default=4, help="EMG channels processed together")
+    parser.add_argument("--fs-emg", type=int, default=2000)
+    parser.add_argument("--fs-acc", type=int, default=200)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=100, help="samples per streaming push")
+    parser.add_argument("--db-rows", type=int, default=2000)
+    parser.add_argument("--api-requests", type=int, default=500)
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--skip-imports", action="store_true", help="skip the import-time budget check")
+    parser.add_argument("--work-dir", default=None, help="keep generated files here instead of a temp dir")
+    parser.add_argument("--output", default=None, help=f"JSON file (default: {RESULTS_DIR}/bench-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        duration_s=args.duration,
+        n_channels=args.channels,
+        fs_emg=args.fs_emg,
+        fs_acc=args.fs_acc,
+        overlap_ratio=args.overlap,
+        seed=args.seed,
+        repeat=args.repeat,
+        chunk_size=args.chunk_size,
+        db_rows=args.db_rows,
+        api_requests=args.api_requests,
+        work_dir=args.work_dir,
+        skip_api=args.skip_api,
+        skip_imports=args.skip_imports
+    )
+    print_report(report)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Report saved: {output}")
+
+    failed = []
+    slow = [module for module, result in report["imports"].items() if import_problems(result)]
+    if slow:
+        print(f"❌ Over the {IMPORT_BUDGET_SEC:g}s import budget or importing heavy modules eagerly: {', '.join(slow)}")
+        failed += slow
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ Regressions: {', '.join(regressions)}")
+            failed += regressions
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# data_cache.py
+
+import hashlib
+import os
+import warnings
+
+import numpy as np
+
+CACHE_DIR_NAME = ".npy_cache"
+
+
+def _cache_path(filename, usecols, cache_dir=None, dtype=np.float64):
+    """
+    Sidecar location for one parsed text file. The name carries the selected columns
+    (and the dtype, if not float64) plus a digest of the absolute path, mtime and
+    size, so an edited recording never hits a stale entry. Returns (path, prefix
+    shared by all versions of this file).
+    """
+    st = os.stat(filename)
+    abs_path = os.path.abspath(filename)
+    cols = ",".join(map(str, usecols))
+    if np.dtype(dtype) != np.float64:
+        cols += f"|{np.dtype(dtype).str}"
+    cols_key = hashlib.sha1(cols.encode("utf-8")).hexdigest()[:8]
+    key = f"{abs_path}|{st.st_mtime_ns}|{st.st_size}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(abs_path), CACHE_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    prefix = f"{stem}-{cols_key}-"
+    return os.path.join(cache_dir, f"{prefix}{digest}.npy"), prefix
+
+
+def parse_columns(filename, usecols, dtype=np.float64):
+    """
+    Parse the selected columns of a tab-separated file with one header row. Blank
+    fields (e.g. a marker that dropped out) become NaN through the slower genfromtxt.
+    """
+    usecols = list(usecols)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # header-only file: "input contained no data"
+        try:
+            data = np.loadtxt(filename, delimiter="\t", skiprows=1, usecols=usecols, dtype=dtype, ndmin=2)
+        except ValueError:
+            data = np.genfromtxt(filename, delimiter="\t", skip_header=1, usecols=usecols, dtype=dtype,
+                                 filling_values=np.nan, ndmin=2)
+    if data.size == 0:
+        return np.empty((0, len(usecols)), dtype=dtype)
+    return data
+
+
+def load_columns_cached(filename, usecols, cache_dir=None, use_cache=True, dtype=np.float64):
+    """
+    Return the selected columns of `filename` as a (samples, len(usecols)) array.
+
+    The first load parses the text and writes a .npy sidecar; later loads memory-map
+    that sidecar read-only, so no parsing or copying happens until the data is touched.
+    Stale sidecars of the same recording are removed when a new one is written.
+    `dtype=np.float32` parses straight to float32 and keeps its own sidecar, half
+    the size of the float64 one. If the sidecar cannot be written (e.g. a read-only
+    data directory), the parsed array is returned uncached.
+    """
+    usecols = list(usecols)
+    if not use_cache:
+        return parse_columns(filename, usecols, dtype)
+
+    path, prefix = _cache_path(filename, usecols, cache_dir, dtype)
+    if os.path.exists(path):
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            pass
+
+    data = np.ascontiguousarray(parse_columns(filename, usecols, dtype))
+    directory, name = os.path.split(path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return data
+
+    for other in os.listdir(directory):
+        if other.startswith(prefix) and other.endswith(".npy") and other != name:
+            try:
+                os.remove(os.path.join(directory, other))
+            except OSError:
+                pass
+
+    return np.load(path, mmap_mode="r")
+
+
+def clear_cache(directory):
+    """Delete every sidecar under `directory`/.npy_cache."""
+    cache_dir = os.path.join(directory, CACHE_DIR_NAME)
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npy"):
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
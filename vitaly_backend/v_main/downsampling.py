@@ -0,0 +1,67 @@
+# downsampling.py
+
+import numpy as np
+
+
+def minmax_downsample(x, y, max_points):
+    """
+    Keep the min and max sample of each of max_points // 2 equal-count buckets, in
+    time order. Preserves peaks, which is what fatigue/force charts need.
+    Returns (x, y); inputs with at most max_points samples are returned unchanged.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    n_buckets = max_points // 2
+    if n <= max_points or n_buckets < 1:
+        return x, y
+
+    starts = np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(n_buckets), np.diff(np.append(starts, n)))
+    positions = np.arange(n)
+    # index of the first min / max in each bucket
+    is_min = y == np.minimum.reduceat(y, starts)[bucket]
+    is_max = y == np.maximum.reduceat(y, starts)[bucket]
+    first_min = np.minimum.reduceat(np.where(is_min, positions, n), starts)
+    first_max = np.minimum.reduceat(np.where(is_max, positions, n), starts)
+
+    idx = np.unique(np.concatenate((first_min, first_max)))
+    idx = idx[idx < n]
+    return x[idx], y[idx]
+
+
+def lttb_downsample(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point and, per bucket,
+    the point forming the largest triangle with the previous pick and the next
+    bucket's mean. Returns (x, y); short inputs are returned unchanged.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    idx = np.empty(max_points, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+    prev = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nlo, nhi = hi, edges[b + 2] if b + 2 < len(edges) else n
+        avg_x = x[nlo:nhi].mean() if nhi > nlo else x[-1]
+        avg_y = y[nlo:nhi].mean() if nhi > nlo else y[-1]
+        area = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        idx[b + 1] = prev
+    return x[idx], y[idx]
+
+
+DOWNSAMPLERS = {
+    "lttb": lttb_downsample,
+    "minmax": minmax_downsample,
+}
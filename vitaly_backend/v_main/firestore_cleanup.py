@@ -0,0 +1,143 @@
+# firestore_cleanup.py
+
+import argparse
+import json
+import os
+
+from firestore_client import get_db
+from firestore_writer import MAX_BATCH_OPS, FirestoreBatchWriter
+from instrumentation import metrics
+
+metrics.describe("vitaly_cleanup_deleted_total", "counter",
+                 "Firestore documents deleted (or counted in a dry run) by cleanup.")
+
+
+# users/{user}/sessions/{session}/{result collection}/{doc}: only session documents
+# have subcollections, so result documents are not asked for theirs (one round trip each).
+SESSION_DEPTH = 1
+
+
+def iter_subtree(collection_ref, depth=SESSION_DEPTH, page_size=MAX_BATCH_OPS):
+    """
+    Yield every document reference under `collection_ref`, children before their
+    parent, looking for subcollections `depth` levels down. Collections are listed
+    page by page with list_documents(), which also returns "missing" parents that
+    only hold subcollections, so nothing is orphaned.
+    """
+    for doc_ref in collection_ref.list_documents(page_size=page_size):
+        if depth > 0:
+            for sub_ref in doc_ref.collections():
+                yield from iter_subtree(sub_ref, depth - 1, page_size)
+        yield doc_ref
+
+
+class CleanupCheckpoint:
+    """
+    Progress of a multi-user cleanup in a small JSON file: the users that were fully
+    deleted and the running document count. Written after every user, atomically
+    (tmp file + rename). A user that was interrupted half way is simply listed again
+    on resume; its deleted documents are gone, so only the rest is visited.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.users_done = set()
+        self.deleted = 0
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.users_done = set(state.get("users_done", []))
+            self.deleted = state.get("deleted", 0)
+
+    def mark_done(self, user_id, deleted):
+        self.users_done.add(user_id)
+        self.deleted += deleted
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"users_done": sorted(self.users_done), "deleted": self.deleted}, f)
+        os.replace(tmp, self.path)
+
+
+def delete_user_sessions(db, user_id, dry_run=False, page_size=MAX_BATCH_OPS, max_in_flight=4):
+    """
+    Delete users/{user_id}/sessions with everything below it. References are paged
+    and deleted through a FirestoreBatchWriter: MAX_BATCH_OPS deletes per batched
+    write, up to `max_in_flight` batches committing at once. With dry_run the
+    documents are only counted. Returns {"documents": n, "failed": n}.
+    """
+    sessions_ref = db.collection("users").document(user_id).collection("sessions")
+    if dry_run:
+        count = sum(1 for _ in iter_subtree(sessions_ref, page_size=page_size))
+        metrics.inc("vitaly_cleanup_deleted_total", count, dry_run="1")
+        return {"documents": count, "failed": 0}
+
+    count = 0
+    with FirestoreBatchWriter(db, max_in_flight=max_in_flight, flush_interval=float("inf"),
+                              session_id=f"cleanup:{user_id}") as writer:
+        for doc_ref in iter_subtree(sessions_ref, page_size=page_size):
+            writer.delete(doc_ref)
+            count += 1
+    failed = writer.failed_ops
+    metrics.inc("vitaly_cleanup_deleted_total", count - failed, dry_run="0")
+    return {"documents": count - failed, "failed": failed}
+
+
+def cleanup_users(db, user_ids, dry_run=False, checkpoint_path=None, page_size=MAX_BATCH_OPS, max_in_flight=4):
+    """
+    delete_user_sessions for many users. With `checkpoint_path`, users finished by an
+    earlier (interrupted) run are skipped and progress is recorded after each user;
+    a user whose batches failed is not marked done, so a rerun retries it.
+    """
+    checkpoint = CleanupCheckpoint(None if dry_run else checkpoint_path)
+    totals = {"users": 0, "skipped": 0, "documents": 0, "failed": 0}
+    for user_id in user_ids:
+        if user_id in checkpoint.users_done:
+            totals["skipped"] += 1
+            continue
+        stats = delete_user_sessions(db, user_id, dry_run, page_size, max_in_flight)
+        totals["users"] += 1
+        totals["documents"] += stats["documents"]
+        totals["failed"] += stats["failed"]
+        if stats["failed"]:
+            print(f"❌ {user_id}: {stats['failed']} deletes failed, rerun to retry")
+            continue
+        if not dry_run:
+            checkpoint.mark_done(user_id, stats["documents"])
+        verb = "would delete" if dry_run else "deleted"
+        print(f"✅ {user_id}: {verb} {stats['documents']} docs")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete all sessions of the given users from Firestore.")
+    parser.add_argument("users", nargs="*", help="user ids")
+    parser.add_argument("--users-file", default=None, help="file with one user id per line")
+    parser.add_argument("--dry-run", action="store_true", help="only count the documents")
+    parser.add_argument("--checkpoint", default=None, help="JSON file to resume an interrupted cleanup from")
+    parser.add_argument("--in-flight", type=int, default=4, help="batched writes committing at once")
+    parser.add_argument("--page-size", type=int, default=MAX_BATCH_OPS)
+    args = parser.parse_args()
+
+    user_ids = list(args.users)
+    if args.users_file:
+        with open(args.users_file, encoding="utf-8") as f:
+            user_ids += [line.strip() for line in f if line.strip()]
+    if not user_ids:
+        parser.error("no user ids given")
+    db = get_db()
+    if db is None:
+        print("⚠️ Firestore is disabled, nothing to clean up.")
+        return
+
+    totals = cleanup_users(db, user_ids, args.dry_run, args.checkpoint, args.page_size, args.in_flight)
+    verb = "would be removed" if args.dry_run else "removed"
+    print(f"✅ Cleanup done! {totals['documents']} docs {verb} for {totals['users']} users "
+          f"({totals['skipped']} already done, {totals['failed']} failed deletes).")
+    if totals["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# firestore_client.py
+
+import os
+import threading
+
+BACKEND_ENV = "VITALY_FIRESTORE"
+BACKENDS = ("firebase", "memory", "disabled")
+
+_backend = None
+_client = None
+_created = False
+_lock = threading.Lock()
+
+
+def backend_name():
+    """Selected backend: use_backend() if called, else $VITALY_FIRESTORE, else "firebase"."""
+    if _backend is not None:
+        return _backend if isinstance(_backend, str) else "custom"
+    name = os.environ.get(BACKEND_ENV, "firebase").strip().lower() or "firebase"
+    if name not in BACKENDS:
+        raise ValueError(f"{BACKEND_ENV} must be one of {', '.join(BACKENDS)}, got {name!r}")
+    return name
+
+
+def use_backend(backend):
+    """
+    Switch the client returned by get_db(): "firebase", "memory" (an in-process
+    MemoryFirestore), "disabled" (get_db() returns None, uploads are skipped), or
+    any client object with the firebase_admin collection()/batch() surface.
+    """
+    global _backend, _client, _created
+    if isinstance(backend, str) and backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {', '.join(BACKENDS)} or a client object")
+    with _lock:
+        _backend = backend
+        _client = None
+        _created = False
+
+
+def get_db():
+    """
+    The shared Firestore client, created on first use. Importing this module costs
+    nothing; firebase_admin is only imported (and its credentials read) when the
+    "firebase" backend is actually asked for a client.
+    """
+    global _client, _created
+    with _lock:
+        if _created:
+            return _client
+        name = backend_name()
+        if name == "custom":
+            client = _backend
+        elif name == "memory":
+            from memory_firestore import MemoryFirestore
+            client = MemoryFirestore()
+        elif name == "disabled":
+            client = None
+        else:
+            from firebase_connect import db as client
+        _client = client
+        _created = True
+        return _client
+
+
+def firestore_enabled():
+    return backend_name() != "disabled"
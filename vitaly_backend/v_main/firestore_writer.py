@@ -0,0 +1,186 @@
+# firestore_writer.py
+
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import metrics
+
+MAX_BATCH_OPS = 500  # Firestore limit for one batched write
+
+
+class FirestoreBatchWriter:
+    """
+    Groups Firestore writes into batched writes and commits them in the background.
+
+    Operations are buffered until MAX_BATCH_OPS are queued or the oldest one is
+    `flush_interval` seconds old (a timer sends a partly filled batch even if no
+    more writes come), then committed on a pool of `max_in_flight` threads.
+    Producers block once `max_in_flight` batches are pending, so memory stays bounded.
+    A failed commit is retried with exponential backoff; every op can carry a tag,
+    and `on_committed(tags)` is called only for batches that were committed.
+    Batches given up on are counted in `failed_ops`; the last `max_failed_batches`
+    of them are kept in `failed_batches` until take_failed() drains them.
+
+    Commits are recorded under the "firestore_write" stage of instrumentation.metrics,
+    labelled with `session_id` if given.
+
+    Works with the firebase_admin client or any object with the same
+    collection()/document()/batch() surface (see memory_firestore.MemoryFirestore).
+    """
+
+    def __init__(
+        self,
+        db,
+        max_batch_ops=MAX_BATCH_OPS,
+        max_in_flight=4,
+        max_retries=5,
+        backoff_base=0.5,
+        flush_interval=1.0,
+        on_committed=None,
+        session_id=None,
+        max_failed_batches=100
+    ):
+        if not 0 < max_batch_ops <= MAX_BATCH_OPS:
+            raise ValueError(f"max_batch_ops must be in 1..{MAX_BATCH_OPS}")
+        self.db = db
+        self.max_batch_ops = max_batch_ops
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.flush_interval = flush_interval
+        self.on_committed = on_committed
+        self.session_id = session_id
+
+        self._ops = []
+        self._first_op_time = None
+        self._buffer_id = 0  # bumped whenever the buffer is handed off, so a late timer is a no-op
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._futures = []
+
+        self.committed_ops = 0
+        self.failed_ops = 0
+        self.failed_batches = deque(maxlen=max_failed_batches)
+
+    def set(self, doc_ref, data, tag=None):
+        self._append(("set", doc_ref, data, tag))
+
+    def add(self, collection_ref, data, tag=None):
+        """Batched equivalent of collection_ref.add(data): auto-id document + set."""
+        doc_ref = collection_ref.document()
+        self._append(("set", doc_ref, data, tag))
+        return doc_ref
+
+    def delete(self, doc_ref, tag=None):
+        self._append(("delete", doc_ref, None, tag))
+
+    def _append(self, op):
+        with self._lock:
+            if not self._ops:
+                self._first_op_time = time.monotonic()
+                self._arm_timer()
+            self._ops.append(op)
+            full = len(self._ops) >= self.max_batch_ops
+            stale = time.monotonic() - self._first_op_time >= self.flush_interval
+        if full or stale:
+            self.flush()
+
+    def _arm_timer(self):
+        """Called with the lock held when the first op of a new buffer arrives."""
+        if self._closed or not math.isfinite(self.flush_interval):
+            return
+        self._timer = threading.Timer(self.flush_interval, self._flush_stale, (self._buffer_id,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_stale(self, buffer_id):
+        with self._lock:
+            if buffer_id != self._buffer_id or self._closed:
+                return
+        self.flush()
+
+    def flush(self):
+        """Hand the buffered ops to the commit pool (blocks while the pool is full)."""
+        with self._lock:
+            ops, self._ops = self._ops, []
+            if ops:
+                self._buffer_id += 1
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+        for start in range(0, len(ops), self.max_batch_ops):
+            chunk = ops[start:start + self.max_batch_ops]
+            self._slots.acquire()
+            future = self._pool.submit(self._commit_with_retry, chunk)
+            future.add_done_callback(lambda _f: self._slots.release())
+            with self._lock:
+                self._futures.append(future)
+        with self._lock:
+            self._futures = [f for f in self._futures if not f.done()]
+
+    def wait(self):
+        """Flush and block until every submitted batch has finished."""
+        self.flush()
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def take_failed(self):
+        """Remove and return the kept failed batches (lists of ops), oldest first."""
+        with self._lock:
+            batches = list(self.failed_batches)
+            self.failed_batches.clear()
+        return batches
+
+    def close(self):
+        self.wait()
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _commit_with_retry(self, ops):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.stage("firestore_write", self.session_id, items=len(ops)):
+                    batch = self.db.batch()
+                    for kind, ref, data, _tag in ops:
+                        if kind == "set":
+                            batch.set(ref, data)
+                        else:
+                            batch.delete(ref)
+                    batch.commit()
+                break
+            except Exception as exc:
+                if attempt == self.max_retries:
+                    print(f"❌ Firestore batch of {len(ops)} ops failed after {attempt + 1} tries: {exc}")
+                    with self._lock:
+                        self.failed_ops += len(ops)
+                        self.failed_batches.append(ops)
+                    metrics.inc("vitaly_firestore_failed_batches_total")
+                    return False
+                metrics.inc("vitaly_firestore_retries_total")
+                time.sleep(self.backoff_base * (2 ** attempt) * (0.5 + random.random()))
+
+        with self._lock:
+            self.committed_ops += len(ops)
+        if self.on_committed is not None:
+            tags = [tag for _kind, _ref, _data, tag in ops if tag is not None]
+            if tags:
+                self.on_committed(tags)
+        return True
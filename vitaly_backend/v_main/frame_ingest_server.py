@@ -0,0 +1,183 @@
+# frame_ingest_server.py
+
+import argparse
+import asyncio
+
+import numpy as np
+
+from alignment import AccTimeline
+from firestore_client import get_db
+from ingest_scheduler import IngestScheduler
+from instrumentation import TextfileExporter, metrics, textfile_path
+from local_storage import ensure_db
+from sensor_frames import (
+    FRAME_HEADER,
+    KIND_BYE,
+    KIND_HELLO,
+    KIND_SAMPLES,
+    FrameError,
+    decode_header,
+    decode_hello,
+    decode_samples
+)
+
+DEFAULT_PORT = 9500
+
+metrics.describe("vitaly_frames_total", "counter", "Sample frames received per session.")
+metrics.describe("vitaly_frame_gaps_total", "counter", "Sample frames missing according to the sequence numbers.")
+metrics.describe("vitaly_acc_late_samples_total", "counter",
+                 "Accelerometer samples dropped because their EMG samples had already been processed.")
+
+
+class _Connection:
+    def __init__(self, session_id, timeline):
+        self.session_id = session_id
+        self.timeline = timeline
+        self.emg_count = 0
+        self.next_seq = None
+
+
+class FrameIngestServer:
+    """
+    TCP endpoint for sensor_frames streams. A connection opens with a HELLO frame,
+    sends SAMPLES frames and ends with BYE (or by closing). Frames are decoded
+    without copying the samples (np.frombuffer over the received payload), EMG is
+    scaled once into `dtype`, acc is placed on the EMG grid (AccTimeline), and the
+    chunk is handed to the IngestScheduler session. When that session's queue is
+    full, the connection stops being read, so the device is slowed down by TCP
+    flow control instead of the server buffering without bound.
+    """
+
+    def __init__(self, scheduler, host="0.0.0.0", port=DEFAULT_PORT, dtype=np.float64, overlap_ratio=0.2):
+        self.scheduler = scheduler
+        self.host = host
+        self.port = port
+        self.dtype = dtype
+        self.overlap_ratio = overlap_ratio
+        self._server = None
+        self._connections = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Stop accepting connections and wait until the open ones have been handled."""
+        if self._server is not None:
+            self._server.close()
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    def _open(self, hello):
+        fs_emg, fs_acc = hello["fs_emg"], hello["fs_acc"]
+        n_channels = hello["n_channels"]
+        window_size = hello.get("window_size") or 2 * fs_emg
+        step_size = hello.get("step_size") or int(window_size * (1 - self.overlap_ratio))
+        nfft_emg = hello.get("nfft_emg") or max(2048, window_size)
+        self.scheduler.open_session(
+            hello["session_id"], n_channels, window_size, step_size, nfft_emg,
+            user_id=hello.get("user_id"), channels=hello.get("channels"),
+            fs_emg=fs_emg, fs_acc=fs_acc, dtype=self.dtype
+        )
+        return _Connection(hello["session_id"], AccTimeline(n_channels, fs_emg, fs_acc))
+
+    async def _push(self, conn, frame):
+        session_id = conn.session_id
+        metrics.inc("vitaly_frames_total", session=session_id)
+        if conn.next_seq is not None and frame.seq != conn.next_seq:
+            metrics.inc("vitaly_frame_gaps_total", (frame.seq - conn.next_seq) & 0xFFFFFFFF, session=session_id)
+        conn.next_seq = (frame.seq + 1) & 0xFFFFFFFF
+
+        n_emg = frame.emg_counts.shape[0]
+        emg = frame.emg(self.dtype)
+        late_before = conn.timeline.late
+        acc = conn.timeline.place(conn.emg_count, n_emg, frame.timestamp, frame.acc, frame.acc_timestamp, self.dtype)
+        if conn.timeline.late > late_before:
+            metrics.inc("vitaly_acc_late_samples_total", conn.timeline.late - late_before, session=session_id)
+        conn.emg_count += n_emg
+        if n_emg:
+            # blocks this connection only, until the session's queue has room
+            await asyncio.to_thread(self.scheduler.submit, session_id, emg, acc)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        task.add_done_callback(self._connections.discard)
+        peer = writer.get_extra_info("peername")
+        conn = None
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(FRAME_HEADER.size)
+                except asyncio.IncompleteReadError as e:
+                    if e.partial:
+                        raise FrameError("connection closed inside a frame header")
+                    break
+                kind, length = decode_header(header)
+                payload = await reader.readexactly(length) if length else b""
+                if kind == KIND_HELLO:
+                    if conn is not None:
+                        raise FrameError("second hello on one connection")
+                    conn = self._open(decode_hello(payload))
+                    print(f"✅ {peer}: session {conn.session_id} opened")
+                elif kind == KIND_SAMPLES:
+                    if conn is None:
+                        raise FrameError("samples before hello")
+                    await self._push(conn, decode_samples(payload))
+                elif kind == KIND_BYE:
+                    break
+                else:
+                    raise FrameError(f"unknown frame kind {kind}")
+        except (FrameError, ValueError, asyncio.IncompleteReadError, ConnectionError) as e:
+            print(f"❌ {peer}: {e}")
+        finally:
+            writer.close()
+            if conn is not None:
+                stats = await asyncio.to_thread(self.scheduler.close_session, conn.session_id)
+                print(f"✅ Session {conn.session_id} closed: {stats['samples']} samples, {stats['windows']} windows")
+
+
+async def _serve(server):
+    await server.start()
+    print(f"✅ Frame ingest listening on {server.host}:{server.port}")
+    await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive binary sensor frames over TCP and process them live.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--float32", action="store_true", help="process samples in float32")
+    parser.add_argument("--upload", action="store_true",
+                        help="upload dashboard documents for sessions that send a user_id")
+    args = parser.parse_args()
+
+    ensure_db()
+    db = get_db() if args.upload else None
+    exporter = TextfileExporter(textfile_path("frame_ingest_server"))
+    exporter.start()
+    scheduler = IngestScheduler(db, workers=args.workers)
+    server = FrameIngestServer(scheduler, args.host, args.port,
+                               dtype=np.float32 if args.float32 else np.float64, overlap_ratio=args.overlap)
+    try:
+        asyncio.run(_serve(server))
+    except KeyboardInterrupt:
+        print("Stopping, draining open sessions...")
+    finally:
+        scheduler.stop()
+        exporter.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,113 +1,148 @@
 # generate_synthetic_data.py
 
+import argparse
 import os
 import numpy as np
 
-def generate_emg_data(
-    duration_s=10.0,
-    sampling_rate=2000,
-    channels=["L_BF", "L_VL", "R_BF", "R_VL"],
-    output_path="T1.txt"
-):
+# Column layout of the real recordings (what load_emg_data / load_accelerometer_data expect).
+DEVICE_EMG_CHANNELS = ["L_BF", "L_GAL", "L_TA", "L_VL", "R_BF", "R_GAL", "R_TA", "R_VL"]
+DEVICE_MARKERS = [
+    "RASIS", "LASIS", "RPSIS", "LPSIS", "RTROC", "LTROC", "RTH1", "RLK", "RMK", "RSK1",
+    "RLA", "RMA", "RFM1", "RFM2", "RFM5", "LTH1", "LLK", "LMK", "LSK1", "LLA", "LMA", "LFM1",
+    "LFM2", "LFM5",
+]
+DEVICE_TRAJECTORY_COLUMNS = [marker + axis for marker in DEVICE_MARKERS for axis in "XYZ"]
+
+
+def synthetic_emg(duration_s=10.0, sampling_rate=2000, num_channels=4, rng=None):
+    """
+    (time, data) for `num_channels` EMG channels: a ~30 Hz sine with a slow
+    amplitude ramp plus Gaussian noise, one column per channel.
+    """
+    rng = np.random.default_rng(rng)
     n_samples = int(duration_s * sampling_rate)
-    time_array = np.linspace(0, duration_s, n_samples, endpoint=False)
+    time_array = np.arange(n_samples) / sampling_rate
 
     base_freq = 30.0
-    amplitude = 0.02    
-    noise_level = 0.005 
-    num_channels = len(channels)
-
-    emg_data = np.zeros((n_samples, num_channels))
+    amplitude = 0.02
+    noise_level = 0.005
+
+    phase_shift = rng.random(num_channels) * 2 * np.pi
+    freq_shift = base_freq + rng.standard_normal(num_channels) * 5.0
+    ramp = (np.linspace(1.0, 1.3, n_samples) - 1.0)[:, None]
+    emg_data = amplitude * np.sin(2 * np.pi * time_array[:, None] * freq_shift + phase_shift)
+    emg_data *= ramp
+    emg_data += rng.normal(0.0, noise_level, (n_samples, num_channels))
+    return time_array, emg_data
+
+
+def synthetic_trajectories(duration_s=10.0, sampling_rate=200, num_columns=6, rng=None):
+    """
+    (time, data) for `num_columns` marker coordinates: offset + drift + random walk
+    + a 0.3 Hz sway + noise, in millimetres.
+    """
+    rng = np.random.default_rng(rng)
+    n_samples = int(duration_s * sampling_rate)
+    time_array = np.arange(n_samples) / sampling_rate
+    shape = (n_samples, num_columns)
 
-    for ch_idx in range(num_channels):
-        phase_shift = np.random.rand() * 2 * np.pi
-        freq_shift = base_freq + np.random.randn() * 5.0
-        sine_wave = amplitude * np.sin(2 * np.pi * freq_shift * time_array + phase_shift)
-        noise = np.random.normal(0.0, noise_level, n_samples)
-        ramp = np.linspace(1.0, 1.3, n_samples) - 1.0
+    random_walk = np.cumsum(rng.standard_normal(shape) * 0.1, axis=0)
+    sine_wave = 5.0 * np.sin(2 * np.pi * 0.3 * time_array[:, None] + rng.random(num_columns) * 2 * np.pi)
+    noise = rng.standard_normal(shape) * 0.5
+    base_val = 600.0 + rng.standard_normal(num_columns) * 30
+    trend = np.linspace(0, 20, n_samples)[:, None]
 
-        channel_data = sine_wave * ramp + noise
-        emg_data[:, ch_idx] = channel_data
-    time_col = time_array.reshape(-1, 1)
-    all_data = np.hstack((time_col, emg_data))
+    traj_data = base_val + trend + random_walk + sine_wave + noise
+    return time_array, traj_data
 
-    header_cols = ["Time"] + channels
-    header_line = "\t".join(header_cols)
 
+def _save(output_path, time_array, data, columns, fmt):
     np.savetxt(
         output_path,
-        all_data,
+        np.column_stack((time_array, data)),
         delimiter="\t",
-        header=header_line,
+        header="\t".join(["Time"] + list(columns)),
         comments="",
-        fmt="%.6f"
+        fmt=fmt
     )
 
-    print(f"✅ EMG file saved: {output_path} (shape={all_data.shape})")
+
+def generate_emg_data(
+    duration_s=10.0,
+    sampling_rate=2000,
+    channels=["L_BF", "L_VL", "R_BF", "R_VL"],
+    output_path="T1.txt",
+    seed=None
+):
+    time_array, emg_data = synthetic_emg(duration_s, sampling_rate, len(channels), seed)
+    _save(output_path, time_array, emg_data, channels, "%.6f")
+    print(f"✅ EMG file saved: {output_path} (shape={(emg_data.shape[0], emg_data.shape[1] + 1)})")
 
 
 def generate_trajectory_data(
     duration_s=10.0,
     sampling_rate=200,
     columns=["RASISX","RASISY","RASISZ","LASISX","LASISY","LASISZ"],
-    output_path="T1.txt"
+    output_path="T1.txt",
+    seed=None
 ):
-    n_samples = int(duration_s * sampling_rate)
-    time_array = np.linspace(0, duration_s, n_samples, endpoint=False)
-
-    num_cols = len(columns)
-    traj_data = np.zeros((n_samples, num_cols))
-
-    for c_idx in range(num_cols):
-        random_walk = np.cumsum(np.random.randn(n_samples) * 0.1)
-        sine_wave = 5.0 * np.sin(2 * np.pi * 0.3 * time_array + np.random.rand()*2*np.pi)
-        noise = np.random.randn(n_samples) * 0.5
-        base_val = 600.0 + np.random.randn()*30
-        trend = np.linspace(0, 20, n_samples)
-
-        col_data = base_val + trend + random_walk + sine_wave + noise
-        traj_data[:, c_idx] = col_data
+    time_array, traj_data = synthetic_trajectories(duration_s, sampling_rate, len(columns), seed)
+    _save(output_path, time_array, traj_data, columns, "%.3f")
+    print(f"✅ Trajectories file saved: {output_path} (shape={(traj_data.shape[0], traj_data.shape[1] + 1)})")
 
-    all_data = np.hstack((time_array.reshape(-1,1), traj_data))
-    header_cols = ["Time"] + columns
-    header_line = "\t".join(header_cols)
 
-    np.savetxt(
-        output_path,
-        all_data,
-        delimiter="\t",
-        header=header_line,
-        comments="",
-        fmt="%.3f"
-    )
-
-    print(f"✅ Trajectories file saved: {output_path} (shape={all_data.shape})")
+def generate_recording(
+    emg_path,
+    traj_path,
+    duration_s=10.0,
+    fs_emg=2000,
+    fs_acc=200,
+    seed=None,
+    device_layout=False
+):
+    """
+    Write one EMG + trajectory file pair. With `device_layout` the files use the full
+    column layout of the real recordings, so the regular loaders can read them.
+    Child seeds are derived from `seed`, so a given seed always gives the same pair.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    emg_seed, traj_seed = seed.spawn(2)
+    if device_layout:
+        channels, columns = DEVICE_EMG_CHANNELS, DEVICE_TRAJECTORY_COLUMNS
+    else:
+        channels = ["L_BF", "L_VL", "R_BF", "R_VL"]
+        columns = ["RASISX", "RASISY", "RASISZ", "LASISX", "LASISY", "LASISZ"]
+    generate_emg_data(duration_s, fs_emg, channels, emg_path, emg_seed)
+    generate_trajectory_data(duration_s, fs_acc, columns, traj_path, traj_seed)
 
 
 def main():
-    emg_dir = "../data/V4/EMG_synthetic"
-    traj_dir = "../data/V4/Trajectories_synthetic"
-
-    os.makedirs(emg_dir, exist_ok=True)
-    os.makedirs(traj_dir, exist_ok=True)
-    n_files = 3
-
-    for i in range(1, n_files+1):
-        emg_filename = f"T{i}.txt"
-        traj_filename = f"T{i}.txt"
-        emg_path = os.path.join(emg_dir, emg_filename)
-        traj_path = os.path.join(traj_dir, traj_filename)
-        generate_emg_data(
-            duration_s=10.0,
-            sampling_rate=2000,
-            channels=["L_BF","L_VL","R_BF","R_VL"],
-            output_path=emg_path
-        )
-        generate_trajectory_data(
-            duration_s=10.0,
-            sampling_rate=200,
-            columns=["RASISX","RASISY","RASISZ","LASISX","LASISY","LASISZ"],
-            output_path=traj_path
+    parser = argparse.ArgumentParser(description="Generate synthetic EMG / trajectory recordings.")
+    parser.add_argument("--emg-dir", default="../data/V4/EMG_synthetic")
+    parser.add_argument("--traj-dir", default="../data/V4/Trajectories_synthetic")
+    parser.add_argument("--files", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per recording")
+    parser.add_argument("--fs-emg", type=int, default=2000)
+    parser.add_argument("--fs-acc", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--device-layout", action="store_true",
+                        help="write all 8 EMG channels and the full marker set of the real recordings")
+    args = parser.parse_args()
+
+    os.makedirs(args.emg_dir, exist_ok=True)
+    os.makedirs(args.traj_dir, exist_ok=True)
+    seeds = np.random.SeedSequence(args.seed).spawn(args.files)
+
+    for i in range(1, args.files + 1):
+        generate_recording(
+            os.path.join(args.emg_dir, f"T{i}.txt"),
+            os.path.join(args.traj_dir, f"T{i}.txt"),
+            duration_s=args.duration,
+            fs_emg=args.fs_emg,
+            fs_acc=args.fs_acc,
+            seed=seeds[i - 1],
+            device_layout=args.device_layout
         )
 
     print("✅ All synthetic files generated!")
@@ -0,0 +1,354 @@
+# ingest_scheduler.py
+
+import argparse
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from alignment import session_acc_grid
+from firestore_client import get_db
+from firestore_writer import FirestoreBatchWriter
+from instrumentation import metrics
+from local_storage import init_db, ResultBuffer
+from my_signal_processing_module import (
+    EMG_CHANNELS,
+    acc_columns_for,
+    compute_window_params,
+    load_emg_data,
+    load_accelerometer_data
+)
+from session_docs import channel_docs, channel_records
+from streaming_processor import StreamingEmgProcessor
+
+metrics.describe("vitaly_ingest_sessions", "gauge", "Sessions open in the ingest scheduler.")
+metrics.describe("vitaly_ingest_pending_samples", "gauge", "EMG samples queued per session, not yet processed.")
+metrics.describe("vitaly_ingest_rejected_chunks_total", "counter", "Chunks refused because a session's queue was full.")
+
+
+class _Session:
+    def __init__(self, session_id, user_id, processor, channels):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.processor = processor
+        self.channels = channels
+        self.pending = deque()  # (emg, acc) pieces of at most `quantum` samples
+        self.pending_samples = 0
+        self.scheduled = False  # in the ready queue or being processed
+        self.closing = False
+        self.done = threading.Event()
+        self.error = None
+        self.samples = 0
+        self.windows = 0
+
+
+class IngestScheduler:
+    """
+    Runs many live sessions on one node.
+
+    Every session has its own StreamingEmgProcessor (ring buffers, MNF and
+    smoothing state) and its own bounded input queue. A fixed pool of worker
+    threads takes sessions from a round-robin ready queue; one turn processes at
+    most `quantum` samples of that session, then the session goes to the back of
+    the queue. A session is handled by one worker at a time, so its state needs no
+    locking, and a session that sends a lot of data only gets more turns, never
+    longer ones. Submitting to a full queue blocks (or fails) for that session only.
+
+    All sessions share one ResultBuffer (SQLite) and, if `db` is given, one
+    FirestoreBatchWriter for the dashboard documents, so writes from different
+    sessions are batched together.
+    """
+
+    def __init__(
+        self,
+        db=None,
+        workers=4,
+        quantum=2000,
+        max_pending_samples=20000,
+        result_buffer=None,
+        writer=None
+    ):
+        self.db = db
+        self.quantum = quantum
+        self.max_pending_samples = max_pending_samples
+        self.buffer = result_buffer or ResultBuffer(flush_size=256)
+        self.writer = writer or (FirestoreBatchWriter(db) if db is not None else None)
+
+        self._sessions = {}
+        self._ready = deque()
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._space = threading.Condition(self._lock)
+        self._stopping = False
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"ingest-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def open_session(
+        self,
+        session_id,
+        n_channels,
+        window_size,
+        step_size,
+        nfft_emg,
+        user_id=None,
+        channels=None,
+        fs_emg=2000,
+        fs_acc=200,
+        **processor_kwargs
+    ):
+        processor = StreamingEmgProcessor(
+            n_channels, fs_emg, fs_acc, window_size, step_size, nfft_emg, **processor_kwargs
+        )
+        channels = list(channels or EMG_CHANNELS[:n_channels])
+        with self._lock:
+            if session_id in self._sessions:
+                raise ValueError(f"session {session_id} is already open")
+            self._sessions[session_id] = _Session(session_id, user_id, processor, channels)
+            metrics.set_gauge("vitaly_ingest_sessions", len(self._sessions))
+
+    def submit(self, session_id, emg_chunk, acc_chunk=None, block=True, timeout=None):
+        """
+        Queue a (samples, channels) chunk for `session_id`. Returns False if the
+        session's queue stayed full (non-blocking call or timeout).
+        """
+        emg_chunk = np.asarray(emg_chunk)  # converted to the processor's dtype when it is processed
+        n = emg_chunk.shape[0]
+        pieces = []
+        for start in range(0, n, self.quantum):
+            acc_piece = None if acc_chunk is None else acc_chunk[start:start + self.quantum]
+            pieces.append((emg_chunk[start:start + self.quantum], acc_piece))
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            session = self._sessions[session_id]
+            if session.closing:
+                raise ValueError(f"session {session_id} is closing")
+            while session.pending_samples and session.pending_samples + n > self.max_pending_samples:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    metrics.inc("vitaly_ingest_rejected_chunks_total", session=session_id)
+                    return False
+                self._space.wait(remaining)
+            session.pending.extend(pieces)
+            session.pending_samples += n
+            metrics.set_gauge("vitaly_ingest_pending_samples", session.pending_samples, session=session_id)
+            self._schedule(session)
+        return True
+
+    def close_session(self, session_id, wait=True, timeout=None):
+        """
+        Stop accepting data for `session_id`; its queued chunks are still processed.
+        With `wait`, blocks until that is done and returns the session stats.
+        """
+        with self._lock:
+            session = self._sessions[session_id]
+            session.closing = True
+            if not session.scheduled:
+                self._finish(session)
+        if wait:
+            session.done.wait(timeout)
+        return self.session_stats(session)
+
+    @staticmethod
+    def session_stats(session):
+        return {
+            "session_id": session.session_id,
+            "samples": session.samples,
+            "windows": session.windows,
+            "pending_samples": session.pending_samples,
+            "error": None if session.error is None else repr(session.error),
+        }
+
+    def stop(self):
+        """Drain every open session, stop the workers and flush the shared writers."""
+        with self._lock:
+            session_ids = list(self._sessions)
+        for session_id in session_ids:
+            self.close_session(session_id)
+        with self._lock:
+            self._stopping = True
+            self._work.notify_all()
+        for worker in self._workers:
+            worker.join()
+        self.buffer.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # --- called with self._lock held ---
+
+    def _schedule(self, session):
+        if not session.scheduled and session.pending:
+            session.scheduled = True
+            self._ready.append(session)
+            self._work.notify()
+
+    def _finish(self, session):
+        self._sessions.pop(session.session_id, None)
+        metrics.set_gauge("vitaly_ingest_sessions", len(self._sessions))
+        metrics.set_gauge("vitaly_ingest_pending_samples", 0, session=session.session_id)
+        metrics.retire_session(session.session_id)
+        session.done.set()
+
+    # --- worker side ---
+
+    def _next_turn(self):
+        with self._lock:
+            while not self._ready:
+                if self._stopping:
+                    return None, None
+                if not self._work.wait(timeout=self.buffer.flush_interval):
+                    # idle: don't keep finished windows waiting for the next add()
+                    self._lock.release()
+                    try:
+                        self.buffer.flush()
+                        if self.writer is not None:
+                            self.writer.flush()
+                    finally:
+                        self._lock.acquire()
+            session = self._ready.popleft()
+            turn = []
+            budget = self.quantum
+            while session.pending and budget > 0:
+                piece = session.pending.popleft()
+                turn.append(piece)
+                budget -= piece[0].shape[0]
+            return session, turn
+
+    def _worker_loop(self):
+        while True:
+            session, turn = self._next_turn()
+            if session is None:
+                return
+            n_samples = sum(emg.shape[0] for emg, _acc in turn)
+            if session.error is None:
+                try:
+                    self._run_turn(session, turn)
+                except Exception as exc:
+                    print(f"❌ Session {session.session_id} failed, dropping its input: {exc}")
+                    session.error = exc
+            with self._lock:
+                session.samples += n_samples
+                session.pending_samples -= n_samples
+                metrics.set_gauge("vitaly_ingest_pending_samples", session.pending_samples,
+                                  session=session.session_id)
+                self._space.notify_all()
+                session.scheduled = False
+                if session.pending:
+                    self._schedule(session)
+                elif session.closing:
+                    self._finish(session)
+
+    def _run_turn(self, session, turn):
+        windows = []
+        with metrics.stage("window_compute", session.session_id) as span:
+            for emg, acc in turn:
+                windows.extend(session.processor.push(emg, acc))
+            span.items = len(windows)
+        if not windows:
+            return
+        session.windows += len(windows)
+
+        if self.writer is not None and session.user_id is not None:
+            session_ref = self.db.collection("users").document(session.user_id) \
+                                 .collection("sessions").document(session.session_id)
+        else:
+            session_ref = None
+        for window in windows:
+            now_ts = datetime.utcnow().isoformat()
+            smoothed = window["smoothed"]
+            self.buffer.add_many(channel_records(session.session_id, now_ts, session.channels, smoothed))
+            if session_ref is not None:
+                for collection, doc in channel_docs(now_ts, session.channels, smoothed).items():
+                    self.writer.add(session_ref.collection(collection), doc)
+
+
+def replay_sessions(scheduler, recordings, user_id=None, fs_emg=2000, fs_acc=200,
+                    overlap_ratio=0.2, chunk_size=100, speed=1.0):
+    """
+    Feed each (session_id, emg_file, acc_file) from its own thread, paced like a
+    live sleeve, and return the per-session stats once all are drained.
+    """
+    def feed(session_id, emg_data, acc_data):
+        for start in range(0, emg_data.shape[0], chunk_size):
+            stop = start + chunk_size
+            scheduler.submit(session_id, emg_data[start:stop], acc_data[start:stop])
+            if speed > 0:
+                time.sleep(chunk_size / fs_emg / speed)
+
+    feeders = []
+    for session_id, emg_file, acc_file in recordings:
+        emg_data = load_emg_data(emg_file)
+        acc_data = load_accelerometer_data(acc_file)
+        if emg_data.size == 0:
+            print(f"❌ Skipped empty: {emg_file}")
+            continue
+        n_channels = emg_data.shape[1]
+        acc_columns = acc_columns_for(EMG_CHANNELS[:n_channels])
+        acc_data = acc_data[:, acc_columns] if acc_data.size else np.zeros((0, n_channels))
+        acc_data = session_acc_grid(emg_file, acc_file, emg_data.shape[0], acc_data, fs_emg, fs_acc)
+        window_size, step_size, _, nfft_emg = compute_window_params(emg_data.shape[0], fs_emg, overlap_ratio)
+        scheduler.open_session(session_id, n_channels, window_size, step_size, nfft_emg,
+                               user_id=user_id, fs_emg=fs_emg, fs_acc=fs_acc)
+        feeders.append((session_id, threading.Thread(target=feed, args=(session_id, emg_data, acc_data))))
+
+    for _session_id, thread in feeders:
+        thread.start()
+    stats = []
+    for session_id, thread in feeders:
+        thread.join()
+        stats.append(scheduler.close_session(session_id))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recordings as concurrent live sessions.")
+    parser.add_argument("--emg-dir", default="../data/V4/EMG")
+    parser.add_argument("--acc-dir", default="../data/V4/Trajectories")
+    parser.add_argument("--sessions", type=int, default=None,
+                        help="number of concurrent sessions (recordings are reused round-robin)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 = as fast as possible")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--user", default=None, help="upload dashboard documents for this user")
+    args = parser.parse_args()
+
+    from batch_runner import find_recordings
+
+    recordings = find_recordings(args.emg_dir, args.acc_dir)
+    if not recordings:
+        print(f"❌ No recordings in {args.emg_dir}, skip.")
+        return
+    n_sessions = args.sessions or len(recordings)
+    recordings = [
+        (f"{recordings[i % len(recordings)][0]}_{i}", *recordings[i % len(recordings)][1:])
+        for i in range(n_sessions)
+    ]
+
+    db = get_db() if args.user else None
+
+    init_db()
+    t_start = time.perf_counter()
+    with IngestScheduler(db, workers=args.workers) as scheduler:
+        stats = replay_sessions(scheduler, recordings, user_id=args.user,
+                                chunk_size=args.chunk_size, speed=args.speed)
+    total = time.perf_counter() - t_start
+    for s in stats:
+        flag = "❌" if s["error"] else "✅"
+        print(f"{flag} {s['session_id']}: {s['samples']} samples, {s['windows']} windows")
+    print(f"✅ {len(stats)} sessions on {args.workers} workers in {total:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
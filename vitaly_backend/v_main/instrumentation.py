@@ -0,0 +1,316 @@
+# instrumentation.py
+
+import cProfile
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_DIR = os.environ.get("VITALY_METRICS_DIR", "metrics")
+PROFILE_DIR = os.environ.get("VITALY_PROFILE_DIR", "profiles")
+
+_SAMPLE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(.*)$")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Span:
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and latency histograms, rendered in the Prometheus
+    text format.
+
+    Series are keyed by metric name plus labels. Pipeline code records through
+    stage(), which labels every series with the stage and, if given, the session.
+    Thread-safe; recording a sample costs a dict lookup under a lock.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._families = {}  # name -> (type, help)
+        self._values = {}    # (name, labels) -> float, for counters and gauges
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._retired = set()  # sessions to forget once their final values are written
+
+    def describe(self, name, kind, help_text):
+        self._families[name] = (kind, help_text)
+
+    def inc(self, name, value=1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = float(value)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            hist[bisect_left(self.buckets, value)] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    @contextmanager
+    def stage(self, stage, session_id=None, items=0):
+        """
+        Time one pipeline stage call. Records wall time (histogram), CPU time of the
+        calling thread, errors, and on success the handled items (settable through
+        the yielded span's `.items`). Wall time well above CPU time means the stage
+        was waiting on disk, network or a lock rather than computing.
+        """
+        labels = {"stage": stage}
+        if session_id is not None:
+            labels["session"] = session_id
+        span = _Span(items)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield span
+        except Exception:
+            self.inc("vitaly_stage_errors_total", **labels)
+            raise
+        else:
+            if span.items:
+                self.inc("vitaly_stage_items_total", span.items, **labels)
+        finally:
+            self.observe("vitaly_stage_seconds", time.perf_counter() - wall_start, **labels)
+            self.inc("vitaly_stage_cpu_seconds_total", time.thread_time() - cpu_start, **labels)
+
+    def forget_session(self, session_id):
+        """Drop every series labelled with `session_id` (keeps label cardinality bounded)."""
+        with self._lock:
+            for store in (self._values, self._histograms):
+                for key in [k for k in store if ("session", session_id) in k[1]]:
+                    del store[key]
+
+    def retire_session(self, session_id):
+        """forget_session once the next write_textfile has exported the session's final values."""
+        with self._lock:
+            self._retired.add(session_id)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+
+        by_name = {}
+        for (name, labels), value in values:
+            by_name.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), hist in histograms:
+            lines = by_name.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), hist):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(hist[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist[-1]}")
+
+        out = []
+        for name in sorted(by_name):
+            kind, help_text = self._families.get(name, ("untyped", ""))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(by_name[name])
+        return "\n".join(out) + "\n" if out else ""
+
+    def write_textfile(self, path):
+        """
+        Atomically write render() to `path` (node_exporter textfile style), then drop
+        the sessions retired before the write.
+        """
+        with self._lock:
+            retired = set(self._retired)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+        for session_id in retired:
+            self.forget_session(session_id)
+        with self._lock:
+            self._retired -= retired
+
+
+metrics = MetricsRegistry()
+metrics.describe("vitaly_stage_seconds", "histogram", "Wall-clock time per pipeline stage call.")
+metrics.describe("vitaly_stage_cpu_seconds_total", "counter",
+                 "CPU time of the calling thread per stage; wall minus CPU is time spent waiting.")
+metrics.describe("vitaly_stage_items_total", "counter", "Items (windows, rows, documents) handled per stage.")
+metrics.describe("vitaly_stage_errors_total", "counter", "Stage calls that raised.")
+metrics.describe("vitaly_firestore_retries_total", "counter", "Firestore batch commits retried after an error.")
+metrics.describe("vitaly_firestore_failed_batches_total", "counter", "Firestore batches given up after all retries.")
+metrics.describe("vitaly_sync_backlog", "gauge", "Rows waiting in sync_queue.")
+metrics.describe("vitaly_sse_subscribers", "gauge", "Connected /api/stream clients.")
+
+
+class TextfileExporter(threading.Thread):
+    """
+    Writes a registry to a .prom file every `interval` seconds, so metrics of a
+    processing process can be served by the API process (see merge_textfiles).
+    """
+
+    def __init__(self, path, registry=metrics, interval=5.0):
+        super().__init__(name="metrics-exporter", daemon=True)
+        self.path = path
+        self.registry = registry
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.registry.write_textfile(self.path)
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.registry.write_textfile(self.path)
+
+
+def textfile_path(name, directory=METRICS_DIR):
+    return os.path.join(directory, f"{name}.prom")
+
+
+def _parse_exposition(text, source):
+    """Split exposition text into {family: [type, help, samples]}, adding a source label."""
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP ") or line.startswith("# TYPE "):
+            parts = line.split(" ", 3)
+            name = parts[2]
+            family = families.setdefault(name, ["untyped", "", []])
+            if parts[1] == "TYPE":
+                family[0] = parts[3] if len(parts) > 3 else "untyped"
+            else:
+                family[1] = parts[3] if len(parts) > 3 else ""
+            current = name
+            continue
+        match = _SAMPLE_RE.match(line)
+        if not match:
+            continue
+        metric, labels, rest = match.groups()
+        inner = f'source="{_escape(source)}"'
+        if labels and labels != "{}":
+            inner += "," + labels[1:-1]
+        name = current if current and metric.startswith(current) else metric
+        families.setdefault(name, ["untyped", "", []])[2].append(f"{metric}{{{inner}}} {rest}")
+    return families
+
+
+def merge_textfiles(registry=metrics, source="api_server", directory=METRICS_DIR):
+    """
+    Exposition text of `registry` plus every *.prom file in `directory`. Samples get
+    a `source` label (the file name for textfiles) and each family is written once.
+    """
+    merged = {}
+    texts = [(source, registry.render())]
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".prom"):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    texts.append((name[:-len(".prom")], f.read()))
+            except OSError:
+                continue
+
+    for text_source, text in texts:
+        for name, (kind, help_text, samples) in _parse_exposition(text, text_source).items():
+            family = merged.setdefault(name, [kind, help_text, []])
+            family[2].extend(samples)
+
+    out = []
+    for name, (kind, help_text, samples) in merged.items():
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(samples)
+    return "\n".join(out) + "\n" if out else ""
+
+
+_profiled_sessions = {s for s in os.environ.get("VITALY_PROFILE_SESSIONS", "").split(",") if s}
+_profile_lock = threading.Lock()
+
+
+def enable_profiling(session_id):
+    _profiled_sessions.add(session_id)
+
+
+def disable_profiling(session_id):
+    _profiled_sessions.discard(session_id)
+
+
+@contextmanager
+def profile_session(session_id, output_dir=PROFILE_DIR, top=30):
+    """
+    cProfile + tracemalloc capture around the processing of one session, if profiling
+    was enabled for it (enable_profiling() or VITALY_PROFILE_SESSIONS=a,b);
+    otherwise a no-op. Writes <session>.prof (pstats, e.g. for snakeviz) and a
+    <session>.txt summary to `output_dir`. cProfile sees only the calling thread,
+    and one capture runs at a time; a second concurrent one is skipped.
+    """
+    if session_id not in _profiled_sessions or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+
+    own_tracing = not tracemalloc.is_tracing()
+    if own_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    wall_start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        wall = time.perf_counter() - wall_start
+        _, peak = tracemalloc.get_traced_memory()
+        allocations = tracemalloc.take_snapshot().statistics("lineno")[:top]
+        if own_tracing:
+            tracemalloc.stop()
+        _profile_lock.release()
+
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", session_id))
+        profiler.dump_stats(f"{base}.prof")
+        with open(f"{base}.txt", "w") as f:
+            f.write(f"session {session_id}: wall {wall:.3f}s, traced peak {peak / 2**20:.2f} MiB\n\n")
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(top)
+            f.write("\nTop allocations still held at the end:\n")
+            for stat in allocations:
+                f.write(f"{stat}\n")
+        print(f"✅ Profile for {session_id} saved: {base}.prof / {base}.txt")
@@ -2,38 +2,170 @@
 
 import sqlite3
 import os
+import threading
+from datetime import datetime, timezone
+import time
 import uuid
+from itertools import repeat
+
+from instrumentation import metrics
 
 DB_PATH = "local_data.db"
 
+_conn = None
+_conn_path = None
+_initialized_path = None
+_lock = threading.RLock()
+
+INSERT_SQL = """
+    INSERT INTO processed_results
+    (id, session_id, timestamp, muscle_fatigue, muscle_activation, force, velocity, power_output, firing_rate, intensity, work_ratio, is_synced, channel, ts_epoch)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+"""
+
+def get_connection():
+    """
+    返回进程内共享的长连接 (WAL 模式)。所有读写都在 _lock 下使用它,
+    DB_PATH 改变后会自动重新连接。
+    """
+    global _conn, _conn_path
+    with _lock:
+        if _conn is None or _conn_path != DB_PATH:
+            if _conn is not None:
+                _conn.close()
+            _conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+            _conn_path = DB_PATH
+        return _conn
+
+def close_connection():
+    global _conn, _conn_path
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        _conn = None
+        _conn_path = None
+
 def init_db():
     """
     初始化/创建 SQLite 数据库。只需在脚本启动时调用一次。
     """
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS processed_results (
-        id TEXT PRIMARY KEY,
-        session_id TEXT,
-        timestamp TEXT,
-        muscle_fatigue REAL,
-        muscle_activation REAL,
-        force REAL,
-        velocity REAL,
-        power_output REAL,
-        firing_rate REAL,
-        intensity REAL,
-        work_ratio REAL,
-        is_synced INTEGER DEFAULT 0
+    global _initialized_path
+    with _lock:
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS processed_results (
+            id TEXT PRIMARY KEY,
+            session_id TEXT,
+            timestamp TEXT,
+            muscle_fatigue REAL,
+            muscle_activation REAL,
+            force REAL,
+            velocity REAL,
+            power_output REAL,
+            firing_rate REAL,
+            intensity REAL,
+            work_ratio REAL,
+            is_synced INTEGER DEFAULT 0,
+            channel TEXT,
+            ts_epoch REAL
+        )
+        """)
+        # 旧数据库没有 channel 列时补上 (NULL 表示单通道结果)
+        columns = [row[1] for row in c.execute("PRAGMA table_info(processed_results)")]
+        if 'channel' not in columns:
+            c.execute("ALTER TABLE processed_results ADD COLUMN channel TEXT")
+        # ts_epoch: timestamp 对应的 UTC 秒数, 用于按时间范围查询; 旧数据一次性回填
+        if 'ts_epoch' not in columns:
+            c.execute("ALTER TABLE processed_results ADD COLUMN ts_epoch REAL")
+            c.execute("""
+            UPDATE processed_results
+            SET ts_epoch = (julianday(timestamp) - 2440587.5) * 86400.0
+            WHERE ts_epoch IS NULL
+            """)
+
+        c.execute("CREATE INDEX IF NOT EXISTS idx_results_session ON processed_results(session_id)")
+        c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_results_session_channel_ts
+        ON processed_results(session_id, channel, ts_epoch)
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_results_session_ts ON processed_results(session_id, ts_epoch)")
+
+        # 待同步队列: seq 单调递增 (AUTOINCREMENT, 不复用), 同步成功后删除对应条目
+        queue_exists = c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sync_queue'"
+        ).fetchone()
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS sync_queue (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            result_id TEXT NOT NULL
+        )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_sync_queue_result ON sync_queue(result_id)")
+        if not queue_exists:
+            c.execute("""
+            INSERT INTO sync_queue (result_id)
+            SELECT id FROM processed_results WHERE is_synced=0 ORDER BY rowid
+            """)
+        conn.commit()
+        _initialized_path = DB_PATH
+
+def ensure_db():
+    """
+    当前 DB_PATH 还没有初始化过时才调用 init_db(), 可以随意重复调用
+    (代替模块导入时的 init_db(), 导入本身不再碰数据库)。
+    """
+    with _lock:
+        if _initialized_path != DB_PATH:
+            init_db()
+
+# result_row_ids 的命名空间 (固定值, 改了之后旧结果就不再被认作同一行)
+RESULT_ID_NAMESPACE = uuid.UUID("5f0c3a52-8d1e-4b7a-9c6e-2f4d8b1a7e30")
+
+def result_row_ids(key, n_rows):
+    """
+    由 key (例如 session_id + 结果缓存的 key) 确定的 n_rows 个行 id (uuid5)。
+    同一份数据重新导入时得到相同的 id, 已存在的行会被跳过, 不会重复插入。
+    """
+    return [str(uuid.uuid5(RESULT_ID_NAMESPACE, f"{key}/{i}")) for i in range(n_rows)]
+
+def to_epoch(timestamp):
+    """
+    ISO 时间字符串 -> UTC 秒数。没有时区的时间按 UTC 处理 (datetime.utcnow() 的输出)。
+    """
+    try:
+        dt = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def _record_row(row_id, record):
+    ts_epoch = record.get('ts_epoch')
+    if ts_epoch is None:
+        ts_epoch = to_epoch(record['timestamp'])
+    return (
+        row_id,
+        record['session_id'],
+        record['timestamp'],
+        record.get('muscle_fatigue', 0.0),
+        record.get('muscle_activation', 0.0),
+        record.get('force', 0.0),
+        record.get('velocity', 0.0),
+        record.get('power_output', 0.0),
+        record.get('firing_rate', 0.0),
+        record.get('intensity', 0.0),
+        record.get('work_ratio', 0.0),
+        record.get('channel'),
+        ts_epoch,
     )
-    """)
-    conn.commit()
-    conn.close()
 
 def insert_result(record):
     """
-    将处理后的结果插入本地DB。
+    将处理后的结果插入本地DB, 返回新行的 id。
     record 例如:
     {
       'session_id': 'session_T1',
@@ -45,52 +177,251 @@ def insert_result(record):
       'power_output': 45.6,
       'firing_rate': 12.3,
       'intensity': 0.9,
-      'work_ratio': 0.77
+      'work_ratio': 0.77,
+      'channel': 'L_VL'      # 可选, 多通道模式下的 EMG 通道名
     }
     """
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    row_ids = insert_results_many([record])
+    return row_ids[0] if row_ids else record['id']  # 带 id 且已存在
 
-    row_id = str(uuid.uuid4())  # 生成一个随机ID
-    c.execute("""
-    INSERT INTO processed_results
-    (id, session_id, timestamp, muscle_fatigue, muscle_activation, force, velocity, power_output, firing_rate, intensity, work_ratio, is_synced)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
-    """, (
-        row_id,
-        record['session_id'],
-        record['timestamp'],
-        record.get('muscle_fatigue', 0.0),
-        record.get('muscle_activation', 0.0),
-        record.get('force', 0.0),
-        record.get('velocity', 0.0),
-        record.get('power_output', 0.0),
-        record.get('firing_rate', 0.0),
-        record.get('intensity', 0.0),
-        record.get('work_ratio', 0.0),
+def insert_results_many(records):
+    """
+    在一个事务里批量插入多条结果 (executemany, 一次提交), 返回新行的 id 列表。
+    record 带 'id' 时使用该 id (见 result_row_ids), 已存在的行跳过, 不在返回值里。
+    """
+    row_ids = [rec.get('id') or str(uuid.uuid4()) for rec in records]  # 没有 id 时生成随机ID
+    if not records:
+        return row_ids
+    sessions = {rec['session_id'] for rec in records}
+    session_id = sessions.pop() if len(sessions) == 1 else None
+    rows = [_record_row(row_id, rec) for row_id, rec in zip(row_ids, records)]
+    return _insert_rows(row_ids, rows, session_id, skip_existing=any('id' in rec for rec in records))
+
+def insert_result_columns(session_id, timestamp, columns, channels, row_ids=None):
+    """
+    按列批量插入一个 session 的结果, 不必先拼成 record 字典。
+    timestamp: 所有行共用的时间字符串, 或每行一个时间的列表;
+    columns: 指标列名 (muscle_fatigue ... work_ratio) -> 等长的数值列表;
+    channels: 每行的通道名 (单通道结果为 None), 长度即行数。返回新行的 id 列表。
+    row_ids: 可选的固定行 id (见 result_row_ids), 已存在的行跳过。
+    """
+    n_rows = len(channels)
+    skip_existing = row_ids is not None
+    if row_ids is None:
+        row_ids = [str(uuid.uuid4()) for _ in range(n_rows)]
+    if not n_rows:
+        return row_ids
+    if isinstance(timestamp, str):
+        timestamps, epochs = repeat(timestamp, n_rows), repeat(to_epoch(timestamp), n_rows)
+    else:
+        epoch_of = {ts: to_epoch(ts) for ts in set(timestamp)}
+        timestamps, epochs = timestamp, [epoch_of[ts] for ts in timestamp]
+    rows = list(zip(
+        row_ids,
+        repeat(session_id, n_rows),
+        timestamps,
+        *(columns[name] for name in SESSION_COLUMNS[1:-1]),
+        channels,
+        epochs,
     ))
-    conn.commit()
-    conn.close()
+    return _insert_rows(row_ids, rows, session_id, skip_existing)
+
+def _existing_ids(conn, row_ids, chunk=500):
+    existing = set()
+    for start in range(0, len(row_ids), chunk):
+        part = row_ids[start:start + chunk]
+        existing.update(row[0] for row in conn.execute(
+            f"SELECT id FROM processed_results WHERE id IN ({','.join('?' * len(part))})", part
+        ))
+    return existing
+
+def _insert_rows(row_ids, rows, session_id, skip_existing=False):
+    """
+    插入 rows 并排入 sync_queue, 返回实际插入的行 id。skip_existing 时先查出
+    已存在的 id (同一事务内), 这些行既不重复插入也不重复排队。
+    """
+    with metrics.stage("sqlite_write", session_id, items=len(rows)), _lock:
+        conn = get_connection()
+        with conn:
+            if skip_existing:
+                existing = _existing_ids(conn, row_ids)
+                if existing:
+                    keep = [i for i, row_id in enumerate(row_ids) if row_id not in existing]
+                    row_ids = [row_ids[i] for i in keep]
+                    rows = [rows[i] for i in keep]
+            conn.executemany(INSERT_SQL, rows)
+            conn.executemany("INSERT INTO sync_queue (result_id) VALUES (?)", [(row_id,) for row_id in row_ids])
+    return row_ids
 
 
 def get_unsynced():
     """
     返回尚未同步到 Firebase 的所有记录 (is_synced=0)。
     """
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-    SELECT id, session_id, timestamp, muscle_fatigue, muscle_activation, force, velocity, power_output,
-           firing_rate, intensity, work_ratio
-    FROM processed_results WHERE is_synced=0
-    """)
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    with _lock:
+        c = get_connection().cursor()
+        c.execute("""
+        SELECT id, session_id, timestamp, muscle_fatigue, muscle_activation, force, velocity, power_output,
+               firing_rate, intensity, work_ratio, channel
+        FROM processed_results WHERE is_synced=0
+        """)
+        return c.fetchall()
 
 def mark_synced(row_id):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE processed_results SET is_synced=1 WHERE id=?", (row_id,))
-    conn.commit()
-    conn.close()
+    mark_synced_many([row_id])
+
+def mark_synced_many(row_ids):
+    """
+    在一个事务里把多条记录标记为已同步。
+    """
+    if not row_ids:
+        return
+    with _lock:
+        conn = get_connection()
+        with conn:
+            conn.executemany("UPDATE processed_results SET is_synced=1 WHERE id=?", [(row_id,) for row_id in row_ids])
+            conn.executemany("DELETE FROM sync_queue WHERE result_id=?", [(row_id,) for row_id in row_ids])
+
+def get_sync_page(after_seq, limit=500):
+    """
+    按 seq 顺序取出 after_seq 之后的一页待同步记录 (走主键索引, 不扫全表)。
+    返回 [(seq, id, session_id, timestamp, muscle_fatigue, muscle_activation, force, velocity,
+           power_output, firing_rate, intensity, work_ratio, channel), ...]
+    """
+    with _lock:
+        c = get_connection().cursor()
+        c.execute("""
+        SELECT q.seq, r.id, r.session_id, r.timestamp, r.muscle_fatigue, r.muscle_activation, r.force,
+               r.velocity, r.power_output, r.firing_rate, r.intensity, r.work_ratio, r.channel
+        FROM sync_queue q JOIN processed_results r ON r.id = q.result_id
+        WHERE q.seq > ?
+        ORDER BY q.seq
+        LIMIT ?
+        """, (after_seq, limit))
+        return c.fetchall()
+
+def ack_synced(seqs):
+    """
+    同步成功后: 标记 is_synced=1 并从队列删除这些 seq, 同一个事务。
+    """
+    if not seqs:
+        return
+    params = [(seq,) for seq in seqs]
+    with metrics.stage("sqlite_ack", items=len(seqs)), _lock:
+        conn = get_connection()
+        with conn:
+            conn.executemany("""
+            UPDATE processed_results SET is_synced=1
+            WHERE id=(SELECT result_id FROM sync_queue WHERE seq=?)
+            """, params)
+            conn.executemany("DELETE FROM sync_queue WHERE seq=?", params)
+
+def sync_backlog():
+    """
+    队列里还有多少条记录没有同步 (队列只保存待同步条目, 所以很小)。
+    """
+    with _lock:
+        return get_connection().execute("SELECT COUNT(*) FROM sync_queue").fetchone()[0]
+
+
+class ResultBuffer:
+    """
+    缓冲处理结果, 攒够 flush_size 条或超过 flush_interval 秒后一次性写入。
+    线程安全, 多个会话可以共用一个 buffer。
+    用法: with ResultBuffer() as buf: buf.add(record)   (退出时自动 flush)
+    """
+
+    def __init__(self, flush_size=64, flush_interval=1.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._records = []
+        self._last_flush = time.monotonic()
+        self._buf_lock = threading.Lock()
+
+    def add(self, record):
+        with self._buf_lock:
+            self._records.append(record)
+            due = len(self._records) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def add_many(self, records):
+        with self._buf_lock:
+            self._records.extend(records)
+            due = len(self._records) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._buf_lock:
+            records, self._records = self._records, []
+            self._last_flush = time.monotonic()
+        return insert_results_many(records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+SESSION_COLUMNS = (
+    "ts_epoch", "muscle_fatigue", "muscle_activation", "force", "velocity", "power_output",
+    "firing_rate", "intensity", "work_ratio", "channel",
+)
+
+def get_session_rows(session_id):
+    """
+    按时间顺序返回一个 session 的全部结果行, 列顺序见 SESSION_COLUMNS。
+    """
+    with _lock:
+        c = get_connection().cursor()
+        c.execute(f"""
+        SELECT {", ".join(SESSION_COLUMNS)}
+        FROM processed_results
+        WHERE session_id=?
+        ORDER BY ts_epoch, rowid
+        """, (session_id,))
+        return c.fetchall()
+
+def list_finished_sessions(before_epoch):
+    """
+    最后一条结果早于 before_epoch 且已全部同步的 session (可以归档的冷数据)。
+    """
+    with _lock:
+        c = get_connection().cursor()
+        c.execute("""
+        SELECT session_id
+        FROM processed_results
+        GROUP BY session_id
+        HAVING MAX(ts_epoch) < ? AND MIN(is_synced) = 1
+        ORDER BY session_id
+        """, (before_epoch,))
+        return [row[0] for row in c.fetchall()]
+
+def count_unsynced(session_id):
+    """
+    session 里还没同步到 Firestore 的结果行数。
+    """
+    with _lock:
+        return get_connection().execute(
+            "SELECT COUNT(*) FROM processed_results WHERE session_id=? AND is_synced=0", (session_id,)
+        ).fetchone()[0]
+
+def delete_session(session_id):
+    """
+    删除一个 session 的全部结果行 (归档之后调用), 返回删除的行数。
+    还有未同步的行时什么都不删, 返回 None (检查和删除在同一个事务里)。
+    """
+    with _lock:
+        conn = get_connection()
+        with conn:
+            unsynced = conn.execute(
+                "SELECT COUNT(*) FROM processed_results WHERE session_id=? AND is_synced=0", (session_id,)
+            ).fetchone()[0]
+            if unsynced:
+                return None
+            conn.execute("""
+            DELETE FROM sync_queue
+            WHERE result_id IN (SELECT id FROM processed_results WHERE session_id=?)
+            """, (session_id,))
+            return conn.execute("DELETE FROM processed_results WHERE session_id=?", (session_id,)).rowcount
@@ -0,0 +1,144 @@
+# memory_firestore.py
+
+import threading
+import uuid
+
+
+class MemoryFirestore:
+    """
+    In-process stand-in for the firebase_admin Firestore client.
+
+    Supports the subset the backend uses: collection()/document() paths, set, add,
+    get, delete, stream, paged list_documents()/collections() and batched writes.
+    Documents live in one dict keyed by their full path. As in Firestore, deleting a
+    document leaves its subcollections in place, and list_documents() still returns
+    such "missing" parents. `fail_next_commits` makes that many batch commits raise,
+    to exercise retry paths; `commit_count` counts successful commits.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.Lock()
+        self.fail_next_commits = 0
+        self.commit_count = 0
+
+    def collection(self, name):
+        return MemoryCollection(self, name)
+
+    def batch(self):
+        return MemoryWriteBatch(self)
+
+    def collections(self):
+        return _child_collections(self, "")
+
+    def _child_ids(self, prefix, after, limit):
+        """Sorted ids of the path segments right below `prefix`, > `after`, at most `limit`."""
+        with self.lock:
+            ids = {path[len(prefix):].split("/", 1)[0] for path in self.docs if path.startswith(prefix)}
+        ids = sorted(i for i in ids if after is None or i > after)
+        return ids if limit is None else ids[:limit]
+
+
+def _child_collections(client, prefix):
+    return [MemoryCollection(client, prefix + name) for name in client._child_ids(prefix, None, None)]
+
+
+class MemorySnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return None if self._data is None else dict(self._data)
+
+
+class MemoryCollection:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, doc_id=None):
+        return MemoryDocument(self._client, f"{self.path}/{doc_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def list_documents(self, page_size=None):
+        """
+        References to every document in the collection, including missing ones that
+        only hold subcollections. Fetched `page_size` ids at a time (like the real
+        client's pages), so documents deleted while iterating are not returned.
+        """
+        prefix = self.path + "/"
+        after = None
+        while True:
+            page = self._client._child_ids(prefix, after, page_size)
+            for doc_id in page:
+                yield MemoryDocument(self._client, prefix + doc_id)
+            if page_size is None or len(page) < page_size:
+                return
+            after = page[-1]
+
+    def stream(self):
+        prefix = self.path + "/"
+        with self._client.lock:
+            items = sorted(
+                (path, data) for path, data in self._client.docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            )
+        for path, data in items:
+            yield MemorySnapshot(MemoryDocument(self._client, path), data)
+
+
+class MemoryDocument:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name):
+        return MemoryCollection(self._client, f"{self.path}/{name}")
+
+    def collections(self, page_size=None):
+        return _child_collections(self._client, self.path + "/")
+
+    def set(self, data):
+        with self._client.lock:
+            self._client.docs[self.path] = dict(data)
+
+    def get(self):
+        with self._client.lock:
+            return MemorySnapshot(self, self._client.docs.get(self.path))
+
+    def delete(self):
+        with self._client.lock:
+            self._client.docs.pop(self.path, None)
+
+
+class MemoryWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, ref, data):
+        self._ops.append((ref.path, dict(data)))
+
+    def delete(self, ref):
+        self._ops.append((ref.path, None))
+
+    def commit(self):
+        with self._client.lock:
+            if self._client.fail_next_commits > 0:
+                self._client.fail_next_commits -= 1
+                raise RuntimeError("simulated commit failure")
+            for path, data in self._ops:
+                if data is None:
+                    self._client.docs.pop(path, None)
+                else:
+                    self._client.docs[path] = data
+            self._client.commit_count += 1
@@ -1,12 +1,13 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
-from scipy.signal import welch, windows
+
+from data_cache import load_columns_cached
+from downsampling import minmax_downsample
+from sliding_stats import SlidingWindowStats
+from smoothing import centered_moving_average, smooth_series
+from spectral import get_welch_plan
 
 def moving_average(data, window_size=10):
-    if len(data) == 0 or isinstance(data[0], np.ndarray):
-        return np.array([])
-    return np.convolve(data, np.ones(window_size) / window_size, mode='same')
+    return centered_moving_average(data, window_size)
 
 def compute_muscle_activation(segment, max_value):
     return np.sqrt(np.mean(segment**2)) / (max_value + np.finfo(float).eps) if len(segment) > 0 else 0
@@ -33,13 +34,45 @@ def compute_power_output(segment, velocity):
 def compute_work_ratio(iemg_value, power_output):
     return iemg_value / max(power_output, np.finfo(float).eps) if power_output != 0 else 0
 
-def load_emg_data(filename):
-    data = np.loadtxt(filename, delimiter='\t', skiprows=1)
-    return data[:, [1, 4, 5, 8]] if data.size > 0 else np.array([])
+EMG_CHANNELS = ("L_BF", "L_VL", "R_BF", "R_VL")
+
+EMG_COLUMNS = [1, 4, 5, 8]
+ACC_COLUMNS = list(range(19, 28)) + list(range(46, 56))
+
+# Accelerometer column (index into ACC_COLUMNS) paired with each EMG channel: the
+# thigh marker on the muscle's own side, RTH1X (file column 19) or LTH1X (column 46).
+EMG_ACC_COLUMNS = {
+    "L_BF": ACC_COLUMNS.index(46),
+    "L_VL": ACC_COLUMNS.index(46),
+    "R_BF": ACC_COLUMNS.index(19),
+    "R_VL": ACC_COLUMNS.index(19),
+}
+
+def acc_columns_for(channels):
+    return [EMG_ACC_COLUMNS[name] for name in channels]
+
+def load_emg_data(filename, use_cache=True, dtype=np.float64):
+    if use_cache:
+        return _load_cached(filename, EMG_COLUMNS, dtype)
+    data = np.loadtxt(filename, delimiter='\t', skiprows=1, dtype=dtype)
+    return data[:, EMG_COLUMNS] if data.size > 0 else np.array([], dtype=dtype)
 
-def load_accelerometer_data(filename):
-    data = np.loadtxt(filename, delimiter='\t', skiprows=1)
-    return data[:, list(range(19, 28)) + list(range(46, 56))] if data.size > 0 else np.array([])
+def load_accelerometer_data(filename, use_cache=True, dtype=np.float64):
+    if use_cache:
+        return _load_cached(filename, ACC_COLUMNS, dtype)
+    data = np.loadtxt(filename, delimiter='\t', skiprows=1, dtype=dtype)
+    return data[:, ACC_COLUMNS] if data.size > 0 else np.array([], dtype=dtype)
+
+def _load_cached(filename, usecols, dtype=np.float64):
+    data = load_columns_cached(filename, usecols, dtype=dtype)
+    return data if data.size > 0 else np.array([], dtype=dtype)
+
+def compute_window_params(n_samples, fs_emg, overlap_ratio):
+    window_size = min(2 * fs_emg, n_samples // 5)
+    step_size = int(window_size * (1 - overlap_ratio))
+    num_windows = (n_samples - window_size) // step_size + 1
+    nfft_emg = max(2048, window_size)
+    return window_size, step_size, num_windows, nfft_emg
 
 def process_emg_acc_signals(
     emg_signal, 
@@ -51,27 +84,27 @@ def process_emg_acc_signals(
     step_size, 
     nfft_emg, 
     nfft_acc, 
-    fatigue_threshold
+    fatigue_threshold,
+    smoothing="causal",
+    acc_starts=None,
+    acc_lengths=None
 ):
+    """Per-window reference. acc_starts/acc_lengths: see alignment.AccAlignment."""
+    from scipy.signal import welch, windows
+
     start_idx = 0
     initial_mnf = None
-    results = {
-        "activation": [], 
-        "intensity": [], 
-        "force": [], 
-        "fatigue_index": [],
-        "firing_rate": [], 
-        "power_output": [], 
-        "work_ratio": [], 
-        "velocity": []
-    }
+    n_fit = (len(emg_signal) - window_size) // step_size + 1 if len(emg_signal) >= window_size else 0
+    n_out = max(min(num_windows, n_fit), 0)
+    results = {key: np.empty(n_out) for key in RESULT_KEYS}
+
+    for i in range(n_out):
 
-    for _ in range(num_windows):
-        if start_idx + window_size > len(emg_signal):
-            break
-        
         emg_segment = emg_signal[start_idx : start_idx + window_size]
-        acc_segment = acc_signal[start_idx : start_idx + window_size]
+        if acc_starts is None:
+            acc_segment = acc_signal[start_idx : start_idx + window_size]
+        else:
+            acc_segment = acc_signal[acc_starts[i] : acc_starts[i] + acc_lengths[i]]
         
         max_value = np.max(np.abs(emg_signal)) if len(emg_signal) > 0 else 1
 
@@ -92,32 +125,155 @@ def process_emg_acc_signals(
         
         iemg_value = np.sum(np.abs(emg_segment)) if len(emg_segment) > 0 else 0
         velocity = compute_velocity(acc_segment, fs_acc)
-        results["velocity"].append(np.mean(velocity) if len(velocity) > 0 else 0)
+        results["velocity"][i] = np.mean(velocity) if len(velocity) > 0 else 0
         
-        results["activation"].append(compute_muscle_activation(emg_segment, max_value))
-        results["intensity"].append(compute_muscle_intensity(emg_segment))
-        results["force"].append(compute_muscle_force(emg_segment))
-        results["fatigue_index"].append(compute_fatigue_index(initial_mnf, mnf_value, fatigue_threshold))
-        results["firing_rate"].append(compute_firing_rate(emg_segment))
+        results["activation"][i] = compute_muscle_activation(emg_segment, max_value)
+        results["intensity"][i] = compute_muscle_intensity(emg_segment)
+        results["force"][i] = compute_muscle_force(emg_segment)
+        results["fatigue_index"][i] = compute_fatigue_index(initial_mnf, mnf_value, fatigue_threshold)
+        results["firing_rate"][i] = compute_firing_rate(emg_segment)
         
         power_out = compute_power_output(emg_segment, velocity)
-        results["power_output"].append(power_out)
-        results["work_ratio"].append(compute_work_ratio(iemg_value, power_out))
+        results["power_output"][i] = power_out
+        results["work_ratio"][i] = compute_work_ratio(iemg_value, power_out)
         
         start_idx += step_size
     
     for key in results:
-        arr = np.array(results[key])
-        if len(arr) > 0 and isinstance(arr[0], (int, float, np.number)):
-            results[key] = moving_average(arr)
-        else:
-            results[key] = arr
+        results[key] = smooth_series(results[key], smoothing)
 
     final_activation = results["activation"][-1] * 100 if len(results["activation"]) else 0
     final_fatigue_score = results["fatigue_index"][-1] * 100 if len(results["fatigue_index"]) else 0
 
     return results, final_activation, final_fatigue_score
 
+# Part of every result_cache key: bump whenever a change here alters the numbers,
+# so cached results of the old algorithms are not served any more.
+ALGORITHM_VERSION = 2
+
+RESULT_KEYS = (
+    "activation",
+    "intensity",
+    "force",
+    "fatigue_index",
+    "firing_rate",
+    "power_output",
+    "work_ratio",
+    "velocity",
+)
+
+def sliding_windows(signal, window_size, step_size, num_windows=None):
+    """Read-only (..., num_windows, window_size) strided view over the last axis."""
+    signal = np.asarray(signal)
+    if signal.shape[-1] < window_size:
+        return np.empty(signal.shape[:-1] + (0, window_size), dtype=signal.dtype)
+    view = np.lib.stride_tricks.sliding_window_view(signal, window_size, axis=-1)[..., ::step_size, :]
+    return view if num_windows is None else view[..., :num_windows, :]
+
+def welch_mnf_batch(segments, fs, nfft):
+    """Mean frequency of each segment, as scipy.signal.welch with a Hamming window."""
+    return get_welch_plan(segments.shape[-1], nfft, fs).mnf(segments)
+
+def process_emg_acc_signals_batch(
+    emg_signal,
+    acc_signal,
+    fs_emg,
+    fs_acc,
+    num_windows,
+    window_size,
+    step_size,
+    nfft_emg,
+    nfft_acc,
+    fatigue_threshold,
+    block_windows=256,
+    smooth_window=10,
+    smoothing="causal",
+    dtype=np.float64,
+    acc_starts=None,
+    acc_lengths=None
+):
+    """
+    Vectorized process_emg_acc_signals; signals may be (channels, samples), giving
+    (channels, windows) results. smooth_window=None skips smoothing.
+    """
+    emg_signal = np.asarray(emg_signal, dtype=dtype)
+    acc_signal = np.asarray(acc_signal, dtype=dtype)
+    eps = np.finfo(float).eps
+    lead = emg_signal.shape[:-1]
+
+    emg_windows = sliding_windows(emg_signal, window_size, step_size, max(num_windows, 0))
+    n_win = emg_windows.shape[-2]
+    if n_win == 0:
+        empty = {key: np.empty(lead + (0,), dtype=dtype) for key in RESULT_KEYS}
+        return empty, np.zeros(lead) if lead else 0, np.zeros(lead) if lead else 0
+
+    max_value = np.max(np.abs(emg_signal), axis=-1, keepdims=True).astype(np.float64)
+    starts = np.arange(n_win) * step_size
+    stats = SlidingWindowStats(emg_signal)
+    sum_sq = np.maximum(stats.sum_sq(starts, window_size), 0.0)
+    rms = np.sqrt(sum_sq / window_size)
+    iemg = stats.iemg(starts, window_size)
+    firing_rate = stats.firing_rate(starts, window_size)
+
+    plan = get_welch_plan(window_size, nfft_emg, fs_emg)
+    mnf = np.empty(lead + (n_win,))
+    for lo in range(0, n_win, block_windows):
+        hi = min(lo + block_windows, n_win)
+        mnf[..., lo:hi] = plan.mnf(emg_windows[..., lo:hi, :])
+    initial_mnf = mnf[..., :1]
+    fatigue_index = (initial_mnf - mnf) / np.maximum(initial_mnf - fatigue_threshold, eps)
+
+    velocity, has_acc = _window_velocity(acc_signal, starts, window_size, fs_acc, acc_starts, acc_lengths)
+
+    power_output = np.where(has_acc, rms * velocity, 0.0)
+    work_ratio = np.where(power_output != 0, iemg / np.maximum(power_output, eps), 0.0)
+
+    raw = {
+        "activation": rms / (max_value + eps),
+        "intensity": rms,
+        "force": sum_sq / window_size,
+        "fatigue_index": fatigue_index,
+        "firing_rate": firing_rate,
+        "power_output": power_output,
+        "work_ratio": work_ratio,
+        "velocity": velocity,
+    }
+    if smooth_window is None:
+        results = {key: raw[key].astype(dtype, copy=False) for key in RESULT_KEYS}
+    else:
+        results = {key: smooth_series(raw[key], smoothing, smooth_window).astype(dtype, copy=False)
+                   for key in RESULT_KEYS}
+
+    final_activation = results["activation"][..., -1] * 100
+    final_fatigue_score = results["fatigue_index"][..., -1] * 100
+
+    return results, final_activation, final_fatigue_score
+
+def _window_velocity(acc_signal, starts, window_size, fs_acc, acc_starts=None, acc_lengths=None):
+    # mean(cumsum(a[:m])) / fs == sum((m - k) * a_k) / m / fs, one weighted sum per window
+
+    n_acc = acc_signal.shape[-1]
+    if acc_starts is None:
+        acc_starts = starts
+        acc_lengths = np.clip(n_acc - starts, 0, window_size)
+    else:
+        acc_starts = np.asarray(acc_starts)[:len(starts)]
+        acc_lengths = np.clip(np.asarray(acc_lengths)[:len(starts)], 0, np.maximum(n_acc - acc_starts, 0))
+    max_len = int(acc_lengths.max()) if len(acc_lengths) else 0
+    has_acc = acc_lengths > 0
+    if max_len == 0:
+        return np.zeros(acc_signal.shape[:-1] + (len(starts),)), has_acc
+
+    offsets = np.arange(max_len)
+    padded = np.zeros(acc_signal.shape[:-1] + (int(acc_starts.max()) + max_len,), dtype=acc_signal.dtype)
+    n_copy = min(n_acc, padded.shape[-1])
+    padded[..., :n_copy] = acc_signal[..., :n_copy]
+    segments = padded[..., acc_starts[:, None] + offsets]
+    weights = np.maximum(acc_lengths[:, None] - offsets, 0).astype(np.float64)
+    weighted = np.einsum("...wk,wk->...w", segments, weights, dtype=np.float64)
+    velocity = np.where(has_acc, weighted / np.maximum(acc_lengths, 1) / fs_acc, 0.0)
+    return velocity, has_acc
+
 def normalize_time(time_column):
     init_value = np.min(time_column)
     fin_value = np.max(time_column)
@@ -125,11 +281,12 @@ def normalize_time(time_column):
     b = 0 - m * init_value
     return time_column * m + b
 
-def plot_raw_data(filename, data_name, columns, labels=None):
-    data = pd.read_csv(filename, delimiter='\t', skiprows=1)
-    time_column = data.iloc[:, 0].values
-    new_time = normalize_time(time_column)
-    selected_data = data.iloc[:, columns].values
+def plot_raw_data(filename, data_name, columns, labels=None, max_points=5000):
+    import matplotlib.pyplot as plt
+
+    data = load_columns_cached(filename, [0] + list(columns))
+    new_time = normalize_time(data[:, 0])
+    selected_data = data[:, 1:]
 
     if labels is None:
         labels = [f'Signal_{i+1}' for i in range(len(columns))]
@@ -138,7 +295,8 @@ def plot_raw_data(filename, data_name, columns, labels=None):
 
     plt.figure(figsize=(12, 6))
     for i in range(len(columns)):
-        plt.plot(new_time, selected_data[:, i], color=colors[i], label=labels[i])
+        x, y = minmax_downsample(new_time, selected_data[:, i], max_points)
+        plt.plot(x, y, color=colors[i], label=labels[i])
 
     plt.xlabel('Normalized Time (0 to 100)')
     plt.ylabel(f'{data_name} Data')
@@ -148,6 +306,8 @@ def plot_raw_data(filename, data_name, columns, labels=None):
     plt.show()
 
 def plot_results(results, time_stamps, num_channels):
+    import matplotlib.pyplot as plt
+
     metrics = [
         "Muscle Activation", "Muscle Intensity", "Muscle Firing Rate", 
         "Muscle Fatigue Index", "Muscle Force", "Power Output", 
@@ -165,7 +325,8 @@ def plot_results(results, time_stamps, num_channels):
         
         for ch in range(num_channels):
             plt.subplot((num_channels + 1) // 2, 2, ch + 1)
-            plt.plot(time_stamps, data_to_plot[metric_idx], 'r', linewidth=1.5)
+            series = np.atleast_2d(data_to_plot[metric_idx])
+            plt.plot(time_stamps, series[min(ch, series.shape[0] - 1)], 'r', linewidth=1.5)
             plt.xlabel("Time (s)")
             plt.ylabel(metric)
             plt.title(f"Channel {ch+1}")
@@ -3,42 +3,34 @@ import time
 import numpy as np
 from datetime import datetime
 
-from firebase_connect import db
+from alignment import fallback_warning, session_acc_grid
+from firestore_client import get_db
+from firestore_cleanup import delete_user_sessions
 from my_signal_processing_module import (
+    EMG_CHANNELS,
+    RESULT_KEYS,
+    acc_columns_for,
+    compute_window_params,
     load_emg_data,
-    load_accelerometer_data,
-    process_emg_acc_signals
+    load_accelerometer_data
 )
-from v_main.local_storage import init_db, insert_result, get_unsynced, mark_synced
-
-init_db()  
-
-def cleanup_user_data(user_id: str):
-    user_ref = db.collection("users").document(user_id)
-    sessions_stream = user_ref.collection("sessions").stream()
-
-    sub_colls = ["muscle_activation", "muscle_fatigue", "force_velocity", "gait_metrics", "processed_results"]
-    deleted_count = 0
-
-    for sess_snap in sessions_stream:
-        sess_ref = sess_snap.reference
-        for sc in sub_colls:
-            docs = sess_ref.collection(sc).stream()
-            for d in docs:
-                d.reference.delete()
-                deleted_count += 1
-        sess_ref.delete()
-        print(f"Deleted session: {sess_snap.id}")
-
-    print(f"✅ Cleanup done! Total {deleted_count} docs removed under user '{user_id}'.")
-
-def determine_status(activation_val: float) -> str:
-    if activation_val < 0.4:
-        return "Warm-up"
-    elif activation_val < 0.8:
-        return "Plateau"
-    else:
-        return "Over-activation"
+from firestore_writer import FirestoreBatchWriter
+from instrumentation import TextfileExporter, metrics, profile_session, textfile_path
+from session_docs import channel_docs, channel_records, determine_status
+from streaming_processor import StreamingEmgProcessor
+from sync_worker import SyncWorker
+from local_storage import ensure_db, ResultBuffer
+from recording_pipeline import process_recording_file, recording_key, session_row_ids
+from result_cache import ResultCache
+
+def cleanup_user_data(user_id: str, dry_run=False):
+    db = get_db()
+    if db is None:
+        print("⚠️ Firestore is disabled, nothing to clean up.")
+        return
+    stats = delete_user_sessions(db, user_id, dry_run=dry_run)
+    verb = "would be removed" if dry_run else "removed"
+    print(f"✅ Cleanup done! Total {stats['documents']} docs {verb} under user '{user_id}'.")
 
 def simulate_realtime_processing(
     user_id: str,
@@ -48,43 +40,28 @@ def simulate_realtime_processing(
     fs_emg=2000,
     fs_acc=200,
     overlap_ratio=0.2,
-    real_interval_sec=2.0
+    real_interval_sec=2.0,
+    result_cache=None
 ):
     print(f"=== Start processing {emg_file} & {acc_file} => {session_id} ===")
 
-    emg_data = load_emg_data(emg_file)
-    acc_data = load_accelerometer_data(acc_file)
-
-    if emg_data.size == 0 or acc_data.size == 0:
-        print(f"❌ Skipped empty: {emg_file} or {acc_file}")
+    def compute():
+        output = process_recording_file(emg_file, acc_file, fs_emg, fs_acc, overlap_ratio, n_channels=1,
+                                        session_id=session_id)
+        if output is None:
+            return None
+        warning = fallback_warning(output["alignment"], emg_file, acc_file)
+        if warning:
+            print(warning)
+        results = {key: output["results"][key][0] for key in RESULT_KEYS}
+        return dict(results, final=np.array([output["final_activation"][0], output["final_fatigue"][0]]))
+
+    cache_key = recording_key(emg_file, acc_file, mode="single", fs_emg=fs_emg, fs_acc=fs_acc,
+                              overlap_ratio=overlap_ratio)
+    results = _cached(result_cache, cache_key, compute, session_id)
+    if results is None:
         return
-
-    window_size = min(2 * fs_emg, emg_data.shape[0] // 5)
-    step_size = int(window_size * (1 - overlap_ratio))
-    num_windows = (emg_data.shape[0] - window_size) // step_size + 1
-    nfft_emg = max(2048, window_size)
-    nfft_acc = nfft_emg
-    fatigue_threshold = 0
-
-    ch_index = 0
-    emg_signal = emg_data[:, ch_index]
-    if acc_data.shape[1] > ch_index:
-        acc_signal = acc_data[:, ch_index]
-    else:
-        acc_signal = np.zeros_like(emg_signal)
-
-    results, final_activation, final_fatigue_score = process_emg_acc_signals(
-        emg_signal,
-        acc_signal,
-        fs_emg,
-        fs_acc,
-        num_windows,
-        window_size,
-        step_size,
-        nfft_emg,
-        nfft_acc,
-        fatigue_threshold
-    )
+    final_activation, final_fatigue_score = results["final"]
 
     activation_arr = results["activation"]
     fatigue_arr = results["fatigue_index"]
@@ -93,10 +70,15 @@ def simulate_realtime_processing(
     power_arr = results["power_output"]
 
     n_windows = len(activation_arr)
+    row_ids = session_row_ids(session_id, cache_key, n_windows)
+    ensure_db()
+    buffer = ResultBuffer()
+    writer, session_ref = _session_writer(user_id, session_id)
 
     for i in range(n_windows):
         now_ts = datetime.utcnow().isoformat()  
         local_rec = {
+            'id': row_ids[i],
             'session_id': session_id,
             'timestamp': now_ts,
             'muscle_fatigue': float(fatigue_arr[i]),
@@ -105,42 +87,182 @@ def simulate_realtime_processing(
             'velocity': float(velocity_arr[i]),
             'power_output': float(power_arr[i]),
         }
-        insert_result(local_rec)
-
-        doc_activation = {
-            "time": now_ts,
-            "Quadriceps_activation": float(activation_arr[i]),
-            "Average_activation": float(activation_arr[i]),
-            "status": determine_status(activation_arr[i]),
-        }
-        db.collection("users").document(user_id)\
-          .collection("sessions").document(session_id)\
-          .collection("muscle_activation").add(doc_activation)
-
-        doc_fatigue = {
-            "time": now_ts,
-            "Quadriceps_fatigue_level": float(fatigue_arr[i]),
-        }
-        db.collection("users").document(user_id)\
-          .collection("sessions").document(session_id)\
-          .collection("muscle_fatigue").add(doc_fatigue)
-
-        doc_force = {
-            "time": now_ts,
-            "Quadracept_force_now": float(force_arr[i]),
-            "Current_velocity": float(velocity_arr[i]),
-            "power_output": float(power_arr[i]),
-        }
-        db.collection("users").document(user_id)\
-          .collection("sessions").document(session_id)\
-          .collection("force_velocity").add(doc_force)
+        buffer.add(local_rec)
+
+        if writer is not None:
+            doc_activation = {
+                "time": now_ts,
+                "Quadriceps_activation": float(activation_arr[i]),
+                "Average_activation": float(activation_arr[i]),
+                "status": determine_status(activation_arr[i]),
+            }
+            writer.set(session_ref.collection("muscle_activation").document(row_ids[i]), doc_activation)
+
+            doc_fatigue = {
+                "time": now_ts,
+                "Quadriceps_fatigue_level": float(fatigue_arr[i]),
+            }
+            writer.set(session_ref.collection("muscle_fatigue").document(row_ids[i]), doc_fatigue)
+
+            doc_force = {
+                "time": now_ts,
+                "Quadracept_force_now": float(force_arr[i]),
+                "Current_velocity": float(velocity_arr[i]),
+                "power_output": float(power_arr[i]),
+            }
+            writer.set(session_ref.collection("force_velocity").document(row_ids[i]), doc_force)
 
         print(f"[window {i+1}/{n_windows}] Activation={activation_arr[i]:.3f}, Fatigue={fatigue_arr[i]:.3f}")
         time.sleep(real_interval_sec)
 
+    buffer.flush()
+    if writer is not None:
+        writer.close()
     print(f"✅ Done: {session_id}, final_activation={final_activation}, final_fatigue={final_fatigue_score}\n")
 
-def simulate_batch_files(user_id: str, emg_dir: str, acc_dir: str):
+def simulate_multichannel_processing(
+    user_id: str,
+    session_id: str,
+    emg_file: str,
+    acc_file: str,
+    fs_emg=2000,
+    fs_acc=200,
+    overlap_ratio=0.2,
+    real_interval_sec=2.0,
+    acc_channels=None,
+    result_cache=None
+):
+    """
+    Process every EMG channel in one pass. EMG channel i is paired with accelerometer
+    column acc_channels[i] (default: EMG_ACC_COLUMNS, the thigh marker on its side).
+    One local row per channel and window is written, tagged with the channel name.
+    """
+    print(f"=== Start multi-channel processing {emg_file} & {acc_file} => {session_id} ===")
+
+    def compute():
+        output = process_recording_file(emg_file, acc_file, fs_emg, fs_acc, overlap_ratio, acc_columns=acc_channels,
+                                        session_id=session_id)
+        if output is None:
+            return None
+        warning = fallback_warning(output["alignment"], emg_file, acc_file)
+        if warning:
+            print(warning)
+        return dict(output["results"], final=np.stack([output["final_activation"], output["final_fatigue"]]))
+
+    cache_key = recording_key(emg_file, acc_file, mode="multi", fs_emg=fs_emg, fs_acc=fs_acc,
+                              overlap_ratio=overlap_ratio, acc_channels=acc_channels)
+    results = _cached(result_cache, cache_key, compute, session_id)
+    if results is None:
+        return
+    final_activation, final_fatigue_score = results["final"]
+
+    activation_arr = results["activation"]
+    n_channels, n_windows = activation_arr.shape
+    channels = EMG_CHANNELS[:n_channels]
+
+    row_ids = session_row_ids(session_id, cache_key, n_windows * n_channels)
+    doc_ids = session_row_ids(session_id, cache_key, n_windows, "/docs")
+    ensure_db()
+    buffer = ResultBuffer()
+    writer, session_ref = _session_writer(user_id, session_id)
+    for i in range(n_windows):
+        now_ts = datetime.utcnow().isoformat()
+        window = {key: results[key][:, i] for key in RESULT_KEYS}
+        records = channel_records(session_id, now_ts, channels, window)
+        for record, row_id in zip(records, row_ids[i * n_channels:(i + 1) * n_channels]):
+            record['id'] = row_id
+        buffer.add_many(records)
+
+        docs = channel_docs(now_ts, channels, window)
+        if writer is not None:
+            for collection, doc in docs.items():
+                writer.set(session_ref.collection(collection).document(doc_ids[i]), doc)
+
+        print(f"[window {i+1}/{n_windows}] Avg activation={docs['muscle_activation']['Average_activation']:.3f}")
+        time.sleep(real_interval_sec)
+
+    buffer.flush()
+    if writer is not None:
+        writer.close()
+    summary = ", ".join(
+        f"{name}={final_activation[ch]:.2f}/{final_fatigue_score[ch]:.2f}"
+        for ch, name in enumerate(EMG_CHANNELS[:n_channels])
+    )
+    print(f"✅ Done: {session_id}, final activation/fatigue per channel: {summary}\n")
+
+def simulate_streaming_processing(
+    session_id: str,
+    emg_file: str,
+    acc_file: str,
+    fs_emg=2000,
+    fs_acc=200,
+    overlap_ratio=0.2,
+    chunk_size=100,
+    speed=1.0
+):
+    """
+    Replay a recording sample chunk by sample chunk through StreamingEmgProcessor,
+    paced like a live sleeve (`speed` > 1 replays faster). Each window is stored as
+    soon as it completes; Firestore upload is left to sync_to_firebase.
+    """
+    print(f"=== Start streaming {emg_file} & {acc_file} => {session_id} ===")
+
+    with metrics.stage("load", session_id):
+        emg_data = load_emg_data(emg_file)
+        acc_data = load_accelerometer_data(acc_file)
+
+    if emg_data.size == 0:
+        print(f"❌ Skipped empty: {emg_file}")
+        return
+
+    window_size, step_size, _, nfft_emg = compute_window_params(
+        emg_data.shape[0], fs_emg, overlap_ratio
+    )
+    n_channels = emg_data.shape[1]
+    acc_columns = acc_columns_for(EMG_CHANNELS[:n_channels])
+    acc_data = acc_data[:, acc_columns] if acc_data.size else np.zeros((0, n_channels))
+    # one row per EMG sample (NaN where no acc sample falls), so chunks slice both alike
+    acc_grid = session_acc_grid(emg_file, acc_file, emg_data.shape[0], acc_data, fs_emg, fs_acc)
+
+    processor = StreamingEmgProcessor(
+        n_channels, fs_emg, fs_acc, window_size, step_size, nfft_emg
+    )
+    ensure_db()
+    buffer = ResultBuffer()
+    for start in range(0, emg_data.shape[0], chunk_size):
+        stop = start + chunk_size
+        with metrics.stage("window_compute", session_id) as span:
+            windows = processor.push(emg_data[start:stop], acc_grid[start:stop])
+            span.items = len(windows)
+        for window in windows:
+            now_ts = datetime.utcnow().isoformat()
+            smoothed = window["smoothed"]
+            buffer.add_many(channel_records(session_id, now_ts, EMG_CHANNELS[:n_channels], smoothed))
+            print(f"[window {window['window'] + 1}] Avg activation={np.mean(smoothed['activation']):.3f}")
+        time.sleep(chunk_size / fs_emg / speed)
+
+    buffer.flush()
+    print(f"✅ Done streaming: {session_id}\n")
+
+def _cached(result_cache, key, compute, session_id):
+    """compute() through result_cache (if given); None when there is nothing to process."""
+    if result_cache is None:
+        return compute()
+    results, hit = result_cache.fetch(key, compute)
+    if hit:
+        print(f"✅ {session_id}: unchanged recording, results from cache")
+    return results
+
+def _session_writer(user_id, session_id):
+    """(FirestoreBatchWriter, session document) for the dashboard docs, or (None, None) if Firestore is disabled."""
+    db = get_db()
+    if db is None:
+        return None, None
+    session_ref = db.collection("users").document(user_id)\
+                    .collection("sessions").document(session_id)
+    return FirestoreBatchWriter(db, session_id=session_id), session_ref
+
+def simulate_batch_files(user_id: str, emg_dir: str, acc_dir: str, all_channels=False, result_cache=None):
     emg_files = sorted([f for f in os.listdir(emg_dir) if f.endswith(".txt")])
     if not emg_files:
         print(f"❌ No .txt in {emg_dir}, skip.")
@@ -157,51 +279,50 @@ def simulate_batch_files(user_id: str, emg_dir: str, acc_dir: str):
             continue
 
         session_id = f"session_{base_name}"
-        simulate_realtime_processing(
-            user_id=user_id,
-            session_id=session_id,
-            emg_file=full_emg_path,
-            acc_file=full_acc_path
-        )
+        process = simulate_multichannel_processing if all_channels else simulate_realtime_processing
+        with profile_session(session_id):
+            process(
+                user_id=user_id,
+                session_id=session_id,
+                emg_file=full_emg_path,
+                acc_file=full_acc_path,
+                result_cache=result_cache
+            )
 
 
 def sync_to_firebase(user_id: str):
-    rows = get_unsynced()
-    print(f"Found {len(rows)} unsynced records to sync.")
-    for row in rows:
-        """
-        row: (id, session_id, timestamp, muscle_fatigue, muscle_activation, force, velocity, power_output)
-        """
-        row_id = row[0]
-        session_id = row[1]
-        timestamp = row[2]
-        muscle_fatigue = row[3]
-        muscle_activation = row[4]
-        force = row[5]
-        velocity = row[6]
-        power_output = row[7]
-        doc_data = {
-            "time": timestamp,
-            "muscle_fatigue": muscle_fatigue,
-            "muscle_activation": muscle_activation,
-            "force": force,
-            "velocity": velocity,
-            "power_output": power_output
-        }
-        sess_ref = db.collection("users").document(user_id) \
-                     .collection("sessions").document(session_id)
-        sub_ref = sess_ref.collection("processed_results")
-        sub_ref.document(row_id).set(doc_data)
-
-        mark_synced(row_id)
-
-    print("✅ Sync done. All local unsynced records are now in Firebase.")
+    """
+    Upload every pending local row (see sync_worker.SyncWorker) and wait for the commits.
+    """
+    db = get_db()
+    if db is None:
+        print("⚠️ Firestore is disabled, local results stay unsynced.")
+        return
+    ensure_db()
+    worker = SyncWorker(db, user_id)
+    print(f"Found {worker.backlog()} unsynced records to sync.")
+    worker.drain()
+    backlog = worker.backlog()
+    if backlog:
+        print(f"⚠️ Sync incomplete: {backlog} records stay unsynced and will be retried next time.")
+    else:
+        print("✅ Sync done. All local unsynced records are now in Firebase.")
 
 def main():
     user_id = "user_001"
     emg_dir = "../data/V4/EMG"
     acc_dir = "../data/V4/Trajectories"
-    simulate_batch_files(user_id, emg_dir, acc_dir)
+    ensure_db()
+    exporter = TextfileExporter(textfile_path("realtime_processor"))
+    exporter.start()
+    db = get_db()
+    sync = SyncWorker(db, user_id) if db is not None else None
+    if sync is not None:
+        sync.start()
+    simulate_batch_files(user_id, emg_dir, acc_dir, result_cache=ResultCache())
+    if sync is not None:
+        sync.stop()
+    exporter.stop()
     print("✅ All tasks done. You can check local_data.db and/or Firebase console now.")
 
 
@@ -0,0 +1,91 @@
+# recording_pipeline.py
+
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from alignment import session_alignment
+from instrumentation import metrics
+from local_storage import result_row_ids
+from my_signal_processing_module import (
+    EMG_CHANNELS,
+    acc_columns_for,
+    compute_window_params,
+    load_emg_data,
+    load_accelerometer_data,
+    process_emg_acc_signals_batch
+)
+from result_cache import result_key
+
+
+def process_recording_file(emg_file, acc_file, fs_emg=2000, fs_acc=200, overlap_ratio=0.2, n_channels=None,
+                           acc_columns=None, smoothing="causal", dtype=np.float64, fatigue_threshold=0,
+                           session_id=None):
+    """
+    Load -> window parameters -> acc alignment -> batch engine for one recording,
+    the first `n_channels` EMG channels (all if None), EMG channel i paired with acc
+    column acc_columns[i] (default EMG_ACC_COLUMNS). Returns None for an empty
+    recording, else a dict with results[key] (channels, windows), final_activation /
+    final_fatigue (per channel), channels, window_size, step_size, alignment (the
+    AccAlignment source, "time" or "rate"), load_sec, seconds.
+    """
+    t0 = time.perf_counter()
+    with metrics.stage("load", session_id):
+        emg_data = load_emg_data(emg_file, dtype=dtype)
+        acc_data = load_accelerometer_data(acc_file, dtype=dtype)
+    load_sec = time.perf_counter() - t0
+    if emg_data.size == 0 or acc_data.size == 0:
+        print(f"❌ Skipped empty: {emg_file} or {acc_file}")
+        return None
+
+    window_size, step_size, num_windows, nfft_emg = compute_window_params(emg_data.shape[0], fs_emg, overlap_ratio)
+    alignment = session_alignment(
+        emg_file, acc_file, emg_data.shape[0], acc_data.shape[0], fs_emg, fs_acc,
+        window_size, step_size, num_windows
+    )
+    n_channels = emg_data.shape[1] if n_channels is None else min(n_channels, emg_data.shape[1])
+    emg_signals = np.ascontiguousarray(emg_data[:, :n_channels].T)
+    if acc_columns is None:
+        acc_columns = acc_columns_for(EMG_CHANNELS[:n_channels])
+    acc_signals = np.zeros((n_channels, acc_data.shape[0]), dtype=dtype)
+    for ch, col in enumerate(list(acc_columns)[:n_channels]):
+        if col < acc_data.shape[1]:
+            acc_signals[ch] = acc_data[:, col]
+
+    with metrics.stage("window_compute", session_id, items=max(num_windows, 0) * n_channels):
+        results, final_activation, final_fatigue = process_emg_acc_signals_batch(
+            emg_signals, acc_signals, fs_emg, fs_acc, num_windows,
+            window_size, step_size, nfft_emg, nfft_emg, fatigue_threshold, smoothing=smoothing, dtype=dtype,
+            acc_starts=alignment.starts, acc_lengths=alignment.lengths
+        )
+    return {
+        "results": results,
+        "final_activation": final_activation,
+        "final_fatigue": final_fatigue,
+        "channels": list(EMG_CHANNELS[:n_channels]),
+        "window_size": window_size,
+        "step_size": step_size,
+        "alignment": alignment.source,
+        "load_sec": load_sec,
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+def recording_key(emg_file, acc_file, **params):
+    """result_cache key of a recording processed with `params` (see process_recording_file)."""
+    return result_key((emg_file, acc_file), fatigue_threshold=0, **params)
+
+
+def session_row_ids(session_id, key, n_rows, suffix=""):
+    """
+    Stable ids for a session's stored results: the same recording and parameters give
+    the same row / document ids, so re-ingesting it adds nothing.
+    """
+    return result_row_ids(f"{session_id}/{key}{suffix}", n_rows)
+
+
+def window_timestamps(start, n_windows, step_size, fs_emg):
+    """ISO timestamp of every window: recording start + window_index * step_size / fs_emg."""
+    step = timedelta(seconds=step_size / fs_emg)
+    return [(start + i * step).isoformat() for i in range(n_windows)]
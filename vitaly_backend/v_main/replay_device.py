@@ -0,0 +1,124 @@
+# replay_device.py
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from alignment import session_times
+from frame_ingest_server import DEFAULT_PORT
+from my_signal_processing_module import (
+    EMG_CHANNELS,
+    acc_columns_for,
+    compute_window_params,
+    load_emg_data,
+    load_accelerometer_data
+)
+from sensor_frames import emg_scale_for, encode_bye, encode_hello, encode_samples, quantize_emg
+
+
+def recording_frames(emg_file, acc_file, fs_emg=2000, fs_acc=200, frame_samples=100):
+    """
+    Yield (emg_time, frame bytes) for one recording: int16 EMG (scaled to the
+    recording's peak) and the float32 acc samples whose Time falls inside each
+    frame's EMG span, one acc column per EMG channel (EMG_ACC_COLUMNS). Uses the
+    files' Time columns, or the sampling rates.
+    """
+    emg = load_emg_data(emg_file)
+    acc = load_accelerometer_data(acc_file)
+    n_emg = emg.shape[0]
+    acc_columns = acc_columns_for(EMG_CHANNELS[:emg.shape[1]])
+    acc = acc[:, acc_columns] if acc.size else np.zeros((0, emg.shape[1]))
+    emg_time, acc_time, _source = session_times(emg_file, acc_file, n_emg, acc.shape[0], fs_emg, fs_acc)
+
+    scale = emg_scale_for(emg)
+    counts = quantize_emg(emg, scale)
+    acc32 = np.ascontiguousarray(acc, dtype=np.float32)
+    starts = np.arange(0, n_emg, frame_samples)
+    edges = np.append(emg_time[starts], np.inf)
+    acc_edges = np.searchsorted(acc_time, edges, side="left")
+    for seq, start in enumerate(starts):
+        a0, a1 = acc_edges[seq], acc_edges[seq + 1]
+        acc_ts = acc_time[a0] if a1 > a0 else emg_time[start]
+        frame = encode_samples(seq, emg_time[start], counts[start:start + frame_samples], acc32[a0:a1], scale, acc_ts)
+        yield emg_time[start], frame
+
+
+async def replay_recording(host, port, session_id, emg_file, acc_file, fs_emg=2000, fs_acc=200,
+                           frame_samples=100, speed=1.0, overlap_ratio=0.2, user_id=None):
+    """
+    Stream one recording to a FrameIngestServer as a live sleeve would, `speed`
+    times real time (0 = as fast as the server accepts). Returns (frames, bytes).
+    """
+    n_samples, n_channels = load_emg_data(emg_file).shape
+    window_size, step_size, _, nfft_emg = compute_window_params(n_samples, fs_emg, overlap_ratio)
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(encode_hello(
+        session_id, n_channels, fs_emg, fs_acc, user_id=user_id, channels=list(EMG_CHANNELS[:n_channels]),
+        window_size=window_size, step_size=step_size, nfft_emg=nfft_emg
+    ))
+    frames = 0
+    sent = 0
+    t_start = time.perf_counter()
+    t_first = None
+    for emg_ts, frame in recording_frames(emg_file, acc_file, fs_emg, fs_acc, frame_samples):
+        if speed > 0:
+            t_first = emg_ts if t_first is None else t_first
+            delay = (emg_ts - t_first) / speed - (time.perf_counter() - t_start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        writer.write(frame)
+        await writer.drain()
+        frames += 1
+        sent += len(frame)
+    writer.write(encode_bye())
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+    return frames, sent
+
+
+async def replay_all(host, port, recordings, **kwargs):
+    tasks = [
+        replay_recording(host, port, session_id, emg_file, acc_file, **kwargs)
+        for session_id, emg_file, acc_file in recordings
+    ]
+    return await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recordings to frame_ingest_server as binary sensor frames.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--emg-dir", default="../data/V4/EMG")
+    parser.add_argument("--acc-dir", default="../data/V4/Trajectories")
+    parser.add_argument("--sessions", type=int, default=None,
+                        help="number of concurrent devices (recordings are reused round-robin)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 = as fast as possible")
+    parser.add_argument("--frame-samples", type=int, default=100, help="EMG samples per frame")
+    parser.add_argument("--user", default=None)
+    args = parser.parse_args()
+
+    from batch_runner import find_recordings
+
+    recordings = find_recordings(args.emg_dir, args.acc_dir)
+    if not recordings:
+        print(f"❌ No recordings in {args.emg_dir}, skip.")
+        return
+    n_sessions = args.sessions or len(recordings)
+    recordings = [
+        (f"{recordings[i % len(recordings)][0]}_dev{i}", *recordings[i % len(recordings)][1:])
+        for i in range(n_sessions)
+    ]
+    t_start = time.perf_counter()
+    results = asyncio.run(replay_all(args.host, args.port, recordings, frame_samples=args.frame_samples,
+                                     speed=args.speed, user_id=args.user))
+    total = time.perf_counter() - t_start
+    for (session_id, _, _), (frames, sent) in zip(recordings, results):
+        print(f"✅ {session_id}: {frames} frames, {sent / 1024:.1f} KiB")
+    print(f"✅ Replayed {len(recordings)} devices in {total:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# result_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import zipfile
+
+import numpy as np
+
+from instrumentation import metrics
+from my_signal_processing_module import ALGORITHM_VERSION
+
+CACHE_DIR = ".result_cache"
+DEFAULT_MAX_BYTES = 512 * 2**20
+
+metrics.describe("vitaly_result_cache_total", "counter", "Result cache lookups by outcome (hit / miss).")
+
+_digests = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(filename, chunk_size=2**20):
+    """sha256 of the file contents, remembered per (path, mtime, size) within this process."""
+    st = os.stat(filename)
+    memo_key = (os.path.abspath(filename), st.st_mtime_ns, st.st_size)
+    with _digest_lock:
+        digest = _digests.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with _digest_lock:
+            _digests[memo_key] = digest
+    return digest
+
+
+def _plain(value):
+    if isinstance(value, (type, np.dtype)):
+        return np.dtype(value).str
+    if isinstance(value, (tuple, list)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def result_key(input_files, **params):
+    """
+    Cache key for processing `input_files` with `params`: the files' contents (a
+    renamed or touched copy still hits), every parameter and ALGORITHM_VERSION.
+    """
+    body = {
+        "files": [file_digest(f) for f in input_files],
+        "params": {name: _plain(value) for name, value in params.items()},
+        "algorithm": ALGORITHM_VERSION,
+    }
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Processed results on disk, one .npz of named arrays per key under `directory`.
+
+    A hit refreshes the entry's mtime, and eviction removes the oldest mtimes first,
+    so the cache is LRU, bounded by `max_bytes` and optionally `max_entries`. Writes
+    go through a tmp file and a rename, so worker processes can share a directory;
+    an entry another process evicts before it is read is simply a miss.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_entries=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """The stored arrays for `key`, or None."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+            os.utime(path)
+        except (OSError, ValueError, zipfile.BadZipFile):
+            metrics.inc("vitaly_result_cache_total", result="miss")
+            return None
+        metrics.inc("vitaly_result_cache_total", result="hit")
+        return arrays
+
+    def put(self, key, arrays):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def fetch(self, key, compute):
+        """
+        (arrays, hit): the cached arrays, or compute() stored under `key`. compute()
+        returns a dict of arrays, or None for "nothing to cache".
+        """
+        arrays = self.get(key)
+        if arrays is not None:
+            return arrays, True
+        arrays = compute()
+        if arrays is not None:
+            self.put(key, arrays)
+        return arrays, False
+
+    def _entries(self):
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if name.endswith(".npz"):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        """Remove least recently used entries until the limits hold. Returns how many."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+            total -= size
+            count -= 1
+        return removed
+
+    def clear(self):
+        removed = 0
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
@@ -0,0 +1,147 @@
+# sensor_frames.py
+
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b"VTLY"
+VERSION = 1
+
+KIND_HELLO = 1    # payload: UTF-8 JSON session description
+KIND_SAMPLES = 2  # payload: SAMPLES_HEADER, int16 EMG, float32 acc
+KIND_BYE = 3      # no payload; the device is done with the session
+
+# magic, version, kind, flags (unused), payload length
+FRAME_HEADER = struct.Struct("<4sBBHI")
+# seq, EMG timestamp (time of the first EMG sample, s), acc timestamp (first acc sample, s),
+# EMG scale (units per int16 count), EMG channels, EMG samples, acc channels, acc samples
+SAMPLES_HEADER = struct.Struct("<IddfHHHH")
+
+EMG_DTYPE = np.dtype("<i2")
+ACC_DTYPE = np.dtype("<f4")
+MAX_PAYLOAD = 16 * 2**20
+
+
+class FrameError(ValueError):
+    """A frame that is truncated, malformed, of another protocol version or too large."""
+
+
+class SampleFrame:
+    """
+    One decoded KIND_SAMPLES frame. `emg_counts` (samples, channels) int16 and `acc`
+    (samples, channels) float32 are read-only views into the received payload.
+    """
+
+    __slots__ = ("seq", "timestamp", "acc_timestamp", "emg_scale", "emg_counts", "acc")
+
+    def __init__(self, seq, timestamp, acc_timestamp, emg_scale, emg_counts, acc):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.acc_timestamp = acc_timestamp
+        self.emg_scale = emg_scale
+        self.emg_counts = emg_counts
+        self.acc = acc
+
+    def emg(self, dtype=np.float64):
+        """EMG in physical units (one multiply, the only copy of the samples)."""
+        return np.multiply(self.emg_counts, self.emg_scale, dtype=dtype)
+
+
+def _pad4(n):
+    return -n % 4
+
+
+def _frame(kind, payload=b""):
+    if len(payload) > MAX_PAYLOAD:
+        raise FrameError(f"payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    return FRAME_HEADER.pack(MAGIC, VERSION, kind, 0, len(payload)) + payload
+
+
+def encode_hello(session_id, n_channels, fs_emg, fs_acc, **fields):
+    """Session-opening frame; extra fields (user_id, channels, window_size, ...) go into the JSON."""
+    body = dict(fields, session_id=session_id, n_channels=n_channels, fs_emg=fs_emg, fs_acc=fs_acc)
+    return _frame(KIND_HELLO, json.dumps(body).encode("utf-8"))
+
+
+def encode_bye():
+    return _frame(KIND_BYE)
+
+
+def encode_samples(seq, timestamp, emg_counts, acc=None, emg_scale=1.0, acc_timestamp=None):
+    """
+    Samples frame for (samples, channels) int16 EMG counts and (samples, channels)
+    float32 acc (may be None or empty). Both blocks are sample-interleaved.
+    """
+    emg_counts = np.ascontiguousarray(emg_counts, dtype=EMG_DTYPE)
+    if emg_counts.ndim != 2:
+        raise FrameError("emg_counts must be (samples, channels)")
+    if acc is None:
+        acc = np.empty((0, 0), dtype=ACC_DTYPE)
+    acc = np.ascontiguousarray(acc, dtype=ACC_DTYPE)
+    if acc.ndim != 2:
+        raise FrameError("acc must be (samples, channels)")
+    if max(emg_counts.shape + acc.shape) > 0xFFFF:
+        raise FrameError("more than 65535 samples or channels in one frame")
+    header = SAMPLES_HEADER.pack(
+        seq & 0xFFFFFFFF, timestamp, timestamp if acc_timestamp is None else acc_timestamp, emg_scale,
+        emg_counts.shape[1], emg_counts.shape[0], acc.shape[1], acc.shape[0]
+    )
+    emg_bytes = emg_counts.tobytes()
+    payload = b"".join((header, emg_bytes, b"\0" * _pad4(len(emg_bytes)), acc.tobytes()))
+    return _frame(KIND_SAMPLES, payload)
+
+
+def decode_header(data):
+    """(kind, payload length) of a FRAME_HEADER.size-byte header."""
+    if len(data) != FRAME_HEADER.size:
+        raise FrameError(f"frame header of {len(data)} bytes, expected {FRAME_HEADER.size}")
+    magic, version, kind, _flags, length = FRAME_HEADER.unpack(data)
+    if magic != MAGIC:
+        raise FrameError(f"bad magic {magic!r}")
+    if version != VERSION:
+        raise FrameError(f"unsupported frame version {version}")
+    if length > MAX_PAYLOAD:
+        raise FrameError(f"payload of {length} bytes exceeds {MAX_PAYLOAD}")
+    return kind, length
+
+
+def decode_hello(payload):
+    try:
+        hello = json.loads(bytes(payload).decode("utf-8"))
+    except ValueError as e:  # also UnicodeDecodeError
+        raise FrameError(f"hello frame is not UTF-8 JSON: {e}")
+    if not isinstance(hello, dict):
+        raise FrameError("hello frame is not a JSON object")
+    for key in ("session_id", "n_channels", "fs_emg", "fs_acc"):
+        if key not in hello:
+            raise FrameError(f"hello frame without {key}")
+    return hello
+
+
+def decode_samples(payload):
+    """SampleFrame over `payload` (bytes / memoryview); the sample arrays are not copied."""
+    if len(payload) < SAMPLES_HEADER.size:
+        raise FrameError("samples frame shorter than its header")
+    seq, timestamp, acc_timestamp, emg_scale, n_emg_ch, n_emg, n_acc_ch, n_acc = \
+        SAMPLES_HEADER.unpack_from(payload)
+    emg_offset = SAMPLES_HEADER.size
+    emg_bytes = n_emg * n_emg_ch * EMG_DTYPE.itemsize
+    acc_offset = emg_offset + emg_bytes + _pad4(emg_bytes)
+    if acc_offset + n_acc * n_acc_ch * ACC_DTYPE.itemsize != len(payload):
+        raise FrameError("samples frame length does not match its header")
+    emg_counts = np.frombuffer(payload, EMG_DTYPE, n_emg * n_emg_ch, emg_offset).reshape(n_emg, n_emg_ch)
+    acc = np.frombuffer(payload, ACC_DTYPE, n_acc * n_acc_ch, acc_offset).reshape(n_acc, n_acc_ch)
+    return SampleFrame(seq, timestamp, acc_timestamp, emg_scale, emg_counts, acc)
+
+
+def quantize_emg(emg, emg_scale):
+    """Float EMG -> int16 counts of `emg_scale` units, saturating at the int16 range."""
+    counts = np.rint(np.asarray(emg, dtype=np.float64) / emg_scale)
+    return np.clip(counts, -32768, 32767).astype(EMG_DTYPE)
+
+
+def emg_scale_for(emg, headroom=1.0):
+    """Scale that maps max |emg| * headroom to the int16 range."""
+    peak = float(np.max(np.abs(emg))) if np.size(emg) else 0.0
+    return peak * headroom / 32767 if peak > 0 else 1.0
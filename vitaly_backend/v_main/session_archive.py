@@ -0,0 +1,149 @@
+# session_archive.py
+
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+
+from instrumentation import metrics
+from local_storage import (
+    SESSION_COLUMNS,
+    init_db,
+    get_session_rows,
+    list_finished_sessions,
+    count_unsynced,
+    delete_session
+)
+
+ARCHIVE_DIR = "session_archive"
+METRIC_COLUMNS = SESSION_COLUMNS[1:-1]
+
+
+def archive_path(session_id, archive_dir=ARCHIVE_DIR):
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", session_id)
+    return os.path.join(archive_dir, f"{safe_name}.npz")
+
+
+def write_session_archive(session_id, rows, archive_dir=ARCHIVE_DIR):
+    """
+    Write one session as a compressed .npz with one array per column.
+
+    Metrics are float32. Timestamps are a float64 `ts_base` plus float32 offsets
+    `ts_offset` (float32 epoch seconds would be off by minutes). Channels are int8
+    codes into `channels`, with -1 for single-channel rows.
+    """
+    ts = np.array([row[0] if row[0] is not None else np.nan for row in rows], dtype=np.float64)
+    ts_base = np.nanmin(ts) if len(ts) and not np.all(np.isnan(ts)) else 0.0
+    channel_names = sorted({row[-1] for row in rows if row[-1] is not None})
+    channel_code = {name: i for i, name in enumerate(channel_names)}
+
+    columns = {
+        "session_id": np.array(session_id),
+        "ts_base": np.array(ts_base, dtype=np.float64),
+        "ts_offset": (ts - ts_base).astype(np.float32),
+        "channels": np.array(channel_names, dtype=str),
+        "channel": np.array([channel_code.get(row[-1], -1) for row in rows], dtype=np.int8),
+    }
+    for i, name in enumerate(METRIC_COLUMNS, start=1):
+        columns[name] = np.fromiter((row[i] for row in rows), dtype=np.float32, count=len(rows))
+
+    path = archive_path(session_id, archive_dir)
+    os.makedirs(archive_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **columns)
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_session(session_id, archive_dir=ARCHIVE_DIR, delete=True):
+    """
+    Move one session from SQLite into its archive file. Returns the number of rows moved.
+    With `delete`, a session that still has unsynced rows is left alone (0 rows moved):
+    deleting them would drop their pending sync_queue entries.
+    """
+    if delete:
+        unsynced = count_unsynced(session_id)
+        if unsynced:
+            print(f"⚠️ {session_id}: {unsynced} rows not synced yet, not archived")
+            return 0
+    rows = get_session_rows(session_id)
+    if not rows:
+        return 0
+    write_session_archive(session_id, rows, archive_dir)
+    if delete and delete_session(session_id) is None:
+        print(f"⚠️ {session_id}: new unsynced rows arrived, kept in SQLite")
+        return 0
+    metrics.forget_session(session_id)
+    return len(rows)
+
+
+def compact_finished_sessions(idle_seconds=24 * 3600, archive_dir=ARCHIVE_DIR):
+    """
+    Archive every fully synced session with no new result for `idle_seconds`.
+    Hot sessions stay in SQLite; the history API reads archived ones from disk.
+    """
+    moved = {}
+    for session_id in list_finished_sessions(time.time() - idle_seconds):
+        moved[session_id] = archive_session(session_id, archive_dir)
+        print(f"Archived {session_id}: {moved[session_id]} rows -> {archive_path(session_id, archive_dir)}")
+    return moved
+
+
+def load_session_archive(session_id, columns=None, archive_dir=ARCHIVE_DIR):
+    """
+    Read an archived session. Only the requested columns are decompressed; besides
+    the metric names, "ts_epoch" (float64) and "channel" (names, None for
+    single-channel rows) are available. Returns None if the session is not archived.
+    """
+    path = archive_path(session_id, archive_dir)
+    if not os.path.exists(path):
+        return None
+    if columns is None:
+        columns = SESSION_COLUMNS
+
+    out = {}
+    with np.load(path) as archive:
+        for name in columns:
+            if name == "ts_epoch":
+                out[name] = archive["ts_base"] + archive["ts_offset"].astype(np.float64)
+            elif name == "channel":
+                names = archive["channels"]
+                out[name] = np.array([str(names[c]) if c >= 0 else None for c in archive["channel"]], dtype=object)
+            else:
+                out[name] = archive[name]
+    return out
+
+
+def list_archived_sessions(archive_dir=ARCHIVE_DIR):
+    if not os.path.isdir(archive_dir):
+        return []
+    sessions = []
+    for name in sorted(os.listdir(archive_dir)):
+        if name.endswith(".npz"):
+            with np.load(os.path.join(archive_dir, name)) as archive:
+                sessions.append(str(archive["session_id"]))
+    return sessions
+
+
+def iter_archived_metric(metric, archive_dir=ARCHIVE_DIR):
+    """Yield (session_id, ts_epoch, values) for one metric across all archived sessions."""
+    for session_id in list_archived_sessions(archive_dir):
+        data = load_session_archive(session_id, ("ts_epoch", metric), archive_dir)
+        yield session_id, data["ts_epoch"], data[metric]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move finished sessions from SQLite into .npz archives.")
+    parser.add_argument("--idle-hours", type=float, default=24.0)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+    init_db()
+    moved = compact_finished_sessions(args.idle_hours * 3600, args.archive_dir)
+    print(f"✅ Archived {len(moved)} sessions, {sum(moved.values())} rows.")
+
+
+if __name__ == "__main__":
+    main()
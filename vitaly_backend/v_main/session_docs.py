@@ -0,0 +1,93 @@
+# session_docs.py
+
+import numpy as np
+
+# processed_results column -> RESULT_KEYS metric
+RECORD_FIELDS = (
+    ("muscle_fatigue", "fatigue_index"),
+    ("muscle_activation", "activation"),
+    ("force", "force"),
+    ("velocity", "velocity"),
+    ("power_output", "power_output"),
+    ("firing_rate", "firing_rate"),
+    ("intensity", "intensity"),
+    ("work_ratio", "work_ratio"),
+)
+
+
+def determine_status(activation_val: float) -> str:
+    if activation_val < 0.4:
+        return "Warm-up"
+    elif activation_val < 0.8:
+        return "Plateau"
+    else:
+        return "Over-activation"
+
+
+def channel_records(session_id, timestamp, channels, window):
+    """
+    Local processed_results rows for one window: `window` maps each RESULT_KEYS
+    metric to a per-channel sequence, `channels` names those channels.
+    """
+    records = [{'session_id': session_id, 'timestamp': timestamp, 'channel': name} for name in channels]
+    for column, key in RECORD_FIELDS:
+        for record, value in zip(records, np.asarray(window[key]).tolist()):
+            record[column] = value
+    return records
+
+
+def result_columns(results):
+    """
+    processed_results columns for a whole (channels, windows) result dict, window
+    by window and channel by channel, as plain lists for insert_result_columns.
+    """
+    return {column: np.asarray(results[key]).T.ravel().tolist() for column, key in RECORD_FIELDS}
+
+
+def _group_mean(values, idx):
+    """Mean of values[idx], or None (stored as null) when the group has no channel."""
+    return float(np.mean(values[idx])) if len(idx) else None
+
+
+def channel_docs(timestamp, channels, window):
+    """
+    Dashboard documents for one multi-channel window, keyed by the session
+    subcollection they go to. Quadriceps = *_VL channels, hamstring = *_BF channels;
+    a group without channels in this session gets None instead of a summary.
+    """
+    activation = np.asarray(window["activation"], dtype=float)
+    fatigue = np.asarray(window["fatigue_index"], dtype=float)
+    force = np.asarray(window["force"], dtype=float)
+    quad_idx = [i for i, name in enumerate(channels) if name.endswith("_VL")]
+    ham_idx = [i for i, name in enumerate(channels) if name.endswith("_BF")]
+
+    average_activation = float(np.mean(activation))
+    doc_activation = {
+        "time": timestamp,
+        "Quadriceps_activation": _group_mean(activation, quad_idx),
+        "Hamstring_activation": _group_mean(activation, ham_idx),
+        "Average_activation": average_activation,
+        "status": determine_status(average_activation),
+    }
+    doc_fatigue = {
+        "time": timestamp,
+        "Quadriceps_fatigue_level": _group_mean(fatigue, quad_idx),
+        "Hamstring_fatigue_level": _group_mean(fatigue, ham_idx),
+    }
+    doc_force = {
+        "time": timestamp,
+        "Quadracept_force_now": _group_mean(force, quad_idx),
+        "Hamstring_force_now": _group_mean(force, ham_idx),
+        "Current_velocity": float(np.mean(window["velocity"])),
+        "power_output": float(np.sum(window["power_output"])),
+    }
+    for ch, name in enumerate(channels):
+        doc_activation[f"{name}_activation"] = float(activation[ch])
+        doc_fatigue[f"{name}_fatigue_level"] = float(fatigue[ch])
+        doc_force[f"{name}_force"] = float(force[ch])
+
+    return {
+        "muscle_activation": doc_activation,
+        "muscle_fatigue": doc_fatigue,
+        "force_velocity": doc_force,
+    }
@@ -0,0 +1,201 @@
+# session_report.py
+
+import argparse
+import base64
+import html
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from alignment import fallback_warning
+from batch_runner import find_recordings, process_recording
+from downsampling import minmax_downsample
+from my_signal_processing_module import compute_window_params, load_emg_data
+from result_cache import CACHE_DIR, ResultCache
+
+REPORT_FORMATS = ("png", "html")
+DEFAULT_MAX_POINTS = 2000
+
+# (RESULT_KEYS metric, axis label), in report order
+REPORT_METRICS = (
+    ("activation", "Muscle Activation"),
+    ("intensity", "Muscle Intensity"),
+    ("firing_rate", "Muscle Firing Rate"),
+    ("fatigue_index", "Muscle Fatigue Index"),
+    ("force", "Muscle Force"),
+    ("power_output", "Power Output"),
+    ("work_ratio", "Muscle Work Ratio"),
+    ("velocity", "Velocity"),
+)
+
+
+def _new_figure(**kwargs):
+    """
+    A matplotlib Figure on the Agg canvas. Uses the object API instead of pyplot, so
+    no GUI backend is loaded, nothing is shown and the figure is freed with the object.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def render_session_figure(session_id, results, channels, window_times, emg=None, fs_emg=2000,
+                          max_points=DEFAULT_MAX_POINTS, dpi=100):
+    """
+    One figure for a session: the raw EMG (if given) and every metric, one axis per
+    row with one line per channel. Every trace is min/max-decimated to at most
+    `max_points` points, so a multi-million-sample session costs the same to draw
+    as a short one.
+    """
+    rows = len(REPORT_METRICS) + (emg is not None)
+    fig = _new_figure(figsize=(14, 2.2 * rows), dpi=dpi)
+    axes = fig.subplots(rows, 1, squeeze=False, sharex=True)[:, 0]
+    # fixed margins: tight_layout would draw the whole figure once more just to measure it
+    fig.subplots_adjust(left=0.07, right=0.98, bottom=0.3 / rows, top=1 - 0.5 / rows, hspace=0.15)
+    fig.suptitle(f"Session {session_id}", fontsize=16)
+    labels = [name or f"Channel {ch + 1}" for ch, name in enumerate(channels)]
+
+    row = 0
+    if emg is not None:
+        t = np.arange(emg.shape[0]) / fs_emg
+        for ch, label in enumerate(labels[:emg.shape[1]]):
+            x, y = minmax_downsample(t, emg[:, ch], max_points)
+            axes[row].plot(x, y, linewidth=0.6, label=label)
+        axes[row].set_ylabel("Raw EMG")
+        row += 1
+    for key, name in REPORT_METRICS:
+        series = np.atleast_2d(results[key])
+        for ch, label in enumerate(labels):
+            x, y = minmax_downsample(window_times, series[ch], max_points)
+            axes[row].plot(x, y, linewidth=1.2, label=label)
+        axes[row].set_ylabel(name)
+        row += 1
+    for ax in axes:
+        ax.grid(True)
+    axes[0].legend(loc="upper right", fontsize="small", ncol=len(labels))
+    axes[-1].set_xlabel("Time (s)")
+    return fig
+
+
+def _summary_rows(results, channels):
+    rows = []
+    for key, name in REPORT_METRICS:
+        series = np.atleast_2d(results[key])
+        for ch, channel in enumerate(channels):
+            values = np.asarray(series[ch], dtype=float)
+            if values.size:
+                rows.append((name, channel or "-", values.mean(), values.max(), values[-1]))
+    return rows
+
+
+def write_report(fig, path, fmt, session_id, results, channels):
+    """Save `fig` as a PNG, or as a self-contained HTML page (embedded PNG + summary table)."""
+    if fmt == "png":
+        fig.savefig(path, format="png")
+        return path
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    image = base64.b64encode(buf.getvalue()).decode("ascii")
+    table = "\n".join(
+        f"<tr><td>{html.escape(name)}</td><td>{html.escape(channel)}</td>"
+        f"<td>{mean:.4g}</td><td>{peak:.4g}</td><td>{last:.4g}</td></tr>"
+        for name, channel, mean, peak, last in _summary_rows(results, channels)
+    )
+    title = html.escape(f"Session {session_id}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{title}</title></head><body>\n"
+            f"<h1>{title}</h1>\n<img alt=\"{title}\" src=\"data:image/png;base64,{image}\">\n"
+            "<table border=\"1\" cellspacing=\"0\" cellpadding=\"4\">\n"
+            "<tr><th>Metric</th><th>Channel</th><th>Mean</th><th>Max</th><th>Final</th></tr>\n"
+            f"{table}\n</table>\n</body></html>\n"
+        )
+    return path
+
+
+def session_report(session_id, emg_file, acc_file, out_dir, fmt="png", fs_emg=2000, fs_acc=200,
+                   overlap_ratio=0.2, all_channels=True, include_raw=True, max_points=DEFAULT_MAX_POINTS,
+                   result_cache=None):
+    """
+    Process one recording (through `result_cache`, if given) and write its report to
+    out_dir/<session_id>.<fmt>. Runs inside a worker process; returns a small summary.
+    """
+    t0 = time.perf_counter()
+    output = process_recording(session_id, emg_file, acc_file, fs_emg, fs_acc, overlap_ratio,
+                               all_channels=all_channels, result_cache=result_cache)
+    results = output["results"]
+    if results is None:
+        return {"session_id": session_id, "path": None, "seconds": time.perf_counter() - t0}
+
+    emg = load_emg_data(emg_file)  # memory-mapped sidecar, only touched while decimating
+    window_size, step_size, _, _ = compute_window_params(emg.shape[0], fs_emg, overlap_ratio)
+    n_windows = np.atleast_2d(results["activation"]).shape[1]
+    window_times = (np.arange(n_windows) * step_size + window_size / 2) / fs_emg
+    raw = emg[:, :len(output["channels"])] if include_raw else None
+
+    fig = render_session_figure(session_id, results, output["channels"], window_times, raw, fs_emg, max_points)
+    os.makedirs(out_dir, exist_ok=True)
+    path = write_report(fig, os.path.join(out_dir, f"{session_id}.{fmt}"), fmt, session_id,
+                        results, output["channels"])
+    return {"session_id": session_id, "path": path, "cached": output.get("cached", False),
+            "alignment": output.get("alignment"), "seconds": time.perf_counter() - t0}
+
+
+def build_reports(emg_dir, acc_dir, out_dir, fmt="png", workers=None, **kwargs):
+    """One report per recording in emg_dir/acc_dir, rendered on a process pool."""
+    recordings = find_recordings(emg_dir, acc_dir)
+    if not recordings:
+        print(f"❌ No .txt in {emg_dir}, skip.")
+        return []
+    workers = workers or os.cpu_count() or 1
+    t_start = time.perf_counter()
+    done = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(session_report, session_id, emg_file, acc_file, out_dir, fmt, **kwargs): (emg_file, acc_file)
+            for session_id, emg_file, acc_file in recordings
+        }
+        for future in as_completed(futures):
+            summary = future.result()
+            done.append(summary)
+            warning = fallback_warning(summary.get("alignment"), *futures[future])
+            if warning:
+                print(warning)
+            if summary["path"] is None:
+                print(f"❌ {summary['session_id']}: empty recording, no report")
+            else:
+                print(f"[{len(done)}/{len(recordings)}] {summary['session_id']}: "
+                      f"{summary['path']} in {summary['seconds']:.2f}s")
+    total = time.perf_counter() - t_start
+    print(f"✅ Reports done: {len(recordings)} sessions with {workers} workers in {total:.2f}s")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render headless per-session reports (PNG or HTML).")
+    parser.add_argument("--emg-dir", default="../data/V4/EMG")
+    parser.add_argument("--acc-dir", default="../data/V4/Trajectories")
+    parser.add_argument("--out-dir", default="reports")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="png")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-points", type=int, default=DEFAULT_MAX_POINTS,
+                        help="points per trace after min/max decimation")
+    parser.add_argument("--first-channel", action="store_true", help="report only the first EMG channel")
+    parser.add_argument("--no-raw", action="store_true", help="leave out the raw EMG trace")
+    parser.add_argument("--result-cache", default=CACHE_DIR,
+                        help="directory of cached results for unchanged recordings ('' to disable)")
+    args = parser.parse_args()
+
+    build_reports(args.emg_dir, args.acc_dir, args.out_dir, args.format, workers=args.workers,
+                  all_channels=not args.first_channel, include_raw=not args.no_raw, max_points=args.max_points,
+                  result_cache=ResultCache(args.result_cache) if args.result_cache else None)
+
+
+if __name__ == "__main__":
+    main()
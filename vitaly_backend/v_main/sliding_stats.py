@@ -0,0 +1,139 @@
+# sliding_stats.py
+
+import numpy as np
+
+# Windows whose estimated rounding error exceeds this (relative) are recomputed exactly.
+TOLERANCE = 1e-7
+_EPS = np.finfo(float).eps
+_RECOMPUTE_BLOCK = 256
+
+
+class SlidingWindowStats:
+    """
+    O(1) per-window statistics over a whole recording.
+
+    Prefix sums of x², |x| and sign changes |diff(sign(x))| are built once along the
+    last axis (O(n)); afterwards sum of squares, RMS, IEMG and the zero-crossing count
+    of any window [start, start + window_size) are two lookups. `starts` may be an
+    array, so all windows of a recording are answered with a few vector ops.
+    Prefix sums are always accumulated in float64; a float32 signal is kept as is
+    and only widened term by term.
+
+    A difference of two large prefix sums loses precision when the window holds much
+    less energy than what came before it (e.g. quiet EMG after a huge artifact).
+    Windows whose error bound exceeds TOLERANCE are recomputed directly from the
+    signal, so results stay within TOLERANCE of the per-window reference.
+    """
+
+    def __init__(self, signal):
+        signal = np.asarray(signal)
+        if signal.dtype != np.float32:
+            signal = signal.astype(np.float64, copy=False)
+        self.n_samples = signal.shape[-1]
+        zero = np.zeros(signal.shape[:-1] + (1,))
+        self._x = signal
+        self._sq = np.concatenate((zero, np.cumsum(np.square(signal, dtype=np.float64), axis=-1)), axis=-1)
+        self._abs = np.concatenate((zero, np.cumsum(np.abs(signal), axis=-1, dtype=np.float64)), axis=-1)
+        changes = np.abs(np.diff(np.sign(signal), axis=-1))
+        self._zc = np.concatenate((zero, np.cumsum(changes, axis=-1, dtype=np.float64)), axis=-1)
+
+    def _range(self, prefix, starts, length):
+        starts = np.asarray(starts)
+        return prefix[..., starts + length] - prefix[..., starts]
+
+    def _checked_range(self, prefix, starts, length, transform):
+        """_range for a non-negative cumulative sum, with ill-conditioned windows redone exactly."""
+        starts = np.asarray(starts)
+        ends = starts + length
+        out = prefix[..., ends] - prefix[..., starts]
+        bound = 4 * _EPS * np.sqrt(np.maximum(ends, 1)) * prefix[..., ends]
+        bad = np.nonzero(bound > TOLERANCE * out)
+        if bad[0].size:
+            offsets = np.arange(length)
+            for lo in range(0, bad[0].size, _RECOMPUTE_BLOCK):
+                idx = tuple(i[lo:lo + _RECOMPUTE_BLOCK] for i in bad)
+                lead = tuple(i[:, None] for i in idx[:-1])
+                segments = self._x[lead + (starts[idx[-1]][:, None] + offsets,)].astype(np.float64)
+                out[idx] = transform(segments).sum(axis=-1)
+        return out
+
+    def sum_sq(self, starts, window_size):
+        return self._checked_range(self._sq, starts, window_size, np.square)
+
+    def rms(self, starts, window_size):
+        return np.sqrt(np.maximum(self.sum_sq(starts, window_size), 0.0) / window_size)
+
+    def iemg(self, starts, window_size):
+        return self._checked_range(self._abs, starts, window_size, np.abs)
+
+    def zero_crossings(self, starts, window_size):
+        """Sum of |diff(sign(x))| inside each window (2 per sign flip, 1 per touch of 0)."""
+        return self._range(self._zc, starts, window_size - 1)
+
+    def firing_rate(self, starts, window_size):
+        return self.zero_crossings(starts, window_size) / (2 * window_size)
+
+
+class RunningWindowStats:
+    """
+    Streaming counterpart of SlidingWindowStats for a ring buffer of `window_size`
+    samples per channel.
+
+    write() is called with the samples that overwrite ring positions `idx`, before
+    the ring itself is updated, and adjusts the running sums by what enters minus
+    what leaves. Queries are O(1). Sums are recomputed exactly from the ring every
+    `resync_every` windows, and earlier when the accumulated rounding error could
+    exceed TOLERANCE (e.g. once a large artifact has left the ring).
+    """
+
+    def __init__(self, n_channels, window_size, resync_every=256):
+        self.window_size = window_size
+        self.resync_every = resync_every
+        self.sum_sq = np.zeros(n_channels)
+        self.sum_abs = np.zeros(n_channels)
+        self.changes_total = np.zeros(n_channels)
+        self._changes = np.zeros((n_channels, window_size))
+        self._last_sign = np.zeros(n_channels)
+        self._queries = 0
+        self._updates = 0
+        self._scale_sq = np.zeros(n_channels)
+        self._scale_abs = np.zeros(n_channels)
+
+    def skip(self, last_sample):
+        """Samples were dropped without entering the ring; remember the last one's sign."""
+        self._last_sign = np.sign(last_sample)
+
+    def write(self, ring, idx, new):
+        old = ring[:, idx]
+        new_sign = np.sign(new)
+        prev_sign = np.concatenate((self._last_sign[:, None], new_sign[:, :-1]), axis=1)
+        new_changes = np.abs(new_sign - prev_sign)
+
+        self.sum_sq += (np.einsum("ij,ij->i", new, new, dtype=np.float64)
+                        - np.einsum("ij,ij->i", old, old, dtype=np.float64))
+        self.sum_abs += np.abs(new).sum(axis=1, dtype=np.float64) - np.abs(old).sum(axis=1, dtype=np.float64)
+        self.changes_total += new_changes.sum(axis=1) - self._changes[:, idx].sum(axis=1)
+        self._changes[:, idx] = new_changes
+        self._last_sign = new_sign[:, -1]
+        self._updates += new.shape[1]
+        np.maximum(self._scale_sq, self.sum_sq, out=self._scale_sq)
+        np.maximum(self._scale_abs, self.sum_abs, out=self._scale_abs)
+
+    def window(self, ring, oldest_pos):
+        """(sum_sq, iemg, zero_crossings) of the full ring whose oldest sample is at oldest_pos."""
+        self._queries += 1
+        drift = 4 * _EPS * self._updates
+        if (
+            self._queries % self.resync_every == 0
+            or np.any(drift * self._scale_sq > TOLERANCE * self.sum_sq)
+            or np.any(drift * self._scale_abs > TOLERANCE * self.sum_abs)
+        ):
+            self.sum_sq = np.einsum("ij,ij->i", ring, ring, dtype=np.float64)
+            self.sum_abs = np.abs(ring).sum(axis=1, dtype=np.float64)
+            self.changes_total = self._changes.sum(axis=1)
+            self._scale_sq = self.sum_sq.copy()
+            self._scale_abs = self.sum_abs.copy()
+            self._updates = 0
+        # the oldest sample's change is relative to a sample outside the window
+        zero_crossings = self.changes_total - self._changes[:, oldest_pos]
+        return np.maximum(self.sum_sq, 0.0), self.sum_abs, zero_crossings
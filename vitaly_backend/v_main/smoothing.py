@@ -0,0 +1,117 @@
+# smoothing.py
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from sliding_stats import TOLERANCE
+
+SMOOTHING_MODES = ("causal", "ema", "centered")
+
+
+class CausalMovingAverage:
+    """
+    Trailing mean over the last `window_size` values (fewer at the start), updated
+    in O(1) per value from a ring buffer and a running sum. The sum is recomputed
+    from the ring once per lap, and right away when a much larger value has just
+    left the window, so a single huge value cannot leave rounding residue in the
+    windows after it. Values may be scalars or per-channel arrays.
+    """
+
+    def __init__(self, window_size=10):
+        if window_size < 1:
+            raise ValueError("window_size must be >= 1")
+        self.window_size = window_size
+        self._ring = None
+        self._total = None
+        self._scale = None
+        self._pos = 0
+        self._count = 0
+
+    def update(self, value):
+        value = np.asarray(value, dtype=float)
+        if self._ring is None:
+            self._ring = np.zeros((self.window_size,) + value.shape)
+            self._total = np.zeros(value.shape)
+            self._scale = np.zeros(value.shape)
+        self._total += value - self._ring[self._pos]
+        self._ring[self._pos] = value
+        self._pos = (self._pos + 1) % self.window_size
+        np.maximum(self._scale, np.abs(self._total), out=self._scale)
+        drift = 4 * np.finfo(float).eps * self.window_size * self._scale
+        if self._pos == 0 or np.any(drift > TOLERANCE * np.abs(self._total)):
+            # in place: a 0-d sum would come back as a numpy scalar, which out= cannot take
+            self._ring.sum(axis=0, out=self._total)
+            np.abs(self._total, out=self._scale)
+        self._count = min(self._count + 1, self.window_size)
+        return self._total / self._count
+
+
+class ExponentialMovingAverage:
+    """
+    y[0] = x[0], y[i] = alpha * x[i] + (1 - alpha) * y[i-1]. By default alpha is
+    2 / (span + 1), the EMA with the same centre of mass as a `span`-point mean.
+    """
+
+    def __init__(self, span=10, alpha=None):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1)
+        if not 0 < self.alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self._value = None
+
+    def update(self, value):
+        value = np.asarray(value, dtype=float)
+        if self._value is None:
+            self._value = value.copy()
+        else:
+            self._value = self._value + self.alpha * (value - self._value)
+        return self._value
+
+
+def make_smoother(mode="causal", window_size=10, alpha=None):
+    """Incremental smoother for one metric stream ("centered" needs the whole series)."""
+    if mode == "causal":
+        return CausalMovingAverage(window_size)
+    if mode == "ema":
+        return ExponentialMovingAverage(window_size, alpha)
+    if mode == "centered":
+        raise ValueError("centered smoothing needs the finished series; use 'causal' or 'ema'")
+    raise ValueError(f"smoothing must be one of {', '.join(SMOOTHING_MODES)}")
+
+
+def centered_moving_average(data, window_size=10):
+    """The original filter: np.convolve(mode='same'), zero-padded at both ends."""
+    if len(data) == 0 or isinstance(data[0], np.ndarray):
+        return np.array([])
+    return np.convolve(data, np.ones(window_size) / window_size, mode='same')
+
+
+def smooth_series(data, mode="causal", window_size=10, alpha=None):
+    """
+    Smooth a finished 1-D or (channels, windows) series along its last axis.
+    "causal" and "ema" give exactly what the incremental smoothers emit window by
+    window; "centered" is the original zero-padded filter, row by row.
+    """
+    data = np.asarray(data, dtype=float)
+    if mode == "centered":
+        if data.ndim == 1:
+            return centered_moving_average(data, window_size)
+        if not data.shape[-1]:
+            return data
+        return np.stack([centered_moving_average(row, window_size) for row in data])
+    if mode not in SMOOTHING_MODES:
+        raise ValueError(f"smoothing must be one of {', '.join(SMOOTHING_MODES)}")
+    if data.shape[-1] == 0:
+        return data.copy()
+
+    if mode == "ema":
+        from scipy.signal import lfilter
+
+        alpha = alpha if alpha is not None else 2.0 / (window_size + 1)
+        zi = ((1 - alpha) * data[..., :1])
+        out, _ = lfilter([alpha], [1.0, alpha - 1.0], data, axis=-1, zi=zi)
+        return out
+
+    n = data.shape[-1]
+    padded = np.concatenate((np.zeros(data.shape[:-1] + (window_size - 1,)), data), axis=-1)
+    sums = sliding_window_view(padded, window_size, axis=-1).sum(axis=-1)
+    return sums / np.minimum(np.arange(1, n + 1), window_size)
@@ -0,0 +1,104 @@
+# spectral.py
+
+import threading
+from functools import lru_cache
+
+import numpy as np
+import scipy.fft
+
+
+class WelchPlan:
+    """
+    Precomputed state for the per-window mean-frequency (MNF) estimate.
+
+    For a fixed (window_size, nfft, fs) this holds the Hamming taper, the one-sided
+    density weights and the frequency axis, plus a zero-padded input buffer (one per
+    thread and dtype) that is reused across calls. float32 segments are transformed in
+    single precision, float64 otherwise. The result equals a single-segment
+    scipy.signal.welch (constant detrend, Hamming window, nfft points) followed by
+    sum(f * P) / sum(P).
+    FFTs go through scipy.fft, which caches its plans per transform size.
+    """
+
+    def __init__(self, window_size, nfft, fs, workers=None):
+        if nfft < window_size:
+            raise ValueError("nfft must be >= window_size")
+        self.window_size = window_size
+        self.nfft = nfft
+        self.fs = fs
+        self.workers = workers
+
+        self.taper = np.hamming(window_size)  # = scipy.signal.windows.hamming, without importing scipy.signal
+        self.freqs = np.fft.rfftfreq(nfft, 1.0 / fs)
+        weights = np.full(len(self.freqs), 2.0)
+        weights[0] = 1.0
+        if nfft % 2 == 0:
+            weights[-1] = 1.0
+        self.weights = weights
+        self.weighted_freqs = weights * self.freqs
+        self._local = threading.local()
+
+    def _input_buffer(self, n_rows, dtype):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buf = buffers.get(dtype)
+        if buf is None or buf.shape[0] < n_rows:
+            buf = buffers[dtype] = np.zeros((n_rows, self.nfft), dtype=dtype)
+        return buf[:n_rows]
+
+    def mnf(self, segments):
+        """MNF of each window along the last axis of a (..., window_size) array."""
+        segments = np.asarray(segments)
+        dtype = np.float32 if segments.dtype == np.float32 else np.float64
+        segments = segments.astype(dtype, copy=False)
+        lead = segments.shape[:-1]
+        flat = segments.reshape(-1, self.window_size)
+
+        buf = self._input_buffer(flat.shape[0], dtype)
+        mean = flat.mean(axis=-1, keepdims=True, dtype=np.float64)
+        np.subtract(flat, mean, out=buf[:, :self.window_size], casting="same_kind")
+        buf[:, :self.window_size] *= self.taper
+        spectrum = scipy.fft.rfft(buf, axis=-1, workers=self.workers)
+        power = spectrum.real ** 2
+        power += spectrum.imag ** 2
+        weighted_freqs = self.weighted_freqs.astype(dtype, copy=False)
+        mnf = (power @ weighted_freqs) / (power @ self.weights.astype(dtype, copy=False))
+        return mnf.astype(np.float64, copy=False).reshape(lead)
+
+
+@lru_cache(maxsize=32)
+def get_welch_plan(window_size, nfft, fs):
+    """Shared WelchPlan per (window_size, nfft, fs)."""
+    return WelchPlan(window_size, nfft, fs)
+
+
+class MnfTracker:
+    """
+    Incremental fatigue state for a stream of per-window MNF values (per channel).
+
+    The first window fixes the initial MNF; each update returns the fatigue index of
+    the new window, (initial - current) / max(initial - threshold, eps), and keeps a
+    running mean and the latest value without storing the history.
+    """
+
+    def __init__(self, fatigue_threshold=0):
+        self.fatigue_threshold = fatigue_threshold
+        self.initial = None
+        self.last = None
+        self.mean = None
+        self.count = 0
+
+    def update(self, mnf):
+        mnf = np.asarray(mnf, dtype=float)
+        if self.initial is None:
+            self.initial = mnf.copy()
+            self.mean = np.zeros_like(mnf)
+        self.count += 1
+        self.mean += (mnf - self.mean) / self.count
+        self.last = mnf
+        return self.fatigue_index(mnf)
+
+    def fatigue_index(self, mnf):
+        eps = np.finfo(float).eps
+        return (self.initial - mnf) / np.maximum(self.initial - self.fatigue_threshold, eps)
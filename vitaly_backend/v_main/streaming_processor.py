@@ -0,0 +1,183 @@
+# streaming_processor.py
+
+import numpy as np
+
+from my_signal_processing_module import RESULT_KEYS
+from sliding_stats import RunningWindowStats
+from smoothing import make_smoother
+from spectral import MnfTracker, get_welch_plan
+
+
+class StreamingEmgProcessor:
+    """
+    Incremental version of process_emg_acc_signals for live sensor input.
+
+    Samples are pushed in chunks as they arrive. Each channel keeps a ring buffer of
+    exactly `window_size` samples, so memory stays constant, and a window's metrics are
+    emitted by the push() call that completes it, i.e. at most one step after its
+    last sample arrives.
+
+    Accelerometer samples share the EMG sample index, as in process_emg_acc_signals:
+    acc_chunk[i] belongs to the same instant as emg_chunk[i]. An acc chunk may be
+    shorter than its EMG chunk (or missing), and a NaN row marks an EMG index with
+    no acc sample (acc sampled slower than EMG, see alignment.acc_on_emg_grid); only
+    the acc samples actually received inside a window contribute to its velocity.
+
+    Sum of squares, IEMG and sign changes are kept as running sums updated by the
+    samples entering and leaving the ring (RunningWindowStats), so emitting a window
+    does not rescan it for those metrics. With `dtype=np.float32` the ring buffers
+    and FFT input are float32; the running sums stay float64.
+
+    Differences to the batch reference, which sees the whole recording up front:
+    - activation is normalised by `max_value` if given (e.g. an MVC calibration),
+      otherwise by the running max of |EMG| seen so far;
+    - "smoothed" values come from an O(1) incremental smoother (`smoothing` =
+      "causal" trailing mean over `smooth_window` windows, or "ema"), available
+      as soon as the window closes; applied to the batch raw series,
+      smoothing.smooth_series gives the same values.
+    The "raw" values match process_emg_acc_signals_batch(..., smooth_window=None).
+    """
+
+    def __init__(
+        self,
+        n_channels,
+        fs_emg,
+        fs_acc,
+        window_size,
+        step_size,
+        nfft_emg,
+        fatigue_threshold=0,
+        max_value=None,
+        smooth_window=10,
+        smoothing="causal",
+        dtype=np.float64
+    ):
+        self.n_channels = n_channels
+        self.fs_emg = fs_emg
+        self.fs_acc = fs_acc
+        self.window_size = window_size
+        self.step_size = step_size
+        self.nfft_emg = nfft_emg
+        self.fatigue_threshold = fatigue_threshold
+        self.fixed_max = max_value
+        self.dtype = np.dtype(dtype)
+
+        self._plan = get_welch_plan(window_size, nfft_emg, fs_emg)
+        self._mnf = MnfTracker(fatigue_threshold)
+        self._emg_buf = np.zeros((n_channels, window_size), dtype=dtype)
+        self._acc_buf = np.zeros((n_channels, window_size), dtype=dtype)
+        self._acc_valid = np.zeros(window_size, dtype=bool)
+        self._stats = RunningWindowStats(n_channels, window_size)
+        self._count = 0
+        self._next_end = window_size
+        self._window_index = 0
+
+        self.running_max = np.zeros(n_channels)
+        self._smoothers = {key: make_smoother(smoothing, smooth_window) for key in RESULT_KEYS}
+
+    @property
+    def initial_mnf(self):
+        return self._mnf.initial
+
+    def push(self, emg_chunk, acc_chunk=None):
+        """
+        Feed a (samples, channels) EMG chunk (1-D for a single channel) and the matching
+        accelerometer chunk. Returns the list of windows completed by this chunk.
+        """
+        emg_chunk = self._as_channels(emg_chunk)
+        acc_chunk = None if acc_chunk is None else self._as_channels(acc_chunk)
+        n_acc = 0 if acc_chunk is None else acc_chunk.shape[1]
+        if n_acc > emg_chunk.shape[1]:
+            raise ValueError("acc_chunk is longer than emg_chunk")
+
+        emitted = []
+        offset = 0
+        n = emg_chunk.shape[1]
+        while offset < n:
+            take = min(n - offset, self._next_end - self._count)
+            if take > 0:
+                self._write(emg_chunk, acc_chunk, n_acc, offset, take)
+                offset += take
+            if self._count == self._next_end:
+                emitted.append(self._emit_window())
+                self._next_end += self.step_size
+        return emitted
+
+    def _as_channels(self, chunk):
+        chunk = np.asarray(chunk, dtype=self.dtype)
+        if chunk.ndim == 1:
+            chunk = chunk[:, None]
+        if chunk.shape[1] != self.n_channels:
+            raise ValueError(f"expected {self.n_channels} channels, got {chunk.shape[1]}")
+        return chunk.T
+
+    def _write(self, emg_chunk, acc_chunk, n_acc, offset, take):
+        np.maximum(
+            self.running_max, np.abs(emg_chunk[:, offset:offset + take]).max(axis=1),
+            out=self.running_max
+        )
+        # With step_size > window_size only the last window_size samples can still matter.
+        skip = max(0, take - self.window_size)
+        if skip:
+            self._stats.skip(emg_chunk[:, offset + skip - 1])
+        self._count += skip
+        offset += skip
+        take -= skip
+
+        idx = (self._count + np.arange(take)) % self.window_size
+        new = emg_chunk[:, offset:offset + take]
+        self._stats.write(self._emg_buf, idx, new)
+        self._emg_buf[:, idx] = new
+        acc_take = max(0, min(take, n_acc - offset))
+        self._acc_valid[idx] = False
+        if acc_take:
+            acc_new = acc_chunk[:, offset:offset + acc_take]
+            self._acc_buf[:, idx[:acc_take]] = acc_new
+            self._acc_valid[idx[:acc_take]] = ~np.isnan(acc_new).any(axis=0)
+        self._count += take
+
+    def _ordered(self, buf):
+        pos = self._count % self.window_size
+        return np.concatenate((buf[..., pos:], buf[..., :pos]), axis=-1)
+
+    def _emit_window(self):
+        eps = np.finfo(float).eps
+        ws = self.window_size
+        segment = self._ordered(self._emg_buf)
+
+        sum_sq, iemg, zero_crossings = self._stats.window(self._emg_buf, self._count % ws)
+        rms = np.sqrt(sum_sq / ws)
+        firing_rate = zero_crossings / (2 * ws)
+
+        fatigue_index = self._mnf.update(self._plan.mnf(segment))
+
+        acc = self._ordered(self._acc_buf)[:, self._ordered(self._acc_valid)]
+        if acc.shape[1] > 0:
+            velocity = np.mean(np.cumsum(acc, axis=1, dtype=np.float64), axis=1) / self.fs_acc
+            power_output = rms * velocity
+        else:
+            velocity = np.zeros(self.n_channels)
+            power_output = np.zeros(self.n_channels)
+        work_ratio = np.where(power_output != 0, iemg / np.maximum(power_output, eps), 0.0)
+
+        max_value = self.running_max if self.fixed_max is None else self.fixed_max
+        raw = {
+            "activation": rms / (max_value + eps),
+            "intensity": rms,
+            "force": sum_sq / ws,
+            "fatigue_index": fatigue_index,
+            "firing_rate": firing_rate,
+            "power_output": power_output,
+            "work_ratio": work_ratio,
+            "velocity": velocity,
+        }
+        smoothed = {key: self._smoothers[key].update(raw[key]) for key in RESULT_KEYS}
+
+        result = {
+            "window": self._window_index,
+            "start_sample": self._count - ws,
+            "raw": raw,
+            "smoothed": smoothed,
+        }
+        self._window_index += 1
+        return result
@@ -0,0 +1,131 @@
+# sync_worker.py
+
+import argparse
+import threading
+import time
+
+from firestore_client import get_db
+from firestore_writer import FirestoreBatchWriter
+from instrumentation import metrics
+from local_storage import init_db, get_sync_page, ack_synced, sync_backlog
+
+
+def result_doc(row):
+    """Firestore document for one get_sync_page row."""
+    doc_data = {
+        "time": row[3],
+        "muscle_fatigue": row[4],
+        "muscle_activation": row[5],
+        "force": row[6],
+        "velocity": row[7],
+        "power_output": row[8]
+    }
+    if row[12] is not None:
+        doc_data["channel"] = row[12]
+    return doc_data
+
+
+class SyncWorker(threading.Thread):
+    """
+    Background uploader for processed_results.
+
+    Pending rows are read page by page from the sync_queue table in seq order, so a
+    sync never scans processed_results or loads the whole backlog at once. The worker
+    keeps an in-memory cursor (the highest seq handed to the writer); queue entries
+    are deleted, and rows marked synced, only when their Firestore batch commits.
+    After a failed batch the cursor is rewound so the remaining entries are retried.
+    """
+
+    def __init__(self, db, user_id, page_size=500, poll_interval=1.0, report_interval=10.0):
+        super().__init__(name="sync-worker", daemon=True)
+        self.db = db
+        self.user_id = user_id
+        self.page_size = page_size
+        self.poll_interval = poll_interval
+        self.report_interval = report_interval
+        self.cursor = 0
+        self.synced = 0
+        self._stop_event = threading.Event()
+        self._writer = FirestoreBatchWriter(db, on_committed=self._on_committed)
+
+    def _on_committed(self, seqs):
+        ack_synced(seqs)
+        self.synced += len(seqs)
+
+    def sync_once(self):
+        """Hand the next page to the writer. Returns the number of rows queued."""
+        with metrics.stage("sync") as span:
+            rows = get_sync_page(self.cursor, self.page_size)
+            user_ref = self.db.collection("users").document(self.user_id)
+            for row in rows:
+                seq, row_id, session_id = row[0], row[1], row[2]
+                sub_ref = user_ref.collection("sessions").document(session_id) \
+                                  .collection("processed_results")
+                self._writer.set(sub_ref.document(row_id), result_doc(row), tag=seq)
+            span.items = len(rows)
+        if rows:
+            self.cursor = rows[-1][0]
+        return len(rows)
+
+    def drain(self):
+        """Upload everything currently pending and wait for the commits."""
+        while self.sync_once():
+            pass
+        self._writer.wait()
+        self._rewind_after_failures()
+
+    def _rewind_after_failures(self):
+        # failed rows are still in sync_queue; start over from its head to resend them
+        if self._writer.take_failed():
+            self.cursor = 0
+
+    def backlog(self):
+        backlog = sync_backlog()
+        metrics.set_gauge("vitaly_sync_backlog", backlog)
+        return backlog
+
+    def run(self):
+        last_report = time.monotonic()
+        while not self._stop_event.is_set():
+            if self.sync_once() == 0:
+                self._writer.flush()
+                self._rewind_after_failures()
+                self._stop_event.wait(self.poll_interval)
+            if time.monotonic() - last_report >= self.report_interval:
+                print(f"[sync] synced={self.synced}, backlog={self.backlog()}")
+                last_report = time.monotonic()
+        self.drain()
+        self._writer.close()
+
+    def stop(self, timeout=None):
+        """Finish pending uploads and stop the thread."""
+        self._stop_event.set()
+        self.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuously sync local results to Firestore.")
+    parser.add_argument("--user", default="user_001")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    db = get_db()
+    if db is None:
+        print("❌ Firestore is disabled (VITALY_FIRESTORE=disabled), nothing to sync to.")
+        return
+
+    init_db()
+    worker = SyncWorker(db, args.user, page_size=args.page_size, poll_interval=args.poll_interval)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(1.0)
+    except KeyboardInterrupt:
+        print("Stopping sync worker, flushing pending uploads...")
+        worker.stop()
+    print(f"✅ Sync worker stopped. synced={worker.synced}, backlog={worker.backlog()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# conftest.py
+
+import os
+import sys
+
+import pytest
+
+# the backend modules import each other flat, as when run from v_main
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def local_db(tmp_path, monkeypatch):
+    """A fresh local_storage database in tmp_path."""
+    import local_storage
+
+    monkeypatch.setattr(local_storage, "DB_PATH", str(tmp_path / "local_data.db"))
+    local_storage.ensure_db()
+    yield local_storage
+    local_storage.close_connection()
@@ -0,0 +1,135 @@
+# test_alignment.py
+
+import numpy as np
+import pytest
+
+from alignment import (
+    AccTimeline,
+    acc_on_emg_grid,
+    align_by_rate,
+    align_windows,
+    clear_alignment_cache,
+    fallback_warning,
+    load_time_column,
+    sample_times,
+    session_alignment
+)
+
+FS_EMG, FS_ACC = 2000, 200
+WINDOW, STEP = 400, 300
+N_EMG = 6000
+RATIO = FS_EMG // FS_ACC
+
+
+def acc_times(first_emg_sample, n_acc):
+    """Acc sample times on the EMG grid, computed like sample_times so ties are exact."""
+    return (first_emg_sample + RATIO * np.arange(n_acc)) / FS_EMG
+
+
+def brute_force(emg_time, acc_time, n_windows):
+    """acc samples whose time falls in [time of the window's first sample, time of the sample after it)."""
+    edges = np.append(emg_time, 2 * emg_time[-1] - emg_time[-2])
+    windows = []
+    for i in range(n_windows):
+        t_start, t_end = edges[i * STEP], edges[i * STEP + WINDOW]
+        windows.append(np.flatnonzero((acc_time >= t_start) & (acc_time < t_end)))
+    return windows
+
+
+def assert_matches_brute_force(alignment, emg_time, acc_time):
+    assert len(alignment) == (N_EMG - WINDOW) // STEP + 1
+    for i, expected in enumerate(brute_force(emg_time, acc_time, len(alignment))):
+        assert alignment.lengths[i] == len(expected), i
+        if len(expected):
+            assert alignment.starts[i] == expected[0], i
+
+
+@pytest.mark.parametrize("acc_start, n_acc", [(1.23, 400), (0.0, 250), (-0.5, 700), (0.7, 100)])
+def test_windows_cover_the_acc_samples_in_their_time_span(acc_start, n_acc):
+    """Acc that starts late, starts early, or ends before the EMG."""
+    emg_time = sample_times(N_EMG, FS_EMG)
+    acc_time = acc_start + sample_times(n_acc, FS_ACC)
+    alignment = align_windows(emg_time, acc_time, WINDOW, STEP, 10**6)
+    assert alignment.source == "time"
+    assert_matches_brute_force(alignment, emg_time, acc_time)
+
+
+def test_late_and_short_acc_leave_windows_empty():
+    emg_time = sample_times(N_EMG, FS_EMG)
+    acc_time = acc_times(2000, 200)  # 1.0 s to 2.0 s of a 3 s recording
+    alignment = align_windows(emg_time, acc_time, WINDOW, STEP, 10**6)
+    window_start = np.arange(len(alignment)) * STEP / FS_EMG
+    window_end = window_start + WINDOW / FS_EMG
+    assert np.all(alignment.lengths[window_end <= 1.0] == 0)
+    assert np.all(alignment.lengths[window_start >= 2.0] == 0)
+    assert np.all(alignment.lengths[(window_start >= 1.0) & (window_end <= 2.0)] == WINDOW // RATIO)
+
+
+def test_grid_places_each_acc_sample_at_its_emg_row():
+    emg_time = sample_times(N_EMG, FS_EMG)
+    acc_time = acc_times(2000, 600)  # 1 s to 4 s, past the end of the EMG
+    acc = np.arange(600, dtype=float)[:, None] * [1.0, -1.0]
+    grid = acc_on_emg_grid(acc, emg_time, acc_time)
+
+    rows = np.flatnonzero(~np.isnan(grid[:, 0]))
+    assert rows[0] == 2000 and np.all(np.diff(rows) == RATIO)
+    assert len(rows) == 400  # samples after the last EMG sample are dropped
+    assert np.array_equal(grid[rows], acc[:400])
+
+
+def test_live_timeline_matches_the_recording_grid():
+    rng = np.random.default_rng(0)
+    acc = rng.normal(size=(500, 2))
+    acc_time = acc_times(700, len(acc))  # starts 0.35 s into the session
+    expected = acc_on_emg_grid(acc, sample_times(N_EMG, FS_EMG), acc_time)
+
+    timeline = AccTimeline(2, FS_EMG, FS_ACC)
+    chunks, acc_pos = [], 0
+    for emg_start in range(0, N_EMG, 100):
+        # acc arrives in uneven pieces, up to 20 ms ahead of the EMG frame it belongs to
+        due = np.searchsorted(acc_time, (emg_start + 100 + rng.integers(0, 40)) / FS_EMG)
+        piece = acc[acc_pos:max(due, acc_pos)]
+        chunks.append(timeline.place(emg_start, 100, emg_start / FS_EMG, piece, acc_time[min(acc_pos, 499)]))
+        acc_pos += len(piece)
+    placed = np.concatenate(chunks)
+    assert timeline.late == 0
+    assert np.array_equal(placed, expected, equal_nan=True)
+
+
+def write_table(path, times, n_columns):
+    with open(path, "w") as f:
+        f.write("\t".join(["Time"] + [f"c{i}" for i in range(n_columns)]) + "\n")
+        for t in times:
+            f.write("\t".join([f"{t:.6f}"] + ["0.5"] * n_columns) + "\n")
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def fresh_alignment_cache():
+    clear_alignment_cache()
+    yield
+    clear_alignment_cache()
+
+
+def test_session_alignment_uses_the_time_columns(tmp_path):
+    emg_file = write_table(tmp_path / "emg.txt", 10.0 + sample_times(N_EMG, FS_EMG), 1)
+    acc_file = write_table(tmp_path / "acc.txt", 10.8 + sample_times(300, FS_ACC), 1)
+    emg_time, acc_time = load_time_column(emg_file), load_time_column(acc_file)
+    alignment = session_alignment(emg_file, acc_file, N_EMG, 300, FS_EMG, FS_ACC, WINDOW, STEP, 10**6)
+    assert alignment.source == "time"
+    assert fallback_warning(alignment.source, emg_file, acc_file) is None
+    assert_matches_brute_force(alignment, emg_time, acc_time)
+
+
+def test_unusable_time_column_falls_back_to_the_rates(tmp_path, capsys):
+    emg_file = write_table(tmp_path / "emg.txt", np.zeros(N_EMG), 1)  # not increasing
+    acc_file = write_table(tmp_path / "acc.txt", 0.8 + sample_times(300, FS_ACC), 1)
+    alignment = session_alignment(emg_file, acc_file, N_EMG, 300, FS_EMG, FS_ACC, WINDOW, STEP, 10**6)
+    expected = align_by_rate(N_EMG, 300, FS_EMG, FS_ACC, WINDOW, STEP, 10**6)
+
+    assert alignment.source == "rate"
+    assert np.array_equal(alignment.starts, expected.starts)
+    assert np.array_equal(alignment.lengths, expected.lengths)
+    # the library reports the fallback; printing it is up to the caller
+    assert capsys.readouterr().out == ""
+    assert "sampling rate" in fallback_warning(alignment.source, emg_file, acc_file)
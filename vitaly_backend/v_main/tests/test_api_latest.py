@@ -0,0 +1,50 @@
+# test_api_latest.py
+
+import json
+from contextlib import contextmanager
+
+import api_server
+from local_storage import SESSION_COLUMNS
+
+
+def insert_row(local_db, session_id, force):
+    columns = {name: [0.0] for name in SESSION_COLUMNS[1:-1]}
+    columns["force"] = [force]
+    local_db.insert_result_columns(session_id, "2026-01-01T00:00:00", columns, ["L_BF"])
+
+
+class CommitDuringReadPool(api_server.ReadConnectionPool):
+    """Runs `on_read` right after the next read, before the snapshot is stored."""
+
+    on_read = None
+
+    @contextmanager
+    def connection(self):
+        with super().connection() as conn:
+            yield conn
+        if self.on_read is not None:
+            on_read, self.on_read = self.on_read, None
+            on_read()
+
+
+def latest_force(snapshot):
+    return json.loads(snapshot[1])["force"]
+
+
+def test_snapshot_read_before_a_commit_is_not_cached(local_db):
+    insert_row(local_db, "s1", 1.0)
+    pool = CommitDuringReadPool(local_db.DB_PATH)
+    cache = api_server.LatestSnapshotCache(pool)
+
+    def commit_and_poll():
+        # a writer commits and another request notices the new data_version
+        insert_row(local_db, "s1", 2.0)
+        assert not cache.is_fresh(None)
+
+    pool.on_read = commit_and_poll
+    assert latest_force(cache.refresh("s1")) == 1.0
+    assert not cache.is_fresh("s1")
+
+    assert latest_force(cache.refresh("s1")) == 2.0
+    assert cache.is_fresh("s1")
+    assert latest_force(cache.get("s1")) == 2.0
@@ -0,0 +1,82 @@
+# test_api_series.py
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api_server
+from local_storage import SESSION_COLUMNS
+from session_archive import archive_session
+
+CHANNELS = ["L_BF", "L_VL", "R_BF", "R_VL"]
+
+
+@pytest.fixture
+def client(local_db, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)  # session_archive/ goes here
+    monkeypatch.setattr(api_server, "read_pool", api_server.ReadConnectionPool(local_db.DB_PATH))
+    return TestClient(api_server.app)
+
+
+def insert_session(local_db, session_id, timestamps):
+    """One row per channel and timestamp; force = running row number."""
+    n_rows = len(timestamps) * len(CHANNELS)
+    columns = {name: [0.0] * n_rows for name in SESSION_COLUMNS[1:-1]}
+    columns["force"] = [float(i) for i in range(n_rows)]
+    rows_ts = [ts for ts in timestamps for _ in CHANNELS]
+    row_ids = local_db.insert_result_columns(session_id, rows_ts, columns, CHANNELS * len(timestamps))
+    local_db.mark_synced_many(row_ids)
+    return n_rows
+
+
+def fetch_all(client, session_id, **params):
+    pages, cursor = [], None
+    while True:
+        query = dict(params, metric="force", method="minmax", max_points=10000)
+        if cursor:
+            query["cursor"] = cursor
+        body = client.get(f"/api/sessions/{session_id}/series", params=query).json()
+        pages.append(body)
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+        assert len(pages) < 100, "pagination does not advance"
+
+
+def page_values(pages):
+    return [y for page in pages for series in page["series"] for _, y in series["points"]]
+
+
+def test_pages_through_rows_sharing_one_timestamp(client, local_db):
+    n_rows = insert_session(local_db, "s1", ["2026-01-01T00:00:00"] * 5)
+    pages = fetch_all(client, "s1", limit=3)
+    assert len(pages) == -(-n_rows // 3)
+    assert sorted(page_values(pages)) == [float(i) for i in range(n_rows)]
+
+
+def test_channel_filter_and_grouping(client, local_db):
+    timestamps = [f"2026-01-01T00:00:{i:02d}" for i in range(6)]
+    insert_session(local_db, "s2", timestamps)
+
+    body = fetch_all(client, "s2")[0]
+    assert [series["channel"] for series in body["series"]] == CHANNELS
+    assert all(series["count"] == len(timestamps) for series in body["series"])
+
+    body = fetch_all(client, "s2", channel="R_BF")[0]
+    assert [series["channel"] for series in body["series"]] == ["R_BF"]
+    assert [y for _, y in body["series"][0]["points"]] == [float(2 + 4 * i) for i in range(len(timestamps))]
+
+
+def test_archived_session_pages_like_sqlite(client, local_db):
+    n_rows = insert_session(local_db, "s3", ["2026-01-01T00:00:00"] * 3 + ["2026-01-01T00:00:01"] * 2)
+    sqlite_pages = fetch_all(client, "s3", limit=4)
+    archive_session("s3")
+    archived_pages = fetch_all(client, "s3", limit=4)
+    assert page_values(archived_pages) == page_values(sqlite_pages)
+    assert sorted(page_values(archived_pages)) == [float(i) for i in range(n_rows)]
+
+
+def test_rejects_malformed_cursor(client, local_db):
+    insert_session(local_db, "s4", ["2026-01-01T00:00:00"])
+    response = client.get("/api/sessions/s4/series", params={"metric": "force", "cursor": "nope"})
+    assert response.status_code == 400
+    assert api_server.parse_cursor(api_server.format_cursor(1767225600.1, 7)) == (1767225600.1, 7)
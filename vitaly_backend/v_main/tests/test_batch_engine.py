@@ -0,0 +1,51 @@
+# test_batch_engine.py
+
+import numpy as np
+import pytest
+
+from alignment import align_windows, sample_times
+from my_signal_processing_module import RESULT_KEYS, process_emg_acc_signals, process_emg_acc_signals_batch
+
+FS_EMG, FS_ACC = 2000, 200
+WINDOW, STEP, NFFT = 1000, 800, 2048
+
+
+@pytest.fixture(scope="module")
+def signals():
+    rng = np.random.default_rng(1)
+    n_samples = 30000
+    t = np.arange(n_samples) / FS_EMG
+    emg = 0.01 * rng.normal(size=(4, n_samples)) + np.sin(2 * np.pi * 30 * t) * np.linspace(0.1, 1, n_samples)
+    acc = rng.normal(size=(4, n_samples * FS_ACC // FS_EMG))
+    return emg, acc
+
+
+def late_short_alignment(n_emg, n_acc, num_windows):
+    """acc starting 1.3 s after the EMG and ending before it."""
+    acc_time = 1.3 + sample_times(n_acc - 400, FS_ACC)
+    return align_windows(sample_times(n_emg, FS_EMG), acc_time, WINDOW, STEP, num_windows)
+
+
+@pytest.mark.parametrize("aligned", [False, True])
+@pytest.mark.parametrize("smoothing", ["causal", "ema", "centered"])
+def test_batch_matches_per_window_reference(signals, smoothing, aligned):
+    emg, acc = signals
+    num_windows = 100
+    kwargs = {}
+    if aligned:
+        alignment = late_short_alignment(emg.shape[1], acc.shape[1], num_windows)
+        assert np.any(alignment.lengths == 0) and np.any(alignment.lengths > 0)
+        kwargs = {"acc_starts": alignment.starts, "acc_lengths": alignment.lengths}
+
+    batch, activation, fatigue = process_emg_acc_signals_batch(
+        emg, acc, FS_EMG, FS_ACC, num_windows, WINDOW, STEP, NFFT, NFFT, 0.5, smoothing=smoothing, **kwargs
+    )
+    for c in range(emg.shape[0]):
+        reference, ref_activation, ref_fatigue = process_emg_acc_signals(
+            emg[c], acc[c], FS_EMG, FS_ACC, num_windows, WINDOW, STEP, NFFT, NFFT, 0.5,
+            smoothing=smoothing, **kwargs
+        )
+        for key in RESULT_KEYS:
+            assert batch[key][c].shape == reference[key].shape, key
+            assert np.allclose(batch[key][c], reference[key], rtol=1e-8, atol=1e-12), (c, key)
+        assert np.allclose([activation[c], fatigue[c]], [ref_activation, ref_fatigue])
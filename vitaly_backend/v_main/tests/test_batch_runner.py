@@ -0,0 +1,34 @@
+# test_batch_runner.py
+
+import os
+
+from batch_runner import run_batch
+from generate_synthetic_data import generate_recording
+from result_cache import ResultCache
+
+
+def make_recordings(tmp_path, durations):
+    emg_dir, acc_dir = tmp_path / "EMG", tmp_path / "Trajectories"
+    os.makedirs(emg_dir)
+    os.makedirs(acc_dir)
+    for i, duration in enumerate(durations, start=1):
+        generate_recording(str(emg_dir / f"T{i}.txt"), str(acc_dir / f"T{i}.txt"), duration_s=duration, seed=i,
+                           device_layout=True)
+    return str(emg_dir), str(acc_dir)
+
+
+def test_writes_in_file_order_and_skips_cached_rerun(tmp_path, local_db):
+    # the first recording is the slow one, so the second usually finishes first
+    emg_dir, acc_dir = make_recordings(tmp_path, (30.0, 3.0))
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    first = run_batch(emg_dir, acc_dir, workers=2, all_channels=True, result_cache=cache)
+    assert [r["session_id"] for r in first] == ["session_T1", "session_T2"]
+    assert all(r["rows"] > 0 and not r["cached"] for r in first)
+    for r in first:
+        assert len(local_db.get_session_rows(r["session_id"])) == r["rows"]
+
+    second = run_batch(emg_dir, acc_dir, workers=2, all_channels=True, result_cache=cache)
+    assert [r["session_id"] for r in second] == ["session_T1", "session_T2"]
+    assert [(r["rows"], r["cached"]) for r in second] == [(0, True), (0, True)]
+    assert local_db.sync_backlog() == sum(r["rows"] for r in first)
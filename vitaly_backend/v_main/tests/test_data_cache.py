@@ -0,0 +1,41 @@
+# test_data_cache.py
+
+import numpy as np
+
+from data_cache import load_columns_cached, parse_columns
+
+
+def write_table(path, rows):
+    path.write_text("Time\ta\tb\tc\n" + "".join("\t".join(row) + "\n" for row in rows))
+    return str(path)
+
+
+def test_parse_selected_columns(tmp_path):
+    filename = write_table(tmp_path / "T1.txt", [["0.0", "1", "2", "3"], ["0.5", "4", "5", "6"]])
+    np.testing.assert_array_equal(parse_columns(filename, [1, 3]), [[1, 3], [4, 6]])
+    assert parse_columns(filename, [2], dtype=np.float32).dtype == np.float32
+
+
+def test_blank_fields_are_nan(tmp_path):
+    filename = write_table(tmp_path / "T1.txt", [["0.0", "1", "", "3"], ["0.5", "4", "5", "6"]])
+    np.testing.assert_array_equal(parse_columns(filename, [2, 3]), [[np.nan, 3], [5, 6]])
+
+
+def test_header_only_file_is_empty(tmp_path):
+    filename = write_table(tmp_path / "T1.txt", [])
+    assert parse_columns(filename, [1, 2, 3]).shape == (0, 3)
+
+
+def test_sidecar_is_reused(tmp_path):
+    filename = write_table(tmp_path / "T1.txt", [["0.0", "1", "2", "3"]])
+    first = load_columns_cached(filename, [1, 2])
+    assert isinstance(first, np.memmap)
+    np.testing.assert_array_equal(load_columns_cached(filename, [1, 2]), [[1, 2]])
+
+
+def test_unwritable_cache_dir_falls_back_to_parsing(tmp_path):
+    filename = write_table(tmp_path / "T1.txt", [["0.0", "1", "2", "3"]])
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    data = load_columns_cached(filename, [1, 3], cache_dir=str(blocker / "cache"))
+    np.testing.assert_array_equal(data, [[1, 3]])
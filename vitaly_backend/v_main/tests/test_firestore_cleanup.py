@@ -0,0 +1,106 @@
+# test_firestore_cleanup.py
+
+import functools
+import json
+
+import pytest
+
+import firestore_cleanup
+from firestore_cleanup import cleanup_users, delete_user_sessions, iter_subtree
+from firestore_writer import FirestoreBatchWriter
+from memory_firestore import MemoryFirestore, MemoryWriteBatch
+
+RESULT_COLLECTIONS = ("muscle_activation", "force_velocity", "processed_results")
+
+
+class FlakyFirestore(MemoryFirestore):
+    """Fails every batch commit that touches a path under `failing_prefix`."""
+
+    failing_prefix = None
+
+    def batch(self):
+        return FlakyBatch(self)
+
+
+class FlakyBatch(MemoryWriteBatch):
+    def commit(self):
+        prefix = self._client.failing_prefix
+        if prefix is not None and any(path.startswith(prefix) for path, _data in self._ops):
+            raise RuntimeError("simulated outage")
+        super().commit()
+
+
+@pytest.fixture(autouse=True)
+def fast_cleanup_writer(monkeypatch):
+    monkeypatch.setattr(firestore_cleanup, "FirestoreBatchWriter",
+                        functools.partial(FirestoreBatchWriter, max_retries=0, backoff_base=0))
+
+
+def add_user(db, user_id, n_sessions=3, docs_per_collection=260):
+    """
+    Sessions with result subcollections; the last session document is missing (only
+    subcollections). Returns the number of references cleanup deletes.
+    """
+    user_ref = db.collection("users").document(user_id)
+    user_ref.set({"name": user_id})
+    for s in range(n_sessions):
+        session_ref = user_ref.collection("sessions").document(f"s{s}")
+        if s < n_sessions - 1:
+            session_ref.set({"started": s})
+        for name in RESULT_COLLECTIONS:
+            for i in range(docs_per_collection):
+                session_ref.collection(name).document(f"d{i:04d}").set({"i": i})
+    return n_sessions + n_sessions * len(RESULT_COLLECTIONS) * docs_per_collection
+
+
+def session_docs(db, user_id):
+    prefix = f"users/{user_id}/sessions/"
+    return [path for path in db.docs if path.startswith(prefix)]
+
+
+def test_subtree_lists_children_before_parents_and_missing_parents():
+    db = MemoryFirestore()
+    add_user(db, "u0", n_sessions=2, docs_per_collection=3)
+    paths = [ref.path for ref in iter_subtree(db.collection("users").document("u0").collection("sessions"),
+                                              page_size=2)]
+    assert len(paths) == len(set(paths)) == 2 + 2 * len(RESULT_COLLECTIONS) * 3
+    assert paths.index("users/u0/sessions/s1") > paths.index("users/u0/sessions/s1/processed_results/d0002")
+
+
+def test_dry_run_counts_without_deleting():
+    db = MemoryFirestore()
+    n_docs = add_user(db, "u0")
+    before = dict(db.docs)
+    assert delete_user_sessions(db, "u0", dry_run=True) == {"documents": n_docs, "failed": 0}
+    assert db.docs == before
+
+
+def test_deletes_in_full_batches_and_keeps_the_user():
+    db = MemoryFirestore()
+    n_docs = add_user(db, "u0")
+    stats = delete_user_sessions(db, "u0")
+    assert stats == {"documents": n_docs, "failed": 0}
+    assert session_docs(db, "u0") == []
+    assert "users/u0" in db.docs
+    assert db.commit_count == -(-n_docs // 500)
+
+
+def test_resumes_after_failed_user(tmp_path):
+    db = FlakyFirestore()
+    for user_id in ("u0", "u1", "u2"):
+        add_user(db, user_id)
+    checkpoint = str(tmp_path / "cleanup.json")
+
+    db.failing_prefix = "users/u1/sessions/s1/"
+    first = cleanup_users(db, ["u0", "u1", "u2"], checkpoint_path=checkpoint)
+    assert first["failed"] > 0
+    with open(checkpoint) as f:
+        assert json.load(f)["users_done"] == ["u0", "u2"]
+    assert session_docs(db, "u0") == [] and session_docs(db, "u2") == []
+    assert session_docs(db, "u1")
+
+    db.failing_prefix = None
+    remaining = delete_user_sessions(db, "u1", dry_run=True)["documents"]
+    second = cleanup_users(db, ["u0", "u1", "u2"], checkpoint_path=checkpoint)
+    assert second == {"users": 1, "skipped": 2, "documents": remaining, "failed": 0}
+    assert session_docs(db, "u1") == []
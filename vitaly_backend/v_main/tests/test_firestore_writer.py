@@ -0,0 +1,141 @@
+# test_firestore_writer.py
+
+import functools
+import time
+
+import pytest
+
+import sync_worker
+from firestore_writer import MAX_BATCH_OPS, FirestoreBatchWriter
+from local_storage import SESSION_COLUMNS
+from memory_firestore import MemoryFirestore, MemoryWriteBatch
+
+
+class LostAckFirestore(MemoryFirestore):
+    """Commits every batch, but reports the first `lost_acks` commits as failed (e.g. a timeout)."""
+
+    def __init__(self, lost_acks):
+        super().__init__()
+        self.lost_acks = lost_acks
+
+    def batch(self):
+        return LostAckBatch(self)
+
+
+class LostAckBatch(MemoryWriteBatch):
+    def commit(self):
+        super().commit()
+        with self._client.lock:
+            if self._client.lost_acks > 0:
+                self._client.lost_acks -= 1
+                raise RuntimeError("deadline exceeded")
+
+
+def write_docs(writer, db, n_docs):
+    collection = db.collection("users").document("u").collection("results")
+    for i in range(n_docs):
+        writer.set(collection.document(f"d{i:04d}"), {"i": i}, tag=i)
+
+
+def test_groups_ops_into_batches():
+    db = MemoryFirestore()
+    with FirestoreBatchWriter(db, max_batch_ops=10, flush_interval=float("inf")) as writer:
+        write_docs(writer, db, 25)
+    assert db.commit_count == 3
+    assert writer.committed_ops == 25 and len(db.docs) == 25
+
+
+def test_rejects_batches_over_the_firestore_limit():
+    with pytest.raises(ValueError):
+        FirestoreBatchWriter(MemoryFirestore(), max_batch_ops=MAX_BATCH_OPS + 1)
+
+
+def test_retries_failed_commits_and_reports_tags_once():
+    db = MemoryFirestore()
+    db.fail_next_commits = 2
+    committed = []
+    with FirestoreBatchWriter(db, max_batch_ops=10, max_in_flight=1, backoff_base=0,
+                              on_committed=committed.extend) as writer:
+        write_docs(writer, db, 20)
+    assert writer.failed_ops == 0 and not writer.failed_batches
+    assert sorted(committed) == list(range(20))
+    assert len(db.docs) == 20
+
+
+def test_gives_up_after_max_retries():
+    db = MemoryFirestore()
+    db.fail_next_commits = 10
+    committed = []
+    with FirestoreBatchWriter(db, max_retries=2, backoff_base=0, on_committed=committed.extend) as writer:
+        write_docs(writer, db, 5)
+    assert writer.failed_ops == 5
+    assert [len(ops) for ops in writer.take_failed()] == [5]
+    assert not writer.failed_batches
+    assert committed == [] and db.docs == {}
+
+
+def test_keeps_only_the_last_failed_batches():
+    db = MemoryFirestore()
+    db.fail_next_commits = 100
+    with FirestoreBatchWriter(db, max_batch_ops=10, max_in_flight=1, max_retries=0,
+                              max_failed_batches=2) as writer:
+        write_docs(writer, db, 50)
+    assert writer.failed_ops == 50
+    failed = writer.take_failed()
+    assert [[tag for *_op, tag in ops][0] for ops in failed] == [30, 40]
+    assert writer.take_failed() == []
+
+
+def test_flushes_a_partial_batch_once_it_is_old():
+    db = MemoryFirestore()
+    with FirestoreBatchWriter(db, flush_interval=0.05) as writer:
+        write_docs(writer, db, 3)
+        deadline = time.monotonic() + 5
+        while len(db.docs) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # committed by the timer, without another write or close()
+        assert len(db.docs) == 3 and db.commit_count == 1
+
+
+def test_recommit_after_lost_ack_does_not_duplicate():
+    db = LostAckFirestore(lost_acks=1)
+    with FirestoreBatchWriter(db, backoff_base=0) as writer:
+        write_docs(writer, db, 30)
+    assert db.commit_count == 2
+    assert writer.committed_ops == 30 and len(db.docs) == 30
+
+
+@pytest.fixture
+def fast_sync_writer(monkeypatch):
+    """SyncWorker's writer without backoff and with a single try per batch."""
+    monkeypatch.setattr(sync_worker, "FirestoreBatchWriter",
+                        functools.partial(FirestoreBatchWriter, max_retries=0, backoff_base=0))
+
+
+def insert_rows(local_db, session_id, n_rows):
+    columns = {name: [float(i) for i in range(n_rows)] for name in SESSION_COLUMNS[1:-1]}
+    return local_db.insert_result_columns(session_id, "2026-01-01T00:00:00", columns, [None] * n_rows)
+
+
+def synced_docs(db, session_id):
+    prefix = f"users/u/sessions/{session_id}/processed_results/"
+    return {path[len(prefix):] for path in db.docs if path.startswith(prefix)}
+
+
+def test_sync_marks_rows_only_after_their_batch_commits(local_db, fast_sync_writer):
+    row_ids = insert_rows(local_db, "s1", 1200)
+    db = MemoryFirestore()
+    db.fail_next_commits = 1
+    worker = sync_worker.SyncWorker(db, "u", page_size=500)
+
+    worker.drain()
+    assert worker.backlog() == 500
+    assert len(synced_docs(db, "s1")) == 700
+
+    worker.drain()
+    assert worker.backlog() == 0
+    assert synced_docs(db, "s1") == set(row_ids)
+
+    commits = db.commit_count
+    worker.drain()
+    assert db.commit_count == commits
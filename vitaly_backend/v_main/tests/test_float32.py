@@ -0,0 +1,42 @@
+# test_float32.py
+
+import numpy as np
+import pytest
+
+from generate_synthetic_data import generate_recording
+from my_signal_processing_module import (
+    RESULT_KEYS,
+    compute_window_params,
+    load_accelerometer_data,
+    load_emg_data,
+    process_emg_acc_signals_batch
+)
+
+# largest float32 - float64 difference accepted per metric, relative to the series' peak
+FLOAT32_TOLERANCE = 1e-4
+FS_EMG, FS_ACC = 2000, 200
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_float32_batch_within_tolerance(tmp_path, seed):
+    """Unsmoothed float32 vs float64 batch results, including rounding the input to float32."""
+    emg_file, acc_file = str(tmp_path / "emg.txt"), str(tmp_path / "acc.txt")
+    generate_recording(emg_file, acc_file, duration_s=20.0, fs_emg=FS_EMG, fs_acc=FS_ACC, seed=seed,
+                       device_layout=True)
+    emg = np.ascontiguousarray(load_emg_data(emg_file).T)
+    acc = np.ascontiguousarray(load_accelerometer_data(acc_file)[:, :emg.shape[0]].T)
+    window_size, step_size, num_windows, nfft_emg = compute_window_params(emg.shape[1], FS_EMG, 0.2)
+
+    raw = {}
+    for dtype in (np.float64, np.float32):
+        raw[dtype], _, _ = process_emg_acc_signals_batch(
+            emg.astype(dtype), acc.astype(dtype), FS_EMG, FS_ACC, num_windows, window_size, step_size,
+            nfft_emg, nfft_emg, 0, smooth_window=None, dtype=dtype
+        )
+
+    for key in RESULT_KEYS:
+        ref = raw[np.float64][key]
+        assert raw[np.float32][key].shape == ref.shape
+        scale = np.max(np.abs(ref), axis=-1, keepdims=True)
+        error = np.abs(raw[np.float32][key].astype(np.float64) - ref) / np.where(scale > 0, scale, 1.0)
+        assert error.max() <= FLOAT32_TOLERANCE, key
@@ -0,0 +1,13 @@
+# test_imports.py
+
+import pytest
+
+from benchmark_pipeline import LAZY_MODULES, STARTUP_MODULES, bench_imports
+
+
+@pytest.mark.parametrize("module", STARTUP_MODULES)
+def test_entry_module_does_not_import_heavy_modules(module):
+    """Each entry point, imported in a fresh interpreter, leaves LAZY_MODULES unloaded."""
+    result = bench_imports((module,), repeat=1)[module]
+    assert "skipped" not in result, result.get("skipped")
+    assert result["eager_imports"] == [], f"{module} imports {result['eager_imports']} of {LAZY_MODULES}"
@@ -0,0 +1,100 @@
+# test_ingest_scheduler.py
+
+import threading
+
+import numpy as np
+import pytest
+
+from ingest_scheduler import IngestScheduler
+
+QUANTUM = 1000
+
+
+class GatedScheduler(IngestScheduler):
+    """Records every turn and holds the workers at `gate` until the test opens it."""
+
+    def __init__(self, *args, **kwargs):
+        self.gate = threading.Event()
+        self.in_turn = threading.Event()
+        self.turns = []
+        super().__init__(*args, **kwargs)
+
+    def _run_turn(self, session, turn):
+        self.turns.append((session.session_id, sum(emg.shape[0] for emg, _acc in turn)))
+        self.in_turn.set()
+        self.gate.wait()
+        super()._run_turn(session, turn)
+
+
+@pytest.fixture
+def scheduler(local_db):
+    scheduler = GatedScheduler(None, workers=1, quantum=QUANTUM, max_pending_samples=5 * QUANTUM)
+    yield scheduler
+    scheduler.gate.set()
+    scheduler.stop()
+
+
+def chunk(n_samples, seed=0):
+    return np.random.default_rng(seed).normal(size=(n_samples, 1))
+
+
+def open_sessions(scheduler, *session_ids):
+    for session_id in session_ids:
+        scheduler.open_session(session_id, 1, 400, 200, 512)
+
+
+def hold_first_turn(scheduler, session_id):
+    """Submit one quantum and wait until the worker is stuck processing it."""
+    scheduler.submit(session_id, chunk(QUANTUM))
+    assert scheduler.in_turn.wait(5)
+
+
+def test_full_queue_rejects_non_blocking_submit(scheduler):
+    open_sessions(scheduler, "s1", "s2")
+    hold_first_turn(scheduler, "s1")
+    assert scheduler.submit("s1", chunk(4 * QUANTUM))  # the queue is now full
+
+    assert scheduler.submit("s1", chunk(10), block=False) is False
+    assert scheduler.submit("s1", chunk(10), timeout=0.05) is False
+    # only the full session is refused
+    assert scheduler.submit("s2", chunk(QUANTUM), block=False) is True
+
+    scheduler.gate.set()
+    assert scheduler.submit("s1", chunk(10), timeout=5) is True
+
+
+def test_heavy_session_does_not_starve_a_light_one(scheduler):
+    open_sessions(scheduler, "heavy", "light")
+    hold_first_turn(scheduler, "heavy")
+    scheduler.submit("heavy", chunk(4 * QUANTUM))
+    scheduler.submit("light", chunk(2 * QUANTUM))
+    scheduler.gate.set()
+    scheduler.close_session("heavy")
+    scheduler.close_session("light")
+
+    order = [session_id for session_id, _samples in scheduler.turns]
+    assert order == ["heavy", "light", "heavy", "light", "heavy", "heavy", "heavy"]
+    assert all(samples <= QUANTUM for _session_id, samples in scheduler.turns)
+
+
+def test_close_session_drains_queued_chunks(scheduler, local_db):
+    open_sessions(scheduler, "s1")
+    hold_first_turn(scheduler, "s1")
+    scheduler.submit("s1", chunk(3 * QUANTUM, seed=1))
+
+    stats = {}
+    closer = threading.Thread(target=lambda: stats.update(scheduler.close_session("s1")))
+    closer.start()
+    closer.join(0.1)
+    assert closer.is_alive()  # still waiting for the queued chunks
+    with pytest.raises(ValueError):
+        scheduler.submit("s1", chunk(10))
+
+    scheduler.gate.set()
+    closer.join(5)
+    n_samples = 4 * QUANTUM
+    assert stats["samples"] == n_samples and stats["pending_samples"] == 0
+    assert stats["windows"] == (n_samples - 400) // 200 + 1
+
+    scheduler.stop()
+    assert len(local_db.get_session_rows("s1")) == stats["windows"]
@@ -0,0 +1,38 @@
+# test_instrumentation.py
+
+import numpy as np
+
+from ingest_scheduler import IngestScheduler
+from instrumentation import MetricsRegistry, metrics
+
+
+def test_retired_session_is_written_once(tmp_path):
+    registry = MetricsRegistry()
+    registry.inc("vitaly_stage_items_total", 3, stage="window_compute", session="s1")
+    registry.inc("vitaly_stage_items_total", 5, stage="window_compute", session="s2")
+    registry.retire_session("s1")
+
+    path = str(tmp_path / "metrics.prom")
+    registry.write_textfile(path)
+    with open(path) as f:
+        first = f.read()
+    registry.write_textfile(path)
+    with open(path) as f:
+        second = f.read()
+
+    assert 'session="s1"' in first and 'session="s2"' in first
+    assert 'session="s1"' not in second and 'session="s2"' in second
+
+
+def test_finished_ingest_session_is_retired(local_db, tmp_path):
+    scheduler = IngestScheduler(None, workers=1)
+    scheduler.open_session("retire_me", 1, 400, 200, 512)
+    scheduler.submit("retire_me", np.random.default_rng(0).normal(size=(2000, 1)))
+    assert scheduler.close_session("retire_me")["windows"] > 0
+    scheduler.stop()
+
+    path = str(tmp_path / "ingest.prom")
+    metrics.write_textfile(path)
+    with open(path) as f:
+        assert 'session="retire_me"' in f.read()
+    assert 'session="retire_me"' not in metrics.render()
@@ -0,0 +1,101 @@
+# test_result_cache.py
+
+import os
+import shutil
+import time
+
+import numpy as np
+import pytest
+
+import result_cache
+from batch_runner import process_recording, write_recording
+from generate_synthetic_data import generate_recording
+from result_cache import ResultCache, result_key
+
+
+@pytest.fixture
+def recording(tmp_path):
+    emg_file, acc_file = str(tmp_path / "T1_emg.txt"), str(tmp_path / "T1_acc.txt")
+    generate_recording(emg_file, acc_file, duration_s=4.0, seed=5, device_layout=True)
+    return emg_file, acc_file
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"))
+
+
+def entry(value, size=100):
+    return {"values": np.full(size, value, dtype=np.float64)}
+
+
+def set_age(cache, key, seconds_ago):
+    """Entry mtimes are the LRU order; set them explicitly instead of relying on clock resolution."""
+    ns = time.time_ns() - int(seconds_ago * 1e9)
+    os.utime(cache._path(key), ns=(ns, ns))
+
+
+def test_same_content_hits_even_under_another_name(recording, cache, tmp_path):
+    emg_file, acc_file = recording
+    copy = str(tmp_path / "renamed_emg.txt")
+    shutil.copyfile(emg_file, copy)
+    key = result_key((emg_file, acc_file), mode="batch")
+    assert result_key((copy, acc_file), mode="batch") == key
+
+    calls = []
+    compute = lambda: calls.append(1) or entry(1.0)
+    _, first_hit = cache.fetch(key, compute)
+    arrays, second_hit = cache.fetch(key, compute)
+    assert (first_hit, second_hit, len(calls)) == (False, True, 1)
+    assert np.array_equal(arrays["values"], entry(1.0)["values"])
+
+
+def test_content_change_misses(recording):
+    emg_file, acc_file = recording
+    key = result_key((emg_file, acc_file), mode="batch")
+    with open(emg_file, "a") as f:
+        f.write("0\t0\t0\t0\t0\t0\t0\t0\t0\n")
+    assert result_key((emg_file, acc_file), mode="batch") != key
+
+
+def test_parameter_or_algorithm_change_misses(recording, monkeypatch):
+    key = result_key(recording, mode="batch", smoothing="causal")
+    assert result_key(recording, mode="batch", smoothing="ema") != key
+    monkeypatch.setattr(result_cache, "ALGORITHM_VERSION", result_cache.ALGORITHM_VERSION + 1)
+    assert result_key(recording, mode="batch", smoothing="causal") != key
+
+
+def test_evicts_least_recently_used_entry(cache):
+    cache.max_entries = 2
+    cache.put("a", entry(1.0))
+    cache.put("b", entry(2.0))
+    set_age(cache, "a", 20)
+    set_age(cache, "b", 10)
+    assert cache.get("a") is not None  # a is now the most recently used
+
+    cache.put("c", entry(3.0))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_evicts_down_to_max_bytes(cache):
+    for age, key in ((30, "a"), (20, "b"), (10, "c")):
+        cache.put(key, entry(float(age), size=1000))
+        set_age(cache, key, age)
+    cache.max_bytes = 2 * os.path.getsize(cache._path("a"))
+    assert cache.evict() == 1
+    assert [cache.get(key) is not None for key in ("a", "b", "c")] == [False, True, True]
+
+
+def test_reingest_adds_no_rows(recording, cache, local_db):
+    emg_file, acc_file = recording
+    first = process_recording("session_T1", emg_file, acc_file, all_channels=True, result_cache=cache)
+    n_rows = write_recording(first)
+    assert n_rows == first["results"]["activation"].size > 0
+
+    second = process_recording("session_T1", emg_file, acc_file, all_channels=True, result_cache=cache)
+    assert second["cached"] and second["key"] == first["key"]
+    assert write_recording(second) == 0
+    assert write_recording(process_recording("session_T1", emg_file, acc_file, all_channels=True)) == 0
+    assert len(local_db.get_session_rows("session_T1")) == n_rows
+    assert local_db.sync_backlog() == n_rows
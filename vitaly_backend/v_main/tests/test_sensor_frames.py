@@ -0,0 +1,117 @@
+# test_sensor_frames.py
+
+import asyncio
+
+import numpy as np
+import pytest
+
+import sensor_frames
+from frame_ingest_server import FrameIngestServer
+from generate_synthetic_data import generate_recording
+from ingest_scheduler import IngestScheduler
+from recording_pipeline import process_recording_file
+from replay_device import replay_all
+from sensor_frames import (
+    FRAME_HEADER,
+    FrameError,
+    decode_header,
+    decode_hello,
+    decode_samples,
+    encode_hello,
+    encode_samples
+)
+
+
+def split(frame):
+    kind, length = decode_header(frame[:FRAME_HEADER.size])
+    payload = frame[FRAME_HEADER.size:]
+    assert len(payload) == length
+    return kind, payload
+
+
+@pytest.mark.parametrize("n_emg, n_acc", [(100, 10), (33, 0), (1, 3)])
+def test_samples_roundtrip(n_emg, n_acc):
+    rng = np.random.default_rng(n_emg)
+    counts = rng.integers(-32768, 32767, size=(n_emg, 3), dtype=np.int16)
+    acc = rng.normal(size=(n_acc, 3)).astype(np.float32)
+    kind, payload = split(encode_samples(2**32 + 7, 12.5, counts, acc, emg_scale=0.25, acc_timestamp=12.4))
+
+    frame = decode_samples(payload)
+    assert kind == sensor_frames.KIND_SAMPLES
+    assert frame.seq == 7  # sequence numbers wrap at 32 bits
+    assert (frame.timestamp, frame.acc_timestamp, frame.emg_scale) == (12.5, pytest.approx(12.4), 0.25)
+    assert frame.emg_counts.dtype == np.int16 and frame.emg_counts.shape == counts.shape
+    assert frame.acc.dtype == np.float32 and frame.acc.shape == acc.shape
+    assert np.array_equal(frame.emg_counts, counts) and np.array_equal(frame.acc, acc)
+    assert np.array_equal(frame.emg(), counts * 0.25)
+
+
+def test_hello_roundtrip():
+    kind, payload = split(encode_hello("s1", 8, 2000, 200, user_id="u"))
+    assert kind == sensor_frames.KIND_HELLO
+    assert decode_hello(payload) == {"session_id": "s1", "n_channels": 8, "fs_emg": 2000, "fs_acc": 200,
+                                     "user_id": "u"}
+
+
+def test_truncated_frames_raise_frame_error():
+    frame = encode_samples(0, 0.0, np.ones((10, 2), dtype=np.int16), np.ones((2, 2), dtype=np.float32))
+    with pytest.raises(FrameError):
+        decode_header(frame[:FRAME_HEADER.size - 1])
+    _kind, payload = split(frame)
+    for cut in (1, sensor_frames.SAMPLES_HEADER.size + 3, len(payload) - 1):
+        with pytest.raises(FrameError):
+            decode_samples(payload[:cut])
+    with pytest.raises(FrameError):
+        decode_hello(split(encode_hello("s1", 1, 2000, 200))[1][:-3])
+
+
+def test_bad_magic_and_version_raise_frame_error():
+    header = encode_hello("s1", 1, 2000, 200)[:FRAME_HEADER.size]
+    with pytest.raises(FrameError, match="magic"):
+        decode_header(b"XXXX" + header[4:])
+    with pytest.raises(FrameError, match="version"):
+        decode_header(header[:4] + bytes([sensor_frames.VERSION + 1]) + header[5:])
+
+
+def test_oversized_frames_raise_frame_error(monkeypatch):
+    header = FRAME_HEADER.pack(sensor_frames.MAGIC, sensor_frames.VERSION, sensor_frames.KIND_SAMPLES, 0,
+                               sensor_frames.MAX_PAYLOAD + 1)
+    with pytest.raises(FrameError, match="exceeds"):
+        decode_header(header)
+    with pytest.raises(FrameError):
+        encode_samples(0, 0.0, np.zeros((70000, 1), dtype=np.int16))
+    monkeypatch.setattr(sensor_frames, "MAX_PAYLOAD", 1024)
+    with pytest.raises(FrameError, match="exceeds"):
+        encode_samples(0, 0.0, np.zeros((1000, 1), dtype=np.int16))
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    recordings = []
+    for i, duration in enumerate((6.0, 9.0)):
+        emg_file, acc_file = str(tmp_path / f"T{i}_emg.txt"), str(tmp_path / f"T{i}_acc.txt")
+        generate_recording(emg_file, acc_file, duration_s=duration, seed=i, device_layout=True)
+        recordings.append((f"device_{i}", emg_file, acc_file))
+    return recordings
+
+
+def test_replayed_devices_are_stored_per_session(local_db, recordings):
+    scheduler = IngestScheduler(None, workers=2)
+
+    async def loopback():
+        server = await FrameIngestServer(scheduler, host="127.0.0.1", port=0).start()
+        try:
+            return await replay_all("127.0.0.1", server.port, recordings, speed=0)
+        finally:
+            await server.close()
+
+    sent = asyncio.run(loopback())
+    scheduler.stop()
+
+    for (session_id, emg_file, acc_file), (frames, _bytes) in zip(recordings, sent):
+        assert frames > 0
+        batch = process_recording_file(emg_file, acc_file)
+        n_channels, n_windows = batch["results"]["activation"].shape
+        rows = local_db.get_session_rows(session_id)
+        assert len(rows) == n_channels * n_windows
+        assert sorted({row[-1] for row in rows}) == sorted(batch["channels"])
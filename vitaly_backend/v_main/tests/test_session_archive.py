@@ -0,0 +1,46 @@
+# test_session_archive.py
+
+import pytest
+
+from local_storage import SESSION_COLUMNS
+from session_archive import archive_session, load_session_archive
+
+
+@pytest.fixture
+def archive_dir(tmp_path):
+    return str(tmp_path / "archive")
+
+
+def insert_rows(local_db, session_id, n_rows):
+    columns = {name: [float(i) for i in range(n_rows)] for name in SESSION_COLUMNS[1:-1]}
+    return local_db.insert_result_columns(session_id, "2026-01-01T00:00:00", columns, [None] * n_rows)
+
+
+def test_archives_and_deletes_a_synced_session(local_db, archive_dir):
+    local_db.mark_synced_many(insert_rows(local_db, "s1", 5))
+    assert archive_session("s1", archive_dir) == 5
+    assert local_db.get_session_rows("s1") == []
+    assert list(load_session_archive("s1", ("force",), archive_dir)["force"]) == [0, 1, 2, 3, 4]
+
+
+def test_keeps_a_session_with_unsynced_rows(local_db, archive_dir):
+    row_ids = insert_rows(local_db, "s1", 5)
+    local_db.mark_synced_many(row_ids[:3])
+
+    assert archive_session("s1", archive_dir) == 0
+    assert len(local_db.get_session_rows("s1")) == 5
+    assert local_db.sync_backlog() == 2
+
+
+def test_delete_refuses_unsynced_rows(local_db):
+    local_db.mark_synced_many(insert_rows(local_db, "s1", 3))
+    insert_rows(local_db, "s1", 1)
+    assert local_db.delete_session("s1") is None
+    assert len(local_db.get_session_rows("s1")) == 4 and local_db.sync_backlog() == 1
+
+
+def test_copy_without_delete_ignores_sync_state(local_db, archive_dir):
+    insert_rows(local_db, "s1", 4)
+    assert archive_session("s1", archive_dir, delete=False) == 4
+    assert len(local_db.get_session_rows("s1")) == 4
+    assert load_session_archive("s1", ("force",), archive_dir) is not None
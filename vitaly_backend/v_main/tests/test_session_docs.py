@@ -0,0 +1,29 @@
+# test_session_docs.py
+
+import warnings
+
+import numpy as np
+
+from my_signal_processing_module import RESULT_KEYS
+from session_docs import channel_docs
+
+
+def window_for(n_channels):
+    return {key: np.arange(1.0, n_channels + 1) for key in RESULT_KEYS}
+
+
+def test_group_summaries():
+    docs = channel_docs("t", ["L_BF", "L_VL", "R_BF", "R_VL"], window_for(4))
+    assert docs["muscle_activation"]["Hamstring_activation"] == 2.0
+    assert docs["muscle_activation"]["Quadriceps_activation"] == 3.0
+    assert docs["force_velocity"]["L_VL_force"] == 2.0
+
+
+def test_missing_group_is_none_without_warning():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        docs = channel_docs("t", ["L_BF", "R_BF"], window_for(2))
+    assert docs["muscle_activation"]["Quadriceps_activation"] is None
+    assert docs["muscle_fatigue"]["Quadriceps_fatigue_level"] is None
+    assert docs["force_velocity"]["Quadracept_force_now"] is None
+    assert docs["muscle_activation"]["Hamstring_activation"] == 1.5
@@ -0,0 +1,59 @@
+# test_sliding_stats.py
+
+import numpy as np
+
+from sliding_stats import TOLERANCE, RunningWindowStats, SlidingWindowStats
+
+WINDOW, STEP = 400, 100
+
+
+def artifact_signal(n_channels=3, n_samples=20000, seed=0):
+    """Quiet EMG after a block riding on a 1e6 offset: later windows are ill-conditioned."""
+    rng = np.random.default_rng(seed)
+    signal = rng.normal(scale=1e-3, size=(n_channels, n_samples))
+    signal[:, 2000:4000] += 1e6
+    return signal
+
+
+def direct(signal, starts):
+    segments = np.stack([signal[:, s:s + WINDOW] for s in starts], axis=-1)
+    return np.sqrt(np.mean(segments ** 2, axis=1)), np.sum(np.abs(segments), axis=1)
+
+
+def test_prefix_sums_recompute_ill_conditioned_windows():
+    signal = artifact_signal()
+    starts = np.arange(0, signal.shape[1] - WINDOW + 1, STEP)
+    stats = SlidingWindowStats(signal)
+    rms, iemg = direct(signal, starts)
+
+    # the plain prefix-sum difference is far off after the artifact
+    naive = stats._range(stats._sq, starts, WINDOW)
+    assert not np.allclose(np.sqrt(np.maximum(naive, 0) / WINDOW), rms, rtol=TOLERANCE, atol=0)
+
+    assert np.allclose(stats.rms(starts, WINDOW), rms, rtol=TOLERANCE, atol=0)
+    assert np.allclose(stats.iemg(starts, WINDOW), iemg, rtol=TOLERANCE, atol=0)
+
+
+def test_running_sums_resync_after_the_artifact_leaves():
+    signal = artifact_signal()
+    n_channels, n_samples = signal.shape
+    # never resync on the schedule: only the drift bound can trigger it
+    stats = RunningWindowStats(n_channels, WINDOW, resync_every=10**9)
+    ring = np.zeros((n_channels, WINDOW))
+    count = 0
+    starts, sum_sq, sum_abs = [], [], []
+    for start in range(0, n_samples, STEP):
+        new = signal[:, start:start + STEP]
+        idx = (count + np.arange(new.shape[1])) % WINDOW
+        stats.write(ring, idx, new)
+        ring[:, idx] = new
+        count += new.shape[1]
+        if count >= WINDOW:
+            window_sum_sq, window_abs, _ = stats.window(ring, count % WINDOW)
+            starts.append(count - WINDOW)
+            sum_sq.append(window_sum_sq)
+            sum_abs.append(window_abs.copy())
+
+    rms, iemg = direct(signal, starts)
+    assert np.allclose(np.sqrt(np.array(sum_sq).T / WINDOW), rms, rtol=TOLERANCE, atol=0)
+    assert np.allclose(np.array(sum_abs).T, iemg, rtol=TOLERANCE, atol=0)
@@ -0,0 +1,31 @@
+# test_smoothing.py
+
+import numpy as np
+import pytest
+
+from smoothing import CausalMovingAverage, ExponentialMovingAverage, smooth_series
+
+
+@pytest.mark.parametrize("window_size", [1, 3, 10])
+def test_causal_scalar_stream(window_size):
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=5 * window_size + 7)
+    values[window_size + 1] = 1e12  # forces a recompute while the big value leaves
+    smoother = CausalMovingAverage(window_size)
+    streamed = [float(smoother.update(v)) for v in values]
+    np.testing.assert_allclose(streamed, smooth_series(values, "causal", window_size), rtol=1e-12, atol=1e-9)
+
+
+def test_causal_channel_stream():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(3, 40))
+    smoother = CausalMovingAverage(10)
+    streamed = np.stack([smoother.update(values[:, i]) for i in range(values.shape[1])], axis=1)
+    np.testing.assert_allclose(streamed, smooth_series(values, "causal", 10), rtol=1e-12, atol=1e-12)
+
+
+def test_ema_scalar_stream():
+    values = np.random.default_rng(2).normal(size=50)
+    smoother = ExponentialMovingAverage(10)
+    streamed = [float(smoother.update(v)) for v in values]
+    np.testing.assert_allclose(streamed, smooth_series(values, "ema", 10), rtol=1e-12, atol=1e-12)
@@ -0,0 +1,46 @@
+# test_spectral.py
+
+import numpy as np
+import pytest
+from scipy.signal import welch, windows
+
+from spectral import WelchPlan, get_welch_plan
+
+FS = 2000
+
+
+def scipy_mnf(segment, nfft):
+    """The per-window reference: one Hamming segment of scipy.signal.welch, then sum(f * P) / sum(P)."""
+    window_size = len(segment)
+    freqs, power = welch(segment, FS, window=windows.hamming(window_size), nperseg=window_size,
+                         noverlap=int(0.2 * window_size), nfft=nfft)
+    return np.sum(freqs * power) / np.sum(power)
+
+
+def segments(n_windows, window_size, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(window_size) / FS
+    tone = np.sin(2 * np.pi * rng.uniform(20, 300, size=(n_windows, 1)) * t)
+    return tone + 0.3 * rng.normal(size=(n_windows, window_size)) + 5.0  # offset: the detrend matters
+
+
+@pytest.mark.parametrize("window_size, nfft", [(512, 512), (400, 2048), (333, 1000), (1001, 1001)])
+def test_mnf_matches_scipy_welch(window_size, nfft):
+    data = segments(6, window_size)
+    expected = [scipy_mnf(segment, nfft) for segment in data]
+    plan = get_welch_plan(window_size, nfft, FS)
+    assert np.allclose(plan.mnf(data), expected, rtol=1e-10)
+    # leading axes are kept, e.g. (channels, windows, window_size)
+    assert np.allclose(plan.mnf(data.reshape(2, 3, window_size)), np.reshape(expected, (2, 3)), rtol=1e-10)
+
+
+def test_float32_segments_stay_close():
+    data = segments(6, 400)
+    expected = [scipy_mnf(segment, 2048) for segment in data]
+    assert np.allclose(get_welch_plan(400, 2048, FS).mnf(data.astype(np.float32)), expected, rtol=1e-4)
+
+
+def test_plans_are_shared_and_reject_short_nfft():
+    assert get_welch_plan(400, 2048, FS) is get_welch_plan(400, 2048, FS)
+    with pytest.raises(ValueError):
+        WelchPlan(400, 256, FS)
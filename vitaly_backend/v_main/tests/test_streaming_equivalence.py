@@ -0,0 +1,63 @@
+# test_streaming_equivalence.py
+
+import itertools
+
+import numpy as np
+import pytest
+
+from alignment import session_acc_grid
+from generate_synthetic_data import generate_recording
+from my_signal_processing_module import (
+    EMG_CHANNELS,
+    RESULT_KEYS,
+    acc_columns_for,
+    compute_window_params,
+    load_accelerometer_data,
+    load_emg_data
+)
+from recording_pipeline import process_recording_file
+from streaming_processor import StreamingEmgProcessor
+
+FS_EMG, FS_ACC = 2000, 200
+
+
+@pytest.fixture(scope="module")
+def recording(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("recording")
+    emg_file, acc_file = str(directory / "emg.txt"), str(directory / "acc.txt")
+    generate_recording(emg_file, acc_file, duration_s=12.0, fs_emg=FS_EMG, fs_acc=FS_ACC, seed=3,
+                       device_layout=True)
+    return emg_file, acc_file
+
+
+def stream_recording(emg_file, acc_file, chunk_sizes, smoothing):
+    """Windows of a StreamingEmgProcessor fed the recording in chunks of `chunk_sizes` (cycled)."""
+    emg = load_emg_data(emg_file)
+    n_samples, n_channels = emg.shape
+    acc = load_accelerometer_data(acc_file)[:, acc_columns_for(EMG_CHANNELS[:n_channels])]
+    acc_grid = session_acc_grid(emg_file, acc_file, n_samples, acc, FS_EMG, FS_ACC)
+    window_size, step_size, _, nfft_emg = compute_window_params(n_samples, FS_EMG, 0.2)
+    # the batch engine normalises activation by the recording's peak; give the stream the same
+    processor = StreamingEmgProcessor(n_channels, FS_EMG, FS_ACC, window_size, step_size, nfft_emg,
+                                      max_value=np.abs(emg).max(axis=0), smoothing=smoothing)
+    windows = []
+    start = 0
+    for size in itertools.cycle(chunk_sizes):
+        if start >= n_samples:
+            return windows
+        windows.extend(processor.push(emg[start:start + size], acc_grid[start:start + size]))
+        start += size
+
+
+@pytest.mark.parametrize("smoothing", ["causal", "ema"])
+@pytest.mark.parametrize("chunk_sizes", [(100,), (7,), (4000,), (1, 999, 50, 3333)])
+def test_stream_matches_batch(recording, chunk_sizes, smoothing):
+    emg_file, acc_file = recording
+    batch = process_recording_file(emg_file, acc_file, FS_EMG, FS_ACC, smoothing=smoothing)["results"]
+    windows = stream_recording(emg_file, acc_file, chunk_sizes, smoothing)
+
+    assert len(windows) == batch["activation"].shape[1] > 1
+    for i, window in enumerate(windows):
+        for key in RESULT_KEYS:
+            assert np.allclose(window["smoothed"][key], batch[key][:, i], rtol=1e-7, atol=1e-10), (i, key)
+
@@ -108,9 +108,15 @@ const App: React.FC = () => {
     // 立即执行一次
     fetchLatest();
   
-    // 每 10 秒自动刷新一次
-    const intervalId = setInterval(fetchLatest, 10000);
-    return () => clearInterval(intervalId);
+    // 之后由服务器推送每个新窗口 (SSE), 断线时 EventSource 会自动重连
+    const source = new EventSource("http://localhost:8000/api/stream");
+    source.addEventListener("window", (event) => {
+      setApiData(JSON.parse((event as MessageEvent).data));
+    });
+    source.onerror = (err) => {
+      console.error("❌ API stream error:", err);
+    };
+    return () => source.close();
   }, []);
 
   // correlation chart